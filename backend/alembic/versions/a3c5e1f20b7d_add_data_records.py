@@ -0,0 +1,143 @@
+"""Add data_records, one row per data record (packet) of an event
+
+Creates the table and, when the migration runs with `TORQUE_STORAGE=packets`, moves the per-packet arrays of
+`device_datas` (torque samples, record numbers, record lengths and CRCs) of existing events into `data_records` rows
+and empties them, as events are stored with that setting. Without it, only the table is created: events are read from
+either storage, so existing events can be moved later by running the downgrade and upgrade again with the setting.
+
+Revision ID: a3c5e1f20b7d
+Revises:
+Create Date: 2026-10-17 10:12:41.203518
+
+"""
+from os import getenv
+from struct import pack
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c5e1f20b7d'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Events converted per statement
+BATCH_SIZE = 500
+
+data_records = sa.table(
+    "data_records",
+    sa.column("eventID", sa.Integer),
+    sa.column("recordNumber", sa.Integer),
+    sa.column("torqueData", sa.LargeBinary),
+    sa.column("payloadCRC", sa.Integer),
+    sa.column("calculatedPayloadCRC", sa.Integer),
+)
+
+PACKET_ARRAYS = ('"recordNumbers", "recordLengths", "torqueData", "dataRecordPayloadCRCs", '
+                 '"calculatedDataRecordPayloadCRCs"')
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # The table already exists when it was created by `DBConnector` on startup
+    if not sa.inspect(bind).has_table("data_records"):
+        op.create_table(
+            "data_records",
+            sa.Column("eventID", sa.Integer(), sa.ForeignKey("events.id"), nullable=False),
+            sa.Column("recordNumber", sa.Integer(), nullable=False),
+            sa.Column("torqueData", sa.LargeBinary(), nullable=False),
+            sa.Column("payloadCRC", sa.Integer(), nullable=False),
+            sa.Column("calculatedPayloadCRC", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("eventID", "recordNumber"),
+        )
+
+    storage = getenv("TORQUE_STORAGE", "array")
+    if storage == "array":
+        return
+    if storage != "packets":
+        raise ValueError(f"Unrecognized torque storage {storage}")
+
+    last_id = 0
+    while True:
+        events = bind.execute(sa.text(
+            f'SELECT events.id, device_datas.id, {PACKET_ARRAYS} FROM events '
+            'JOIN device_datas ON device_datas.id = events."deviceDataID" '
+            'WHERE events.id > :last_id AND cardinality(device_datas."recordNumbers") > 0 '
+            'ORDER BY events.id LIMIT :limit'
+        ), {"last_id": last_id, "limit": BATCH_SIZE}).all()
+        if not events:
+            break
+
+        rows = []
+        for event_id, _, record_numbers, record_lengths, torque_data, crcs, calculated_crcs in events:
+            offset = 0
+            for record_number, record_length in zip(record_numbers, record_lengths):
+                if record_number > 0:
+                    index = record_number - 1
+                    rows.append({
+                        "eventID": event_id,
+                        "recordNumber": record_number,
+                        "torqueData": pack(f"<{record_length}h", *torque_data[offset:offset + record_length]),
+                        "payloadCRC": crcs[index] if index < len(crcs) and crcs[index] is not None else 0,
+                        "calculatedPayloadCRC": calculated_crcs[index]
+                            if index < len(calculated_crcs) and calculated_crcs[index] is not None else 0,
+                    })
+                offset += record_length
+
+        if rows:
+            bind.execute(insert(data_records).on_conflict_do_nothing(), rows)
+        bind.execute(sa.text(
+            'UPDATE device_datas SET "recordNumbers" = \'{}\', "recordLengths" = \'{}\', "torqueData" = \'{}\', '
+            '"dataRecordPayloadCRCs" = \'{}\', "calculatedDataRecordPayloadCRCs" = \'{}\' WHERE id = ANY(:ids)'
+        ), {"ids": [event[1] for event in events]})
+        last_id = events[-1][0]
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+
+    # Rebuild the arrays of events stored as rows, missing packets have a record number of -1 and a length of 0
+    last_id = 0
+    while True:
+        events = bind.execute(sa.text(
+            'SELECT events.id, device_datas.id FROM events '
+            'JOIN device_datas ON device_datas.id = events."deviceDataID" '
+            'WHERE events.id > :last_id AND cardinality(device_datas."recordNumbers") = 0 '
+            'AND EXISTS (SELECT 1 FROM data_records WHERE "eventID" = events.id) '
+            'ORDER BY events.id LIMIT :limit'
+        ), {"last_id": last_id, "limit": BATCH_SIZE}).all()
+        if not events:
+            break
+
+        for event_id, device_data_id in events:
+            records = bind.execute(sa.text(
+                'SELECT "recordNumber", "torqueData", "payloadCRC", "calculatedPayloadCRC" FROM data_records '
+                'WHERE "eventID" = :event_id ORDER BY "recordNumber"'
+            ), {"event_id": event_id}).all()
+            count = records[-1][0]
+            record_numbers, record_lengths = [-1] * count, [0] * count
+            crcs, calculated_crcs = [None] * count, [None] * count
+            torque_data = []
+            for record_number, samples, crc, calculated_crc in records:
+                samples = bytes(samples)
+                record_numbers[record_number - 1] = record_number
+                record_lengths[record_number - 1] = len(samples) // 2
+                crcs[record_number - 1] = crc
+                calculated_crcs[record_number - 1] = calculated_crc
+                torque_data += [int.from_bytes(samples[i:i + 2], "little", signed=True)
+                                for i in range(0, len(samples), 2)]
+
+            bind.execute(sa.text(
+                'UPDATE device_datas SET "recordNumbers" = CAST(:record_numbers AS INTEGER[]), '
+                '"recordLengths" = CAST(:record_lengths AS INTEGER[]), "torqueData" = CAST(:torque_data AS INTEGER[]), '
+                '"dataRecordPayloadCRCs" = CAST(:crcs AS INTEGER[]), '
+                '"calculatedDataRecordPayloadCRCs" = CAST(:calculated_crcs AS INTEGER[]) WHERE id = :id'
+            ), {"record_numbers": record_numbers, "record_lengths": record_lengths, "torque_data": torque_data,
+                "crcs": crcs, "calculated_crcs": calculated_crcs, "id": device_data_id})
+        last_id = events[-1][0]
+
+    op.drop_table("data_records")
@@ -0,0 +1,54 @@
+"""Add the event counters of sensors (eventCount, lastEventTimestamp, isStreaming)
+
+Adds the columns, computes them from the events already stored and adds a `text_pattern_ops` index on `devEUI` for
+prefix searches. The counters are then maintained as events are added, closed and dropped (see
+`db_connector.queries.count_sensor_events`).
+
+Revision ID: a8b3e7f05d21
+Revises: f2a6d8c41e57
+Create Date: 2026-10-17 22:41:50.317624
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8b3e7f05d21'
+down_revision: Union[str, None] = 'f2a6d8c41e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = ("eventCount", "lastEventTimestamp", "isStreaming")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # The columns already exist when the table was created by `DBConnector`
+    existing = {column["name"] for column in sa.inspect(bind).get_columns("sensors")}
+    if "eventCount" not in existing:
+        op.add_column("sensors", sa.Column("eventCount", sa.Integer(), server_default=sa.text("0"), nullable=False))
+    if "lastEventTimestamp" not in existing:
+        op.add_column("sensors", sa.Column("lastEventTimestamp", sa.DateTime(), nullable=True))
+    if "isStreaming" not in existing:
+        op.add_column("sensors", sa.Column("isStreaming", sa.Boolean(), server_default=sa.text("false"), nullable=False))
+    op.create_index("ix_sensors_devEUI_pattern", "sensors", ["devEUI"], postgresql_ops={"devEUI": "text_pattern_ops"},
+                    if_not_exists=True)
+
+    # Streaming status of the last event of each sensor (highest id among the latest timestamp)
+    op.execute(
+        'UPDATE sensors SET "eventCount" = counts.count, "lastEventTimestamp" = counts.last, '
+        '"isStreaming" = last_events."isStreaming" '
+        'FROM (SELECT "sensorID", count(*) AS count, max("timestamp") AS last FROM events GROUP BY "sensorID") counts, '
+        '(SELECT DISTINCT ON ("sensorID") "sensorID", "isStreaming" FROM events '
+        'ORDER BY "sensorID", "timestamp" DESC, id DESC) last_events '
+        'WHERE sensors.id = counts."sensorID" AND sensors.id = last_events."sensorID"'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sensors_devEUI_pattern", table_name="sensors")
+    for column in COLUMNS:
+        op.drop_column("sensors", column)
@@ -0,0 +1,65 @@
+"""Add the indexes of the time window queries of events
+
+- `ix_events_sensor_id_timestamp`: events of some sensors in a time window (`get_events_between`)
+- `ix_events_timestamp_brin`: BRIN index of the events of all sensors in a time window
+
+A partitioned table cannot be indexed concurrently, so each index is created on the table alone (invalid until every
+partition has its index), then concurrently on each partition, which is attached to it. Ingest is not blocked while
+the indexes are built.
+
+Revision ID: b6c1f4e92a38
+Revises: a8b3e7f05d21
+Create Date: 2026-10-17 23:36:08.914257
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6c1f4e92a38'
+down_revision: Union[str, None] = 'a8b3e7f05d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Name, method and columns of each index, and suffix of its name on the partitions
+INDEXES = (
+    ("ix_events_sensor_id_timestamp", "btree", '"sensorID", "timestamp"', "sensor_id_timestamp"),
+    ("ix_events_timestamp_brin", "brin", '"timestamp"', "timestamp_brin"),
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    partitioned = bind.scalar(sa.text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                                      "WHERE partrelid = to_regclass('events'))"))
+    partitions = bind.scalars(sa.text("SELECT inhrelid::regclass::text FROM pg_inherits "
+                                      "WHERE inhparent = to_regclass('events')")).all()
+
+    # The indexes already exist when the table was created by `DBConnector`
+    with op.get_context().autocommit_block():
+        for name, method, columns, suffix in INDEXES:
+            if not partitioned:
+                op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON events USING {method} ({columns})')
+                continue
+
+            op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON ONLY events USING {method} ({columns})')
+            for partition in partitions:
+                table = partition.strip('"')    # Quoted by regclass when needed
+                partition_index = f"{table[:63 - len(suffix) - 1]}_{suffix}"
+                op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{partition_index}" ON {partition} '
+                           f'USING {method} ({columns})')
+                attached = bind.scalar(sa.text(
+                    "SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:partition_index) "
+                    "AND inhparent = to_regclass(:name))"
+                ), {"partition_index": f'"{partition_index}"', "name": name})
+                if not attached:
+                    op.execute(f'ALTER INDEX {name} ATTACH PARTITION "{partition_index}"')
+
+
+def downgrade() -> None:
+    # Dropping the index of a partitioned table drops the indexes of its partitions
+    for name, _, _, _ in INDEXES:
+        op.drop_index(name, "events")
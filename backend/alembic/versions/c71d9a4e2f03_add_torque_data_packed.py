@@ -0,0 +1,78 @@
+"""Add device_datas.torqueDataPacked, the torque samples of an event as compact int16
+
+Adds the column and, when the migration runs with `TORQUE_ENCODING` set (`raw`, `delta-zlib` or `delta-lz4`), encodes
+the `torqueData` arrays of existing events with it (see `db_connector.torque_codec`) and empties them. Without it, only
+the column is added: events are read from either column, so existing events can be converted later by running the
+downgrade and upgrade again with the setting.
+
+Revision ID: c71d9a4e2f03
+Revises: a3c5e1f20b7d
+Create Date: 2026-10-17 14:38:06.517342
+
+"""
+from os import getenv
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from db_connector.torque_codec import TORQUE_ENCODINGS, encode_torque, decode_torque
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71d9a4e2f03'
+down_revision: Union[str, None] = 'a3c5e1f20b7d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows converted per statement
+BATCH_SIZE = 500
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # The column already exists when `DBConnector` created the table
+    if "torqueDataPacked" not in {column["name"] for column in sa.inspect(bind).get_columns("device_datas")}:
+        op.add_column("device_datas", sa.Column("torqueDataPacked", sa.LargeBinary(), nullable=True))
+
+    encoding = getenv("TORQUE_ENCODING", "array")
+    if encoding == "array":
+        return
+    if encoding not in TORQUE_ENCODINGS:
+        raise ValueError(f"Unrecognized torque encoding {encoding}")
+
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            'SELECT id, "torqueData" FROM device_datas '
+            'WHERE id > :last_id AND "torqueDataPacked" IS NULL AND cardinality("torqueData") > 0 '
+            'ORDER BY id LIMIT :limit'
+        ), {"last_id": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+
+        bind.execute(sa.text(
+            'UPDATE device_datas SET "torqueData" = \'{}\', "torqueDataPacked" = :packed WHERE id = :id'
+        ), [{"id": row_id, "packed": encode_torque(torque_data, encoding)} for row_id, torque_data in rows])
+        last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            'SELECT id, "torqueDataPacked" FROM device_datas '
+            'WHERE id > :last_id AND "torqueDataPacked" IS NOT NULL ORDER BY id LIMIT :limit'
+        ), {"last_id": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+
+        bind.execute(sa.text(
+            'UPDATE device_datas SET "torqueData" = CAST(:torque_data AS INTEGER[]), "torqueDataPacked" = NULL '
+            'WHERE id = :id'
+        ), [{"id": row_id, "torque_data": decode_torque(packed)} for row_id, packed in rows])
+        last_id = rows[-1][0]
+
+    op.drop_column("device_datas", "torqueDataPacked")
@@ -0,0 +1,43 @@
+"""Add the indexes of the event and auxiliary sensor data lookups
+
+- `ix_events_sensor_id_id`: events of a sensor, in id order (`get_events`, `get_event`, `get_sensors`)
+- `ix_events_live`: partial index of the live events of a sensor (`find_live_event`, live event upserts)
+- `ix_aux_sensor_data_sensor_timestamp`: data of an auxiliary sensor (`get_aux_sensor_data`)
+
+Indexes are built concurrently, so ingest is not blocked while they are built on large tables.
+
+Revision ID: d4e8b2a61c95
+Revises: c71d9a4e2f03
+Create Date: 2026-10-17 16:05:52.880417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e8b2a61c95'
+down_revision: Union[str, None] = 'c71d9a4e2f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction. The indexes already exist when the tables were created by
+    # `DBConnector`
+    with op.get_context().autocommit_block():
+        op.create_index("ix_events_sensor_id_id", "events", ["sensorID", "id"],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index("ix_events_live", "events", ["sensorID", "id"], postgresql_where=sa.text('"isStreaming"'),
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index("ix_aux_sensor_data_sensor_timestamp", "aux_sensor_data", ["aux_sensor_id", "timestamp"],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_aux_sensor_data_sensor_timestamp", "aux_sensor_data", postgresql_concurrently=True)
+        op.drop_index("ix_events_live", "events", postgresql_concurrently=True)
+        op.drop_index("ix_events_sensor_id_id", "events", postgresql_concurrently=True)
@@ -0,0 +1,134 @@
+"""Partition events and aux_sensor_data by month of their timestamp
+
+Each table is renamed, recreated with `PARTITION BY RANGE ("timestamp")` (the primary key becomes (id, timestamp), ids
+keep their sequence), the partitions of the months holding rows (and of the current and next months) are created, and
+the rows are copied before the old table is dropped. A unique constraint of a partitioned table must include the
+partition key, so the device info, data and trend info ids of `events` are indexed instead of unique and the foreign
+key of `data_records.eventID` is dropped.
+
+The rows are copied in a single transaction, plan for the time and disk space of a copy of both tables.
+
+Revision ID: e5f9c3b72d16
+Revises: d4e8b2a61c95
+Create Date: 2026-10-17 18:22:37.104955
+
+"""
+from typing import Callable, List, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from db_connector.partitions import add_months, create_partition, create_upcoming_partitions, month_start
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f9c3b72d16'
+down_revision: Union[str, None] = 'd4e8b2a61c95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def event_columns(sequence: str, partitioned: bool) -> List[sa.schema.SchemaItem]:
+    return [
+        sa.Column("id", sa.Integer(), server_default=sa.text(f"nextval('{sequence}'::regclass)"), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("isStreaming", sa.Boolean(), nullable=False),
+        sa.Column("deviceInfoID", sa.Integer(), sa.ForeignKey("device_infos.id"), nullable=False,
+                  unique=not partitioned),
+        sa.Column("deviceDataID", sa.Integer(), sa.ForeignKey("device_datas.id"), nullable=False,
+                  unique=not partitioned),
+        sa.Column("deviceTrendInfoID", sa.Integer(), sa.ForeignKey("device_trend_infos.id"), nullable=False,
+                  unique=not partitioned),
+        sa.Column("sensorID", sa.Integer(), sa.ForeignKey("sensors.id"), nullable=False),
+        sa.PrimaryKeyConstraint("id", "timestamp") if partitioned else sa.PrimaryKeyConstraint("id"),
+    ]
+
+
+def event_indexes(partitioned: bool) -> None:
+    op.create_index("ix_events_sensor_id_id", "events", ["sensorID", "id"])
+    op.create_index("ix_events_live", "events", ["sensorID", "id"], postgresql_where=sa.text('"isStreaming"'))
+    if partitioned:
+        for column in ("deviceInfoID", "deviceDataID", "deviceTrendInfoID"):
+            op.create_index(f"ix_events_{column}", "events", [column])
+
+
+def aux_sensor_data_columns(sequence: str, partitioned: bool) -> List[sa.schema.SchemaItem]:
+    return [
+        sa.Column("id", sa.Integer(), server_default=sa.text(f"nextval('{sequence}'::regclass)"), nullable=False),
+        sa.Column("aux_sensor_id", sa.Integer(), sa.ForeignKey("aux_sensors.id"), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("value", sa.Double(), nullable=False),
+        sa.PrimaryKeyConstraint("id", "timestamp") if partitioned else sa.PrimaryKeyConstraint("id"),
+    ]
+
+
+def aux_sensor_data_indexes(partitioned: bool) -> None:
+    op.create_index("ix_aux_sensor_data_sensor_timestamp", "aux_sensor_data", ["aux_sensor_id", "timestamp"])
+
+
+TABLES = {
+    "events": (event_columns, event_indexes),
+    "aux_sensor_data": (aux_sensor_data_columns, aux_sensor_data_indexes),
+}
+
+
+def is_partitioned(bind, table: str) -> bool:
+    return bind.scalar(sa.text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                               "WHERE partrelid = to_regclass(:table))"), {"table": table})
+
+
+def recreate(bind, table: str, partitioned: bool, create_partitions: Callable[[str, str], None] = None) -> None:
+    """
+    Renames `table`, creates it again (partitioned or not) with the same id sequence, copies the rows and drops the
+    renamed table.
+    """
+    columns, indexes = TABLES[table]
+    old = f"{table}_{'un' if partitioned else ''}partitioned"
+    sequence = bind.scalar(sa.text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table})
+
+    # Constraint and index names are unique per schema, the renamed table keeps them until dropped
+    op.rename_table(table, old)
+    for index in bind.scalars(sa.text("SELECT indexname FROM pg_indexes WHERE tablename = :table"), {"table": old}):
+        op.execute(f'ALTER INDEX "{index}" RENAME TO "{index[:50]}_old"')
+
+    kwargs = {"postgresql_partition_by": 'RANGE ("timestamp")'} if partitioned else {}
+    op.create_table(table, *columns(sequence, partitioned), **kwargs)
+    indexes(partitioned)
+    if create_partitions is not None:
+        create_partitions(table, old)
+
+    names = ", ".join(f'"{column.name}"' for column in columns(sequence, partitioned) if isinstance(column, sa.Column))
+    op.execute(f'INSERT INTO "{table}" ({names}) SELECT {names} FROM "{old}"')
+    op.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{table}".id')
+    op.execute(f'DROP TABLE "{old}" CASCADE')
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    def create_partitions(table: str, old: str) -> None:
+        # Partitions of the months of the existing rows
+        first, last = bind.execute(sa.text(f'SELECT min("timestamp"), max("timestamp") FROM "{old}"')).one()
+        if first is None:
+            return
+        month = month_start(first)
+        while month <= last:
+            create_partition(bind, table, month)
+            month = add_months(month, 1)
+
+    # Tables created partitioned by `DBConnector` are left as they are
+    for fk in sa.inspect(bind).get_foreign_keys("data_records"):
+        if fk["referred_table"] == "events":
+            op.drop_constraint(fk["name"], "data_records", type_="foreignkey")
+    for table in TABLES:
+        if not is_partitioned(bind, table):
+            recreate(bind, table, partitioned=True, create_partitions=create_partitions)
+    create_upcoming_partitions(bind)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    for table in TABLES:
+        if is_partitioned(bind, table):
+            recreate(bind, table, partitioned=False)
+    op.create_foreign_key(None, "data_records", "events", ["eventID"], ["id"])
@@ -0,0 +1,54 @@
+"""Add trend_rollups_hourly and trend_rollups_daily, the trends of the closed events of each sensor per hour and day
+
+Creates the tables and computes the rollups of the closed events already stored (see `db_connector.rollups`), new
+events are then added as they are closed.
+
+Revision ID: f2a6d8c41e57
+Revises: e5f9c3b72d16
+Create Date: 2026-10-17 21:05:13.482190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from db_connector.rollups import TREND_METRICS, rebuild_rollups
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a6d8c41e57'
+down_revision: Union[str, None] = 'e5f9c3b72d16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("trend_rollups_hourly", "trend_rollups_daily")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    for table in TABLES:
+        # The table already exists (empty) when it was created by `DBConnector` on startup
+        if sa.inspect(bind).has_table(table):
+            continue
+        metrics = []
+        for metric in TREND_METRICS:
+            metrics += [
+                sa.Column(f"{metric}Min", sa.Integer(), nullable=False),
+                sa.Column(f"{metric}Max", sa.Integer(), nullable=False),
+                sa.Column(f"{metric}Sum", sa.BigInteger(), nullable=False),
+            ]
+        op.create_table(
+            table,
+            sa.Column("sensorID", sa.Integer(), sa.ForeignKey("sensors.id"), nullable=False),
+            sa.Column("bucket", sa.DateTime(), nullable=False),
+            sa.Column("eventCount", sa.Integer(), nullable=False),
+            *metrics,
+            sa.PrimaryKeyConstraint("sensorID", "bucket"),
+        )
+    rebuild_rollups(bind)
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.drop_table(table)
@@ -9,14 +9,20 @@ This module also runs the `ThreadedMQTTClient`, which updates the database based
 sent to the MQTT broker.
 
 Endpoints:
-    /sensors (GET): List of sensors
+    /sensors (GET): List of sensors with their event count, last event time and streaming status (paginated, devEUI
+                    prefix search)
     /sensors/<int:sensor_id>/events (GET): List of events for given sensor ID with trend information
     /sensors/<int:sensor_id>/events/last/<int:last_n_events> (GET): List of events for given sensor ID with trend
                                                                     information for last n_events.
+    /sensors/<int:sensor_id>/events/page (GET): Page of the events of given sensor ID with their trends in columnar
+                                                form (keyset pagination on event ID, optional time bounds)
+    /events (GET): Events of some or all sensors in a time window with their trends in columnar form
+    /sensors/<int:sensor_id>/trends (GET): Hourly or daily trend rollups of the closed events of given sensor ID
     /sensors/<int:sensor_id>/events/<int:event_id> (GET): Event information for given event ID without hidden data
     /sensors/<int:sensor_id>/events/<int:event_id>/hidden (GET): Event information for given event ID with hidden data
     /sensors/<int:sensor_id>/events/<int:event_id>/download (GET): Event CSV for given event ID without hidden data
     /sensors/<int:sensor_id>/events/<int:event_id>/download/hidden (GET): Event CSV for given event ID with hidden data
+    /ingest/stats (GET): MQTT ingest queue depth, worker, in-flight table, journal, coalescer and live event cache stats
 
 Authors:
     Aidan Queng (jaidanqueng@gmail.com), Texas A&M University
@@ -31,11 +37,16 @@ Date:
 
 from flask import Blueprint, jsonify, Response, request
 from db_connector import DBConnector, queries
+from db_connector.coalescer import WriteCoalescer
+from db_connector.live_cache import LiveEventCache
+from db_connector.rollups import ROLLUP_RESOLUTIONS
 from mqtt_client import ThreadedMQTTClient
 from mqtt_client.sensor_event import SensorEvent
 from mqtt_client.aux_sensor_event import AuxSensorEvent
 import logging, csv
+from datetime import datetime
 from io import StringIO
+from typing import Optional
 from .custom_csv import fetch_event_data, format_event_data, write_event_csv
 
 
@@ -48,11 +59,31 @@ _conn = DBConnector()
 @api_v1.route("/sensors")
 def sensors():
     """
-    Returns a JSON object containing a list of sensors. Also provides devEUI and number of events associated with
-    sensor.
+    Returns a JSON object containing a list of sensors. Also provides devEUI, number of events, time of the last event
+    and whether it is live for each sensor, read from the counters of the sensors (see `queries.get_sensor_summaries`).
+
+    Query parameters:
+        prefix (str, optional): Only sensors whose devEUI starts with it.
+        after_id (int, optional): Only sensors with a greater id, the id of the last sensor of the previous page.
+        limit (int, optional): Maximum number of sensors. Defaults to all sensors.
     """
-    sensors = _conn.execute_query_readonly(queries.get_sensors)
-    sensor_datas = [{"id": sensor.id, "devEUI": sensor.devEUI, "numEvents": len(sensor.events)} for sensor in sensors]
+    prefix = request.args.get("prefix")
+    after_id = request.args.get("after_id", type=int)
+    limit = request.args.get("limit", type=int)
+    if limit is not None and limit < 0:
+        return jsonify({"error": "limit must not be negative"}), 400
+
+    sensors = _conn.execute_query_readonly(queries.get_sensor_summaries, prefix, after_id, limit)
+    sensor_datas = [
+        {
+            "id": sensor.id,
+            "devEUI": sensor.devEUI,
+            "numEvents": sensor.eventCount,
+            "lastEventTimestamp": sensor.lastEventTimestamp,
+            "isStreaming": sensor.isStreaming,
+        }
+        for sensor in sensors
+    ]
     return jsonify(sensor_datas)
 
 @api_v1.route("/aux_sensors")
@@ -65,35 +96,146 @@ def aux_sensors():
     return jsonify(sensor_datas)
 
 
+# Largest page of `/sensors/<int:sensor_id>/events/page`
+MAX_EVENT_PAGE = 1000
+
+# Most events returned by `/events`
+MAX_WINDOW_EVENTS = 10000
+
+
+def _time_arg(name: str) -> Optional[datetime]:
+    """
+    Args:
+        name (str): Query parameter.
+
+    Raises:
+        ValueError: Raised when the parameter is not an ISO 8601 time.
+
+    Returns:
+        datetime | None: Time of the query parameter, None when it is missing.
+    """
+    return datetime.fromisoformat(request.args[name]) if name in request.args else None
+
+
 @api_v1.route("/sensors/<int:sensor_id>/events")
 @api_v1.route("/sensors/<int:sensor_id>/events/last/<int:last_n_events>")  # Convert to POST endpoint if more options needed
 def events(sensor_id: int, last_n_events: int = 30):
     """
-    Returns a JSON object containing a list of events, as well as trend data for the last n events.
+    Returns a JSON object containing a list of events, as well as trend data for the last n events. See
+    `/sensors/<int:sensor_id>/events/page` to page through the events instead.
 
     Args:
         sensor_id (int): ID of sensor.
         last_n_events (int, optional): Number of events to use for trend info. Defaults to 30.
     """
-    # Get event data
-    events = _conn.execute_query_readonly(queries.get_events, sensor_id)
-    event_datas = [{"id": event.id, "timestamp": event.timestamp} for event in events]
+    # Get event ids, timestamps and trends (columns only, no entities)
+    columns = _conn.execute_query_readonly(queries.get_event_columns, sensor_id)
+    event_datas = [{"id": id, "timestamp": timestamp} for id, timestamp in zip(columns["ids"], columns["timestamps"])]
     # Get device trend info for last n events
-    last_events = events[-1 * abs(last_n_events):]
-    batteryVoltages = [event.deviceTrendInfo.batteryVoltage for event in last_events]
-    temperatures = [event.deviceTrendInfo.temperature for event in last_events]
-    maxTorques = [event.deviceTrendInfo.maxTorque for event in last_events]
-    strokeTimes = [event.deviceTrendInfo.strokeTime for event in last_events]
+    first = max(len(event_datas) - abs(last_n_events), 0)
 
     return jsonify({
         "event_datas": event_datas,
-        "batteryVoltages": batteryVoltages,
-        "maxTorques": maxTorques,
-        "strokeTimes": strokeTimes,
-        "temperatures": temperatures,
+        **{name: columns[name][first:] for name in queries.EVENT_TREND_COLUMNS},
     })
 
 
+@api_v1.route("/sensors/<int:sensor_id>/events/page")
+def event_page(sensor_id: int):
+    """
+    Returns a JSON object containing a page of events in columnar form: lists of ids, timestamps and trends (battery
+    voltages, max torques, stroke times and temperatures), ordered by id. `next_after_id` is the `after_id` of the
+    next page, null on the last page.
+
+    Query parameters:
+        after_id (int, optional): Only events with a greater id. Defaults to the first event.
+        limit (int, optional): Number of events, at most `MAX_EVENT_PAGE`. Defaults to 100.
+        since (str, optional): ISO 8601 time, only events from it.
+        before (str, optional): ISO 8601 time, only events before it.
+        latest (bool, optional): `true` for the last `limit` events (after `after_id`) instead of the first ones.
+
+    Args:
+        sensor_id (int): ID of sensor.
+    """
+    after_id = request.args.get("after_id", type=int)
+    limit = request.args.get("limit", 100, type=int)
+    latest = request.args.get("latest", "false").lower() == "true"
+    if not 0 < limit <= MAX_EVENT_PAGE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_EVENT_PAGE}"}), 400
+    try:
+        since, before = _time_arg("since"), _time_arg("before")
+    except ValueError:
+        return jsonify({"error": "since and before must be ISO 8601 times"}), 400
+
+    columns = _conn.execute_query_readonly(queries.get_event_columns, sensor_id, after_id, limit, since, before,
+                                           latest)
+    full_page = len(columns["ids"]) == limit and not latest
+    return jsonify({**columns, "next_after_id": columns["ids"][-1] if full_page else None})
+
+
+@api_v1.route("/events")
+def events_between():
+    """
+    Returns a JSON object containing the events of some or all sensors in a time window in columnar form: lists of ids,
+    sensor ids, timestamps and trends (battery voltages, max torques, stroke times and temperatures), ordered by time.
+    `truncated` is true when the limit was reached, narrow the window to get the remaining events.
+
+    Query parameters:
+        start (str): ISO 8601 time, only events from it.
+        end (str): ISO 8601 time, only events before it.
+        sensor_id (int, optional): ID of sensor, may be repeated. Defaults to all sensors.
+        limit (int, optional): Maximum number of events, at most `MAX_WINDOW_EVENTS`. Defaults to `MAX_WINDOW_EVENTS`.
+    """
+    sensor_ids = request.args.getlist("sensor_id", type=int) or None
+    limit = request.args.get("limit", MAX_WINDOW_EVENTS, type=int)
+    if not 0 < limit <= MAX_WINDOW_EVENTS:
+        return jsonify({"error": f"limit must be between 1 and {MAX_WINDOW_EVENTS}"}), 400
+    try:
+        start, end = _time_arg("start"), _time_arg("end")
+    except ValueError:
+        start = end = None
+    if start is None or end is None:
+        return jsonify({"error": "start and end must be ISO 8601 times"}), 400
+
+    columns = _conn.execute_query_readonly(queries.get_events_between, sensor_ids, start, end, limit)
+    return jsonify({**columns, "truncated": len(columns["ids"]) == limit})
+
+
+@api_v1.route("/sensors/<int:sensor_id>/trends")
+def trends(sensor_id: int):
+    """
+    Returns a JSON object containing the trends of the closed events of a sensor per hour or day, read from the
+    rollups (one row per bucket, see `db_connector.rollups`). Each trend has the min, max and mean of every bucket.
+
+    Query parameters:
+        resolution (str, optional): `hour` or `day`. Defaults to `hour`.
+        start (str, optional): ISO 8601 time of the first bucket. Defaults to the first bucket.
+        end (str, optional): ISO 8601 time, only buckets before it. Defaults to the last bucket.
+
+    Args:
+        sensor_id (int): ID of sensor.
+    """
+    resolution = request.args.get("resolution", "hour")
+    if resolution not in ROLLUP_RESOLUTIONS:
+        return jsonify({"error": f"resolution must be one of {', '.join(ROLLUP_RESOLUTIONS)}"}), 400
+    try:
+        start, end = _time_arg("start"), _time_arg("end")
+    except ValueError:
+        return jsonify({"error": "start and end must be ISO 8601 times"}), 400
+
+    rollups = _conn.execute_query_readonly(queries.get_trend_rollups, sensor_id, resolution, start, end)
+    trend_datas = {"resolution": resolution, "buckets": [rollup.bucket for rollup in rollups],
+                   "eventCounts": [rollup.eventCount for rollup in rollups]}
+    for metric, name in (("batteryVoltage", "batteryVoltages"), ("maxTorque", "maxTorques"),
+                         ("strokeTime", "strokeTimes"), ("temperature", "temperatures")):
+        trend_datas[name] = {
+            "min": [getattr(rollup, f"{metric}Min") for rollup in rollups],
+            "max": [getattr(rollup, f"{metric}Max") for rollup in rollups],
+            "mean": [getattr(rollup, f"{metric}Sum") / rollup.eventCount for rollup in rollups],
+        }
+    return jsonify(trend_datas)
+
+
 @api_v1.route("/sensors/<int:sensor_id>/events/<int:event_id>")
 @api_v1.route("/sensors/<int:sensor_id>/events/<int:event_id>/hidden")
 def event(sensor_id: int, event_id: int):
@@ -140,18 +282,49 @@ def event_download(sensor_id, event_id):
     )
 
 
+@api_v1.route("/ingest/stats")
+def ingest_stats():
+    """
+    Returns a JSON object containing the MQTT ingest queue depth and worker stats (empty if messages are processed on
+    the MQTT network thread), the in-flight table stats, the journal stats (if enabled), the write coalescer stats and
+    the live event cache stats.
+    """
+    stats = threaded_client.ingest_stats() or {}
+    stats["inflight"] = threaded_client.inflight_stats()
+    stats["journal"] = threaded_client.journal_stats()
+    stats["coalescer"] = _coalescer.stats()
+    stats["live_cache"] = _live_cache.stats()
+    return jsonify(stats)
+
+
 # Real-time packet updates. Split up for future ease of alterations
+def _upsert_live_sensor_event(sensor_event: SensorEvent, event_type: int, prev_sensor_event: SensorEvent = None):
+    _conn.execute_query(queries.upsert_live_sensor_event_core, sensor_event, event_type, prev_sensor_event,
+                        cache=_live_cache)
+
+# Primary keys of the live events, saves searching for them on every packet
+_live_cache = LiveEventCache()
+
+# Data packets are buffered per device, heartbeats and summaries flush them
+_coalescer = WriteCoalescer(_upsert_live_sensor_event)
+_coalescer.start()
+
 def on_heartbeat_packet(sensor_event: SensorEvent):
-    _conn.execute_query(queries.upsert_live_sensor_event, sensor_event, 0)
+    _coalescer.heartbeat_packet(sensor_event)
 
 def on_data_packet(sensor_event: SensorEvent):
-    _conn.execute_query(queries.upsert_live_sensor_event, sensor_event, 1)
+    _coalescer.data_packet(sensor_event)
 
 def on_c02_packet(aux_sensor_event:AuxSensorEvent):
     _conn.execute_query(queries.add_aux_sensor_data, aux_sensor_event)
 
 def on_event_summary_packet(sensor_event: SensorEvent, prev_sensor_event: SensorEvent):
-    _conn.execute_query(queries.upsert_live_sensor_event, sensor_event, 2, prev_sensor_event)
+    _coalescer.event_summary_packet(sensor_event, prev_sensor_event)
+
+def on_abandoned_event(sensor_event: SensorEvent):
+    # Write the buffered packets, the event is left as streaming in the database
+    logging.warning(f"Abandoned incomplete event of {sensor_event.devEUI}")
+    _coalescer.flush(sensor_event.devEUI)
 
 ### Auxilary Sensor API ###
 @api_v1.route("/devices", methods=["GET"])
@@ -209,5 +382,6 @@ def on_message_complete(sensor_event: SensorEvent):
     _conn.execute_query(queries.add_sensor_event, sensor_event)
 
 
-threaded_client = ThreadedMQTTClient(on_heartbeat_packet, on_data_packet, on_event_summary_packet, on_message_complete,on_c02_packet)
+threaded_client = ThreadedMQTTClient(on_heartbeat_packet, on_data_packet, on_event_summary_packet, on_message_complete,on_c02_packet,
+                                     on_abandoned_event=on_abandoned_event)
 threaded_client.start()
@@ -23,9 +23,10 @@ def format_event_data(event: Event, hide_packet_data: bool = False) -> dict:
         dict: Dictionary containing event data
     """
     hide_packets = event.deviceData.hiddenDataIndices
-    packet_numbers = event.deviceData.recordNumbers
-    packet_lengths = event.deviceData.recordLengths
-    data = event.deviceData.torqueData
+    packet_data = queries.event_packet_data(event)
+    packet_numbers = packet_data["recordNumbers"]
+    packet_lengths = packet_data["recordLengths"]
+    data = packet_data["torqueData"]
 
     new_data = []
     new_packet_numbers = []
@@ -69,8 +70,8 @@ def format_event_data(event: Event, hide_packet_data: bool = False) -> dict:
         "recordLengths": new_packet_lengths,
         "torqueData": new_data,
         "typeOfStroke": event.deviceData.typeOfStroke,
-        "dataRecordPayloadCRCs": event.deviceData.dataRecordPayloadCRCs,
-        "calculatedDataRecordPayloadCRCs": event.deviceData.calculatedDataRecordPayloadCRCs,
+        "dataRecordPayloadCRCs": packet_data["dataRecordPayloadCRCs"],
+        "calculatedDataRecordPayloadCRCs": packet_data["calculatedDataRecordPayloadCRCs"],
         "eventRecordPayloadCRC": event.deviceData.eventRecordPayloadCRC,
         "calculatedEventRecordPayloadCRC": event.deviceData.calculatedEventRecordPayloadCRC,
         "heartbeatRecordPayloadCRC": event.deviceData.heartbeatRecordPayloadCRC,
@@ -93,6 +94,7 @@ def fetch_event_data(conn: DBConnector, sensor_id: int, event_id: int) -> dict:
     """
     # Fetch the event data from the database
     event = conn.execute_query_readonly(queries.get_event, sensor_id, event_id)
+    packet_data = queries.event_packet_data(event)
 
     # Extract and structure the event data
     event_data = {
@@ -113,13 +115,13 @@ def fetch_event_data(conn: DBConnector, sensor_id: int, event_id: int) -> dict:
         "batteryVoltage": event.deviceTrendInfo.batteryVoltage,
         "lastTorqueBeforeSleep": event.deviceData.lastTorqueBeforeSleep,
         "firstTorqueAfterSleep": event.deviceData.firstTorqueAfterSleep,
-        "recordNumbers": event.deviceData.recordNumbers,
-        "recordLengths": event.deviceData.recordLengths,
-        "torqueData": event.deviceData.torqueData,
+        "recordNumbers": packet_data["recordNumbers"],
+        "recordLengths": packet_data["recordLengths"],
+        "torqueData": packet_data["torqueData"],
         "hiddenDataIndices": event.deviceData.hiddenDataIndices,
         "typeOfStroke": event.deviceData.typeOfStroke,
-        "dataRecordPayloadCRCs": event.deviceData.dataRecordPayloadCRCs,
-        "calculatedDataRecordPayloadCRCs": event.deviceData.calculatedDataRecordPayloadCRCs,
+        "dataRecordPayloadCRCs": packet_data["dataRecordPayloadCRCs"],
+        "calculatedDataRecordPayloadCRCs": packet_data["calculatedDataRecordPayloadCRCs"],
         "eventRecordPayloadCRC": event.deviceData.eventRecordPayloadCRC,
         "calculatedEventRecordPayloadCRC": event.deviceData.calculatedEventRecordPayloadCRC,
         "heartbeatRecordPayloadCRC": event.deviceData.heartbeatRecordPayloadCRC,
@@ -0,0 +1,365 @@
+"""
+Standalone python file meant for loading historical captures into the database. This program scans folders for
+captures (`mqtt_client.capture` directories or folders of `.data` dump files), assembles their events in a pool of
+processes and inserts them in large batches, one transaction per batch.
+
+Events are inserted grouped by device, in the order they were captured. The event time is the capture time of its
+first packet. Events without an event summary at the end of a capture are inserted as complete (not streaming), so
+they are never matched by live updates.
+
+Progress is saved to a state file after every batch, rerunning the same command skips the captures (and the events of
+a partially imported capture) that were already committed.
+
+Example:
+    `python backfill.py data/2025-*` (from the `backend` folder)
+    `python backfill.py data --workers 8 --batch-size 5000 --state data/backfill.json`
+
+Date:
+    October 2026
+"""
+
+import argparse
+import json
+import logging
+from collections.abc import Callable
+from datetime import datetime
+from multiprocessing import Pool
+from os import cpu_count, getenv, listdir, replace, walk
+from os.path import abspath, isfile, join
+from time import monotonic
+from typing import Any, Dict, List, NamedTuple, Tuple, Union
+from mqtt_client.aux_sensor_event import AuxSensorEvent
+from mqtt_client.capture import TOPICS_FILE, CaptureReader, read_dump_files
+from mqtt_client.duplicates import DuplicateDetector
+from mqtt_client.sensor_event import SensorEvent
+
+
+# (event time, event) of a valve event, or a CO2 event (timestamp set to its capture time)
+Item = Union[Tuple[datetime, SensorEvent], AuxSensorEvent]
+
+
+class SourceResult(NamedTuple):
+    """
+    Events assembled from one capture.
+
+    Attributes:
+        source (str): Capture path.
+        items (List[Item]): Events, grouped by device in capture order.
+        messages (int): Number of messages read.
+        incomplete (int): Number of events without an event summary.
+        errors (int): Number of messages that could not be parsed.
+    """
+    source: str
+    items: List[Item]
+    messages: int
+    incomplete: int
+    errors: int
+
+
+def is_source(path: str) -> bool:
+    """
+    Args:
+        path (str): Directory.
+
+    Returns:
+        bool: Whether the directory is a capture or holds `.data` dump files.
+    """
+    return isfile(join(path, TOPICS_FILE)) or any(name.endswith(".data") for name in listdir(path))
+
+
+def find_sources(paths: List[str]) -> List[str]:
+    """
+    Finds the captures in and below the given directories.
+
+    Args:
+        paths (List[str]): Directories to scan.
+
+    Returns:
+        List[str]: Absolute paths of the captures, sorted.
+    """
+    sources = set()
+    for path in paths:
+        for directory, subdirectories, _ in walk(path):
+            if is_source(directory):
+                sources.add(abspath(directory))
+                if isfile(join(directory, TOPICS_FILE)):
+                    subdirectories.clear()
+    return sorted(sources)
+
+
+def assemble_source(source: str) -> SourceResult:
+    """
+    Parses the messages of a capture into events, the same way `ThreadedMQTTClient` does (duplicate packets of the
+    previous event of a device are hidden). Executed in the worker processes.
+
+    Args:
+        source (str): Capture path.
+
+    Returns:
+        SourceResult: Assembled events.
+    """
+    messages = CaptureReader(source) if isfile(join(source, TOPICS_FILE)) else read_dump_files(source)
+    # devEUI -> {"current_event", "start", "duplicates"}
+    devices: Dict[str, Dict[str, Any]] = {}
+    events: Dict[str, List[Item]] = {}
+    count = errors = 0
+
+    for timestamp, topic, payload in messages:
+        count += 1
+        try:
+            _, devEUI, _, port = topic.strip().split("/")
+            if port == "15":
+                aux_event = AuxSensorEvent()
+                aux_event.parse_from_data(topic, payload)
+                aux_event.timestamp = datetime.fromtimestamp(timestamp)
+                events.setdefault(devEUI, []).append(aux_event)
+                continue
+
+            device = devices.setdefault(devEUI, {"current_event": SensorEvent(), "start": timestamp,
+                                                 "duplicates": DuplicateDetector()})
+            if device["current_event"].devEUI is None:
+                device["start"] = timestamp
+            device["current_event"].parse_from_data(topic, payload)
+
+            if port == "13":
+                device["duplicates"].data_packet(device["current_event"], payload)
+            elif port == "14":
+                sensor_event = device["current_event"]
+                device["duplicates"].finalize(sensor_event)
+                events.setdefault(devEUI, []).append((datetime.fromtimestamp(device["start"]), sensor_event))
+                device["current_event"] = SensorEvent()
+                device["duplicates"] = DuplicateDetector(sensor_event)
+        except Exception as e:
+            errors += 1
+            logging.debug(f"Could not parse message from topic {topic} in {source}: {e}")
+
+    # Events cut off by the end of the capture
+    incomplete = 0
+    for devEUI, device in devices.items():
+        sensor_event = device["current_event"]
+        if sensor_event.devEUI is not None:
+            incomplete += 1
+            device["duplicates"].finalize(sensor_event)
+            events.setdefault(devEUI, []).append((datetime.fromtimestamp(device["start"]), sensor_event))
+
+    items = [item for devEUI in sorted(events) for item in events[devEUI]]
+    return SourceResult(source, items, count, incomplete, errors)
+
+
+class BackfillState:
+    """
+    Number of events committed for each capture, saved as JSON.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Initializes the object, loading the state file if it exists.
+
+        Args:
+            path (str, optional): State file. Defaults to None (nothing is saved).
+        """
+        self.path = path
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        if path is not None and isfile(path):
+            with open(path) as f:
+                self.sources = json.load(f)["sources"]
+
+    def committed(self, source: str) -> int:
+        return self.sources.get(source, {}).get("committed", 0)
+
+    def done(self, source: str) -> bool:
+        return self.sources.get(source, {}).get("done", False)
+
+    def update(self, source: str, committed: int, done: bool) -> None:
+        self.sources[source] = {"committed": committed, "done": done}
+
+    def save(self) -> None:
+        """
+        Writes the state file atomically.
+        """
+        if self.path is None:
+            return
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"sources": self.sources}, f, indent=1)
+        replace(self.path + ".tmp", self.path)
+
+
+def insert_items(conn, items: List[Item]) -> None:
+    """
+    Inserts events in a single transaction.
+
+    Args:
+        conn (DBConnector): Database connection.
+        items (List[Item]): Events.
+
+    Raises:
+        Exception: When the transaction failed (nothing was inserted).
+    """
+    from db_connector import queries
+
+    sensor_items = [item for item in items if isinstance(item, tuple)]
+    with conn.Session.begin() as session:
+        queries.add_sensor_events_bulk(session, [sensor_event for _, sensor_event in sensor_items],
+                                       [timestamp for timestamp, _ in sensor_items])
+        for item in items:
+            if isinstance(item, AuxSensorEvent):
+                queries.add_aux_sensor_data(session, item)
+
+
+class Backfill:
+    """
+    Imports captures: assembles events in a process pool and inserts them in batches, saving progress after every
+    batch.
+    """
+    batch_size: int = int(getenv("BACKFILL_BATCH_SIZE", 2000))
+
+    def __init__(self, insert: Callable[[List[Item]], None], state: BackfillState = None, batch_size: int = None,
+                 workers: int = None):
+        """
+        Initializes the object.
+
+        Args:
+            insert (Callable): Executed with the events of a batch, should insert them in one transaction.
+            state (BackfillState, optional): Progress, updated and saved after every batch. Defaults to a new state.
+            batch_size (int, optional): Number of events per transaction. Defaults to `BACKFILL_BATCH_SIZE` or 2000.
+            workers (int, optional): Number of worker processes, 0 assembles in this process. Defaults to the CPU
+                count.
+
+        Raises:
+            ValueError: When the batch size is not positive.
+        """
+        if batch_size is not None:
+            self.batch_size = batch_size
+        if self.batch_size <= 0:
+            raise ValueError("Batch size must be positive")
+
+        self.insert = insert
+        self.state = state or BackfillState()
+        self.workers = cpu_count() if workers is None else workers
+
+        self.progress: Callable[[Dict[str, Any]], None] = None
+        self._batch: List[Item] = []
+        self._parts: List[Tuple[str, int, bool]] = []   # (source, committed after the batch, last part)
+
+        # Stats
+        self.start = monotonic()
+        self.sources_total = 0
+        self.sources_done = 0
+        self.messages = 0
+        self.events = 0
+        self.incomplete = 0
+        self.errors = 0
+
+    def run(self, sources: List[str], progress: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """
+        Imports the captures that are not done yet.
+
+        Args:
+            sources (List[str]): Capture paths, imported in order.
+            progress (Callable, optional): Executed with `stats()` after every batch. Defaults to None.
+
+        Returns:
+            Dict[str, Any]: Final stats.
+        """
+        pending = [source for source in sources if not self.state.done(source)]
+        self.sources_total = len(pending)
+        self.start = monotonic()
+        self.progress = progress
+
+        if self.workers > 0 and len(pending) > 1:
+            with Pool(min(self.workers, len(pending))) as pool:
+                for result in pool.imap(assemble_source, pending):
+                    self._add(result)
+        else:
+            for source in pending:
+                self._add(assemble_source(source))
+        self._commit()
+        return self.stats()
+
+    def _add(self, result: SourceResult) -> None:
+        self.messages += result.messages
+        self.incomplete += result.incomplete
+        self.errors += result.errors
+
+        # Skip events committed by a previous run
+        committed = self.state.committed(result.source)
+        items = result.items[committed:]
+        while True:
+            take = items[:self.batch_size - len(self._batch)]
+            items = items[len(take):]
+            committed += len(take)
+            self._batch += take
+            self._parts.append((result.source, committed, not items))
+            if len(self._batch) < self.batch_size:
+                return
+            self._commit()
+            if not items:
+                return
+
+    def _commit(self) -> None:
+        if not self._parts:
+            return
+        if self._batch:
+            self.insert(self._batch)
+            self.events += len(self._batch)
+
+        for source, committed, last in self._parts:
+            self.state.update(source, committed, last)
+            self.sources_done += last
+        self.state.save()
+        self._batch, self._parts = [], []
+
+        if self.progress is not None:
+            self.progress(self.stats())
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Captures done and pending, messages read, events inserted (and incomplete), parse errors,
+            elapsed seconds, events per second and estimated seconds left.
+        """
+        elapsed = monotonic() - self.start
+        rate = self.sources_done / elapsed if elapsed else 0.0
+        return {
+            "sources_done": self.sources_done,
+            "sources_total": self.sources_total,
+            "messages": self.messages,
+            "events": self.events,
+            "incomplete": self.incomplete,
+            "errors": self.errors,
+            "elapsed": elapsed,
+            "events_per_second": self.events / elapsed if elapsed else 0.0,
+            "eta": (self.sources_total - self.sources_done) / rate if rate else None,
+        }
+
+
+def print_progress(stats: Dict[str, Any]) -> None:
+    eta = f"{stats['eta']:.0f} s" if stats["eta"] is not None else "?"
+    print(f"[{stats['sources_done']}/{stats['sources_total']} captures] {stats['events']} events, "
+          f"{stats['events_per_second']:.0f} events/s, {stats['errors']} errors, ETA {eta}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Imports captured messages into the database")
+    parser.add_argument("paths", nargs="+", help="Directories scanned for captures")
+    parser.add_argument("--state", default="backfill-state.json", help="Progress file used to resume")
+    parser.add_argument("--batch-size", type=int, help="Events per transaction (defaults to BACKFILL_BATCH_SIZE)")
+    parser.add_argument("--workers", type=int, help="Worker processes (defaults to the CPU count)")
+    args = parser.parse_args()
+
+    from db_connector import DBConnector
+    conn = DBConnector()
+    logging.getLogger().setLevel(logging.WARNING)   # DBConnector enables debug logging
+
+    sources = find_sources(args.paths)
+    state = BackfillState(args.state)
+    print(f"Found {len(sources)} captures, {sum(state.done(source) for source in sources)} already imported")
+
+    backfill = Backfill(lambda items: insert_items(conn, items), state, args.batch_size, args.workers)
+    stats = backfill.run(sources, print_progress)
+    print(f"Imported {stats['events']} events ({stats['incomplete']} incomplete) from {stats['messages']} messages "
+          f"in {stats['elapsed']:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Standalone python file meant for benchmarking purposes. This program compares inserting complete sensor events with
+`queries.add_sensor_event` (one transaction per event, as `DBConnector.execute_query` does) and
+`queries.add_sensor_events_bulk` (set-based statements, one transaction).
+
+Requires a database (`POSTGRES_*` variables), preferably a scratch one. The rows inserted are deleted at the end.
+
+Example:
+    `python -m benchmarks.bench_bulk_insert` (from the `backend` folder)
+    `python -m benchmarks.bench_bulk_insert 20000`
+
+Date:
+    October 2026
+"""
+
+import logging
+import random
+import sys
+from time import perf_counter
+from typing import List
+from sqlalchemy import delete, select
+from db_connector import DBConnector, queries
+from db_connector.models import (Sensor, Event, DeviceData, DeviceInfo, DeviceTrendInfo, DataRecord, HourlyTrendRollup,
+                                  DailyTrendRollup)
+from mqtt_client.sensor_event import SensorEvent
+from mqtt_client.simulator import VirtualDevice
+
+
+EVENTS = 2000
+PER_EVENT_EVENTS = 500      # One transaction per event is slow, use fewer events
+DEVICES = 50
+
+
+def make_events(count: int) -> List[SensorEvent]:
+    rng = random.Random(0)
+    devices = [VirtualDevice(f"bench-{i:04d}", rng) for i in range(DEVICES)]
+    events = []
+    for i in range(count):
+        sensor_event = SensorEvent()
+        for topic, payload in devices[i % DEVICES].stroke():
+            sensor_event.parse_from_data(topic, payload)
+        events.append(sensor_event)
+    return events
+
+
+def cleanup(conn: DBConnector) -> None:
+    with conn.Session.begin() as session:
+        sensor_ids = select(Sensor.id).where(Sensor.devEUI.like("bench-%"))
+        events = session.execute(select(Event.deviceInfoID, Event.deviceDataID, Event.deviceTrendInfoID)
+                                 .where(Event.sensorID.in_(sensor_ids))).all()
+        event_ids = select(Event.id).where(Event.sensorID.in_(sensor_ids))
+        session.execute(delete(DataRecord).where(DataRecord.eventID.in_(event_ids)))
+        session.execute(delete(Event).where(Event.sensorID.in_(sensor_ids)))
+        for i, model in enumerate((DeviceInfo, DeviceData, DeviceTrendInfo)):
+            session.execute(delete(model).where(model.id.in_([row[i] for row in events])))
+        for model in (HourlyTrendRollup, DailyTrendRollup):
+            session.execute(delete(model).where(model.sensorID.in_(sensor_ids)))
+        session.execute(delete(Sensor).where(Sensor.devEUI.like("bench-%")))
+
+
+def report(name: str, count: int, seconds: float) -> None:
+    print(f"{name:<45} {count:>6} events {seconds:>8.2f} s {count / seconds:>8.0f} events/s")
+
+
+def main(count: int = EVENTS):
+    conn = DBConnector()
+    logging.getLogger().setLevel(logging.WARNING)   # DBConnector enables debug logging
+    events = make_events(count)
+    per_event_count = min(count, PER_EVENT_EVENTS)
+    cleanup(conn)
+
+    try:
+        start = perf_counter()
+        for sensor_event in events[:per_event_count]:
+            with conn.Session.begin() as session:
+                queries.add_sensor_event(session, sensor_event)
+        report("add_sensor_event (transaction per event)", per_event_count, perf_counter() - start)
+        cleanup(conn)
+
+        start = perf_counter()
+        with conn.Session.begin() as session:
+            queries.add_sensor_events_bulk(session, events)
+        report("add_sensor_events_bulk (one transaction)", count, perf_counter() - start)
+    finally:
+        cleanup(conn)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else EVENTS)
@@ -0,0 +1,68 @@
+"""
+Standalone python file meant for benchmarking purposes. This program compares recording and reading data record
+(port 13) sized messages with the previous dump format (one file per message) and the indexed capture of
+`mqtt_client.capture`, and measures scanning a single topic of a capture.
+
+Example:
+    `python -m benchmarks.bench_capture` (from the `backend` folder)
+
+Date:
+    October 2026
+"""
+
+import os
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from mqtt_client.capture import CaptureReader, CaptureWriter, read_dump_files
+from mqtt_client.dump_client import sanitize_topic
+
+
+MESSAGES = 20000
+DEVICES = 100
+PAYLOAD = os.urandom(104)
+TOPICS = [f"sensors/39-32-30-31-79-30-{i >> 8:02x}-{i & 0xff:02x}/port/13" for i in range(DEVICES)]
+
+
+def report(name: str, messages: int, seconds: float) -> None:
+    print(f"{name:<30} {messages / seconds:>10.0f} msg/s")
+
+
+def bench_files() -> None:
+    with TemporaryDirectory() as directory:
+        start = perf_counter()
+        for i in range(MESSAGES):
+            with open(os.path.join(directory, f"{1729792596 + i / 100}.{sanitize_topic(TOPICS[i % DEVICES])}.data"),
+                      "wb") as f:
+                f.write(PAYLOAD)
+        report("files, write", MESSAGES, perf_counter() - start)
+
+        start = perf_counter()
+        assert len(read_dump_files(directory)) == MESSAGES
+        report("files, read", MESSAGES, perf_counter() - start)
+
+
+def bench_capture() -> None:
+    with TemporaryDirectory() as directory:
+        start = perf_counter()
+        with CaptureWriter(directory, segment_size=1024 * 1024) as writer:
+            for i in range(MESSAGES):
+                writer.append(1729792596 + i / 100, TOPICS[i % DEVICES], PAYLOAD)
+        report("capture, write", MESSAGES, perf_counter() - start)
+
+        reader = CaptureReader(directory)
+        start = perf_counter()
+        assert sum(1 for _ in reader) == MESSAGES
+        report("capture, read", MESSAGES, perf_counter() - start)
+
+        start = perf_counter()
+        assert sum(1 for _ in reader.records(topics=[TOPICS[0]])) == MESSAGES // DEVICES
+        report("capture, scan one topic", MESSAGES, perf_counter() - start)
+
+
+def main():
+    bench_files()
+    bench_capture()
+
+
+if __name__ == "__main__":
+    main()
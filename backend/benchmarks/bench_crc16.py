@@ -0,0 +1,56 @@
+"""
+Standalone python file meant for benchmarking purposes. This program compares the table-driven CRC engine in
+`mqtt_client.crc16` against the firmware reference implementation on payload sizes seen on the MQTT broker.
+
+Example:
+    `python -m benchmarks.bench_crc16` (from the `backend` folder)
+
+Date:
+    October 2026
+"""
+
+import os
+from timeit import timeit
+from mqtt_client.crc16 import CRC16_CCITT, CRC16_CCITT_reference, CRC16, crc_many
+
+
+# Payload sizes without the trailing CRC (event summary, data record, heartbeat)
+PAYLOAD_SIZES = [20, 102, 94]
+ITERATIONS = 20000
+BATCH_SIZE = 5000
+
+
+def bench(name: str, func, number: int) -> float:
+    seconds = timeit(func, number=number)
+    print(f"{name:<40} {seconds / number * 1e6:>10.2f} us/call")
+    return seconds
+
+
+def main():
+    for size in PAYLOAD_SIZES:
+        data = os.urandom(size)
+        assert CRC16_CCITT(data) == CRC16_CCITT_reference(data)
+
+        print(f"--- {size} byte payload ---")
+        reference = bench("CRC16_CCITT_reference", lambda: CRC16_CCITT_reference(data), ITERATIONS)
+        fast = bench("CRC16_CCITT", lambda: CRC16_CCITT(data), ITERATIONS)
+        bench("CRC16 (2 chunks)", lambda: _streamed(data), ITERATIONS)
+        print(f"Speedup: {reference / fast:.1f}x")
+
+    payloads = [os.urandom(102) for _ in range(BATCH_SIZE)]
+    print(f"--- {BATCH_SIZE} data records ---")
+    reference = bench("[CRC16_CCITT_reference(p) ...]", lambda: [CRC16_CCITT_reference(p) for p in payloads], 5)
+    fast = bench("crc_many", lambda: crc_many(payloads), 5)
+    print(f"Speedup: {reference / fast:.1f}x")
+
+
+def _streamed(data: bytes) -> int:
+    crc = CRC16()
+    half = len(data) // 2
+    crc.update(data[:half])
+    crc.update(data[half:])
+    return crc.digest()
+
+
+if __name__ == "__main__":
+    main()
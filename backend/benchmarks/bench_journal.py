@@ -0,0 +1,59 @@
+"""
+Standalone python file meant for benchmarking purposes. This program measures the append throughput of
+`mqtt_client.journal.Journal` with per-message fsync and with group fsync, and the replay throughput, on data record
+(port 13) sized messages.
+
+Example:
+    `python -m benchmarks.bench_journal` (from the `backend` folder)
+
+Date:
+    October 2026
+"""
+
+import os
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from mqtt_client.journal import Journal
+
+
+MESSAGES = 20000
+SYNC_MESSAGES = 2000    # Per-message fsync is slow, use fewer messages
+PAYLOAD = os.urandom(104)
+TOPIC = "sensors/39-32-30-31-79-30-6f-02/port/13"
+
+
+def bench_append(name: str, fsync_interval: float, messages: int) -> None:
+    with TemporaryDirectory() as directory:
+        journal = Journal(directory, fsync_interval=fsync_interval)
+        journal.open()
+        start = perf_counter()
+        for i in range(messages):
+            journal.append(float(i), TOPIC, PAYLOAD)
+        journal.close()
+        seconds = perf_counter() - start
+        print(f"{name:<30} {messages / seconds:>10.0f} msg/s  ({journal.fsyncs} fsyncs)")
+
+
+def bench_replay() -> None:
+    with TemporaryDirectory() as directory:
+        journal = Journal(directory, segment_size=1024 * 1024, fsync_interval=1.0)
+        journal.open()
+        for i in range(MESSAGES * 5):
+            journal.append(float(i), TOPIC, PAYLOAD)
+        journal.close()
+
+        start = perf_counter()
+        replayed = sum(1 for _ in Journal(directory).replay())
+        seconds = perf_counter() - start
+        assert replayed == MESSAGES * 5
+        print(f"{'replay':<30} {replayed / seconds:>10.0f} msg/s  ({journal.bytes / seconds / 2**20:.0f} MiB/s)")
+
+
+def main():
+    bench_append("append, fsync every message", 0, SYNC_MESSAGES)
+    bench_append("append, group fsync (10 ms)", 0.01, MESSAGES)
+    bench_replay()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Standalone python file meant for benchmarking purposes. This program writes simulated strokes packet by packet (one
+transaction per packet, as the write coalescer does with `COALESCE_MAX_PACKETS=1`) with
+`queries.upsert_live_sensor_event` (ORM, with and without the live event cache) and
+`queries.upsert_live_sensor_event_core` (with both `TORQUE_STORAGE` modes), and reports the SQL statements and
+milliseconds per packet.
+
+Requires a database (`POSTGRES_*` variables), preferably a scratch one. The rows inserted are deleted at the end.
+
+Example:
+    `python -m benchmarks.bench_live_ingest` (from the `backend` folder)
+    `python -m benchmarks.bench_live_ingest 50`
+    `python -m benchmarks.bench_live_ingest 10 300` (10 strokes of 300 data records)
+
+Date:
+    October 2026
+"""
+
+import logging
+import random
+import sys
+from time import perf_counter
+from typing import List, Tuple
+from sqlalchemy import event
+from db_connector import DBConnector, queries
+from db_connector.live_cache import LiveEventCache
+from mqtt_client.sensor_event import SensorEvent
+from mqtt_client.simulator import VirtualDevice
+from benchmarks.bench_bulk_insert import cleanup
+
+
+STROKES = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+DEVICES = 10
+PACKETS_PER_STROKE = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+
+def make_messages() -> List[Tuple[str, bytes]]:
+    rng = random.Random(0)
+    devices = [VirtualDevice(f"bench-{i:04d}", rng, packets_per_stroke=PACKETS_PER_STROKE) for i in range(DEVICES)]
+    return [message for i in range(STROKES) for message in devices[i % DEVICES].stroke()]
+
+
+def run(conn: DBConnector, messages: List[Tuple[str, bytes]], upsert, cache: LiveEventCache = None) -> None:
+    events = {}
+    for topic, payload in messages:
+        _, devEUI, _, port = topic.split("/")
+        sensor_event = events.setdefault(devEUI, SensorEvent())
+        sensor_event.parse_from_data(topic, payload)
+        conn.execute_query(upsert, sensor_event, int(port) - 12, cache=cache)
+        if port == "14":
+            del events[devEUI]
+
+
+def main():
+    conn = DBConnector()
+    logging.getLogger().setLevel(logging.WARNING)   # DBConnector enables debug logging
+    messages = make_messages()
+    cleanup(conn)
+
+    statements = [0]
+
+    @event.listens_for(conn.engine, "before_cursor_execute")
+    def count(*args):
+        statements[0] += 1
+
+    try:
+        for name, upsert, cache, storage in (
+            ("upsert_live_sensor_event (ORM)", queries.upsert_live_sensor_event, None, "array"),
+            ("upsert_live_sensor_event (ORM, cache)", queries.upsert_live_sensor_event, LiveEventCache(), "array"),
+            ("upsert_live_sensor_event_core (cache)", queries.upsert_live_sensor_event_core, LiveEventCache(), "array"),
+            ("upsert_live_sensor_event_core (cache, packets)", queries.upsert_live_sensor_event_core, LiveEventCache(),
+             "packets"),
+        ):
+            queries.TORQUE_STORAGE = storage
+            statements[0] = 0
+            start = perf_counter()
+            run(conn, messages, upsert, cache)
+            elapsed = perf_counter() - start
+            print(f"{name:<48} {len(messages):>6} packets {statements[0] / len(messages):>6.2f} statements/packet "
+                  f"{elapsed * 1000 / len(messages):>7.2f} ms/packet")
+            cleanup(conn)
+    finally:
+        event.remove(conn.engine, "before_cursor_execute", count)
+        cleanup(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Standalone python file meant for benchmarking purposes. This program seeds tables of growing sizes (one event per
+minute, spread over the sensors) and times `queries.get_events_between` on a one-hour window in the middle of the
+events, for one sensor, ten sensors and all sensors. The time of a narrow window stays the same whatever the number of
+events, unlike reading all the events of a sensor (`queries.get_event_columns`, shown for comparison).
+
+Requires a database (`POSTGRES_*` variables), preferably a scratch one. The tables are created in a separate schema,
+dropped at the end.
+
+Example:
+    `python -m benchmarks.bench_time_range` (from the `backend` folder)
+    `python -m benchmarks.bench_time_range 100000 1000000 5000000`
+
+Date:
+    October 2026
+"""
+
+import logging
+import sys
+from datetime import datetime, timedelta
+from statistics import median
+from time import perf_counter
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from db_connector import PG_DB_URI, partitions, queries
+from db_connector.models import Base
+
+
+SIZES = [10000, 100000, 1000000]
+SENSORS = 100
+REPEATS = 20
+SCHEMA = "bench_time_range"
+START = datetime(2025, 1, 1)    # Events are one minute apart
+
+SEED = (
+    'INSERT INTO sensors (id, "devEUI") SELECT i, \'bench-\' || i FROM generate_series(1, :sensors) i',
+    'INSERT INTO device_infos (id, "firmwareVersion", "pwaRevision", "serialNumber", "deviceType", "deviceLocation", '
+    '"diagnostic", "openValveCount", "closeValveCount") '
+    'SELECT i, \'1.0\', \'A\', \'SIM\', \'SIM\', \'Sim\', 0, 0, 0 FROM generate_series(1, :events) i',
+    'INSERT INTO device_datas (id, "lastTorqueBeforeSleep", "firstTorqueAfterSleep", "recordNumbers", "recordLengths", '
+    '"torqueData", "hiddenDataIndices", "typeOfStroke", "dataRecordPayloadCRCs", "calculatedDataRecordPayloadCRCs", '
+    '"eventRecordPayloadCRC", "calculatedEventRecordPayloadCRC", "heartbeatRecordPayloadCRC", '
+    '"calculatedHeartbeatRecordPayloadCRC") '
+    'SELECT i, 0, 0, \'{}\', \'{}\', \'{}\', \'{}\', 0, \'{}\', \'{}\', 0, 0, 0, 0 FROM generate_series(1, :events) i',
+    'INSERT INTO device_trend_infos (id, "strokeTime", "maxTorque", "temperature", "batteryVoltage") '
+    'SELECT i, 1000, 500 + i % 100, 25, 3300 FROM generate_series(1, :events) i',
+    'INSERT INTO events (id, "timestamp", "isStreaming", "deviceInfoID", "deviceDataID", "deviceTrendInfoID", '
+    '"sensorID") SELECT i, :start + i * interval \'1 minute\', false, i, i, i, (i - 1) % :sensors + 1 '
+    'FROM generate_series(1, :events) i',
+)
+
+
+def seed(engine, events: int) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    Base.metadata.create_all(engine)
+    with Session(engine) as session, session.begin():
+        month, end = START, START + timedelta(minutes=events)
+        while month <= end:
+            partitions.create_partition(session, "events", month)
+            month = partitions.add_months(month, 1)
+    with engine.begin() as conn:
+        for statement in SEED:
+            conn.execute(text(statement), {"events": events, "sensors": SENSORS, "start": START})
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in ("sensors", "device_trend_infos", "events"):
+            conn.execute(text(f"ANALYZE {table}"))
+
+
+def timed(engine, query, *args) -> float:
+    times = []
+    with Session(engine) as session:
+        for _ in range(REPEATS):
+            start = perf_counter()
+            query(session, *args)
+            times.append(perf_counter() - start)
+    return median(times) * 1000
+
+
+def main(sizes=SIZES):
+    logging.getLogger().setLevel(logging.WARNING)   # DBConnector enables debug logging
+    engine = create_engine(PG_DB_URI, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    print(f"{'events':>10} {'1 sensor':>10} {'10 sensors':>11} {'all sensors':>12} {'all events of a sensor':>23}")
+    try:
+        for size in sizes:
+            seed(engine, size)
+            window_start = START + timedelta(minutes=size // 2)
+            window = (window_start, window_start + timedelta(hours=1))
+            one = timed(engine, queries.get_events_between, [1], *window)
+            ten = timed(engine, queries.get_events_between, list(range(1, 11)), *window)
+            every = timed(engine, queries.get_events_between, None, *window)
+            sensor = timed(engine, queries.get_event_columns, 1)
+            print(f"{size:>10} {one:>8.2f}ms {ten:>9.2f}ms {every:>10.2f}ms {sensor:>21.2f}ms")
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or SIZES)
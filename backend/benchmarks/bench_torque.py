@@ -0,0 +1,63 @@
+"""
+Standalone python file meant for benchmarking purposes. This program compares the per-sample `unpack` loop previously
+used by `SensorEvent.parse_from_data_record` against the bulk decoders in `mqtt_client.torque`, on data record (port 13)
+payload sizes.
+
+Example:
+    `python -m benchmarks.bench_torque` (from the `backend` folder)
+
+Date:
+    October 2026
+"""
+
+import os
+from struct import pack, unpack
+from timeit import timeit
+from typing import List
+from mqtt_client.torque import decode_torque_samples, decode_torque_array
+
+
+# Samples per data record. 50 is what the firmware currently sends (104 byte payload), 109 fills a 222 byte LoRa payload
+SAMPLE_COUNTS = [50, 109]
+ITERATIONS = 20000
+
+
+def decode_per_sample(data: bytes) -> List[int]:
+    """
+    Previous implementation, kept for comparison.
+    """
+    packet_torque_data: List[int] = []
+    for i in range(2, len(data[2:-1]), 2):
+        packet_torque_data.append(unpack("<h", data[i:i + 2])[0])
+    return packet_torque_data
+
+
+def bench(name: str, func) -> float:
+    seconds = timeit(func, number=ITERATIONS)
+    print(f"{name:<30} {seconds / ITERATIONS * 1e6:>8.2f} us/record")
+    return seconds
+
+
+def main():
+    try:
+        import numpy  # noqa: F401
+        has_numpy = True
+    except ImportError:
+        has_numpy = False
+        print("numpy not installed, skipping numpy backend")
+
+    for count in SAMPLE_COUNTS:
+        data = pack("<H", 1) + os.urandom(count * 2) + pack("<H", 0)
+        assert decode_per_sample(data) == decode_torque_samples(data)
+
+        print(f"--- {count} samples ({len(data)} byte payload) ---")
+        reference = bench("per-sample unpack", lambda: decode_per_sample(data))
+        fast = bench("memoryview.cast", lambda: decode_torque_samples(data, "array"))
+        bench("array('h') (no list)", lambda: decode_torque_array(data))
+        if has_numpy:
+            bench("numpy.frombuffer", lambda: decode_torque_samples(data, "numpy"))
+        print(f"Speedup (memoryview.cast): {reference / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Standalone python file meant for benchmarking purposes. This program stores the same events with every
+`TORQUE_ENCODING` (`array` and the compact encodings of `db_connector.torque_codec`, `delta-lz4` only if lz4 is
+installed) and reports the storage of their torque samples (`pg_column_size`, after TOAST compression) and the time to
+read them back (`queries.get_event` and `queries.event_packet_data`, as the event endpoints do), plus the encoding and
+decoding time alone.
+
+Events are assembled from the captures (or dump folders) found in the given folders, the same way as the backfill, or
+simulated when none are given. Requires a database (`POSTGRES_*` variables), preferably a scratch one. The rows inserted
+are deleted at the end.
+
+Example:
+    `python -m benchmarks.bench_torque_encoding` (from the `backend` folder)
+    `python -m benchmarks.bench_torque_encoding data/capture`
+
+Date:
+    October 2026
+"""
+
+import logging
+import sys
+from importlib.util import find_spec
+from time import perf_counter
+from typing import List
+from sqlalchemy import func, select
+from db_connector import DBConnector, queries
+from db_connector.models import Event, DeviceData
+from db_connector.torque_codec import encode_torque, decode_torque
+from mqtt_client.sensor_event import SensorEvent
+from benchmarks.bench_bulk_insert import cleanup, make_events
+from backfill import assemble_source, find_sources
+
+
+SIMULATED_EVENTS = 500
+ENCODINGS = ["array", "raw", "delta-zlib"] + (["delta-lz4"] if find_spec("lz4") else [])
+
+
+def capture_events(paths: List[str]) -> List[SensorEvent]:
+    events = []
+    for source in find_sources(paths):
+        for item in assemble_source(source).items:
+            if isinstance(item, tuple):
+                sensor_event = item[1]
+                sensor_event.devEUI = f"bench-{sensor_event.devEUI}"   # Deleted by `cleanup`
+                events.append(sensor_event)
+    return events
+
+
+def main():
+    conn = DBConnector()
+    logging.getLogger().setLevel(logging.WARNING)   # DBConnector enables debug logging
+    events = capture_events(sys.argv[1:]) if len(sys.argv) > 1 else make_events(SIMULATED_EVENTS)
+    if not events:
+        print("No events found")
+        return
+    samples = [sensor_event.flatten_torque()[0] for sensor_event in events]
+    print(f"{len(events)} events, {sum(map(len, samples)) / len(events):.0f} samples/event")
+    cleanup(conn)
+
+    try:
+        for encoding in ENCODINGS:
+            queries.TORQUE_ENCODING = encoding
+            with conn.Session.begin() as session:
+                event_ids = queries.add_sensor_events_bulk(session, events)
+
+            with conn.Session() as session:
+                size = session.scalar(
+                    select(func.sum(func.pg_column_size(DeviceData.torqueData)
+                                    + func.coalesce(func.pg_column_size(DeviceData.torqueDataPacked), 0)))
+                    .join(Event.deviceData).where(Event.id.in_(event_ids))
+                )
+                sensor_ids = dict(session.execute(select(Event.id, Event.sensorID).where(Event.id.in_(event_ids))).all())
+
+            with conn.Session() as session:
+                start = perf_counter()
+                for event_id in event_ids:
+                    queries.event_packet_data(queries.get_event(session, sensor_ids[event_id], event_id))
+                read = perf_counter() - start
+
+            codec = ""
+            if encoding != "array":
+                start = perf_counter()
+                encoded = [encode_torque(event_samples, encoding) for event_samples in samples]
+                encode = perf_counter() - start
+                start = perf_counter()
+                for data in encoded:
+                    decode_torque(data)
+                decode = perf_counter() - start
+                codec = (f" {encode * 1000 / len(events):>6.3f} ms/event encode"
+                         f" {decode * 1000 / len(events):>6.3f} ms/event decode")
+
+            print(f"{encoding:<12} {size / len(events):>9.0f} bytes/event {read * 1000 / len(events):>7.2f} ms/event "
+                  f"read{codec}")
+            cleanup(conn)
+    finally:
+        queries.TORQUE_ENCODING = "array"
+        cleanup(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,8 @@ from sqlalchemy import create_engine, Engine, inspect
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError, OperationalError
 from . import queries as qu
+from .models import Base
+from .partitions import create_upcoming_partitions
 import logging
 import time
 
@@ -53,7 +55,7 @@ class DBConnector:
         self.initialize_db_with_retry()
 
     # Try to initialize the db 'max_retries' number of times with a delay between attempt of 'delay'.
-    # If tables exist, quit
+    # If all tables exist, quit
     def initialize_db_with_retry(self, max_retries=5, delay=2):
         """
         Attempts to initialize the database with schema.
@@ -69,12 +71,14 @@ class DBConnector:
                 tables = inspect(self.engine).get_table_names()
                 logging.debug(f"Tables in database: {tables}")
 
-                # If tables exist, quit
-                if len(tables) > 0:
+                # If tables exist, quit (after creating the partitions of the coming months)
+                if set(Base.metadata.tables).issubset(tables):
                     logging.info("Tables created successfully.")
+                    self.execute_query(create_upcoming_partitions)
                     return
 
-                # If tables do not exist, attempt to create them
+                # If tables do not exist, attempt to create them (tables added since the database was created are
+                # created empty, see `alembic/versions` to migrate existing data)
                 logging.debug("Attempting to create tables...")
                 self.execute_query(qu.create_tables)
 
@@ -82,6 +86,7 @@ class DBConnector:
                 tables = inspect(self.engine).get_table_names()
                 if len(tables) > 0:
                     logging.info("Tables created successfully.")
+                    self.execute_query(create_upcoming_partitions)
                     return
                 else:
                     logging.warning(f"Attempt {retries + 1} failed: Tables still not created.")
@@ -0,0 +1,249 @@
+"""
+Write Coalescer Module
+
+This module provides a `WriteCoalescer` that sits between the MQTT packet callbacks and `upsert_live_sensor_event`.
+Every live upsert rewrites the complete torque, record number, record length and CRC arrays of the event, so writing on
+every data packet costs O(N²) array elements for an N packet stroke. The coalescer buffers consecutive data packets per
+device and writes the latest state of the event at most once every `max_packets` packets or `interval` seconds.
+Heartbeat and event summary packets always flush.
+
+Date:
+    October 2026
+"""
+
+from os import getenv
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Any, Dict, List, Optional
+from collections.abc import Callable
+from mqtt_client.sensor_event import SensorEvent
+import logging
+
+
+# Event types, see `upsert_live_sensor_event`
+HEARTBEAT_EVENT = 0
+DATA_EVENT = 1
+EVENT_SUMMARY_EVENT = 2
+
+# Number of device locks, devices share the lock of their devEUI's hash
+DEVICE_LOCKS = 64
+
+
+class _PendingWrite:
+    """
+    Data packets of a device that have not been written yet.
+    """
+    __slots__ = ("sensor_event", "snapshot", "packets", "first_time", "last_time")
+
+    def __init__(self, sensor_event: SensorEvent, now: float):
+        self.sensor_event = sensor_event
+        self.snapshot: SensorEvent = None    # Copy of the event after the last buffered packet
+        self.packets = 0
+        self.first_time = now
+        self.last_time = now
+
+
+class WriteCoalescer:
+    """
+    Coalesces live event writes per device. `write(sensor_event, eventType, prev_sensor_event)` is executed with the
+    same arguments as `upsert_live_sensor_event`.
+
+    Since every write stores the complete state of the event, skipping intermediate writes loses nothing, the next
+    write contains all packets received in between. Writes of a device are serialized by a device lock, so the idle
+    flush thread and the packet callbacks never insert the same live event twice. Locks come from a fixed pool indexed
+    by the hash of the devEUI, so devices that come and go do not accumulate locks. The next packet may already be
+    parsed into the event while its buffered packets are flushed from another thread (idle flush, abandoned events), so
+    buffered packets are flushed from a copy of the event taken when the last one was buffered, never from an event
+    being modified.
+    """
+    max_packets: int = int(getenv("COALESCE_MAX_PACKETS", 16))
+    interval: float = float(getenv("COALESCE_INTERVAL", 1.0))
+
+    def __init__(self, write: Callable[[SensorEvent, int, Optional[SensorEvent]], None], max_packets: int = None,
+                 interval: float = None):
+        """
+        Initializes the object.
+
+        Args:
+            write (Callable): Executed to write an event to the database.
+            max_packets (int, optional): Flush after this many buffered data packets. 1 writes every packet. Defaults
+                to `COALESCE_MAX_PACKETS` or 16.
+            interval (float, optional): Flush data packets buffered for longer than this many seconds. Defaults to
+                `COALESCE_INTERVAL` or 1.0.
+
+        Raises:
+            ValueError: When `max_packets` is not positive or `interval` is negative.
+        """
+        if max_packets is not None:
+            self.max_packets = max_packets
+        if interval is not None:
+            self.interval = interval
+        if self.max_packets <= 0:
+            raise ValueError("Maximum number of buffered packets must be positive")
+        if self.interval < 0:
+            raise ValueError("Flush interval can not be negative")
+
+        self.write = write
+        self._pending: Dict[str, _PendingWrite] = {}
+        self._pending_lock = Lock()
+        self._device_locks: List[Lock] = [Lock() for _ in range(DEVICE_LOCKS)]
+        self._stopped = Event()
+        self._thread: Thread = None
+
+        # Stats
+        self.packets = 0
+        self.writes = 0
+
+    def _device_lock(self, devEUI: str) -> Lock:
+        return self._device_locks[hash(devEUI) % DEVICE_LOCKS]
+
+    def _take(self, devEUI: str) -> Optional[_PendingWrite]:
+        with self._pending_lock:
+            return self._pending.pop(devEUI, None)
+
+    def _write(self, sensor_event: SensorEvent, eventType: int, prev_sensor_event: SensorEvent = None) -> None:
+        self.write(sensor_event, eventType, prev_sensor_event)
+        self.writes += 1
+
+    def _flush_pending(self, pending: Optional[_PendingWrite]) -> None:
+        if pending is not None:
+            logging.debug(f"Flushing {pending.packets} buffered data packet(s) of {pending.sensor_event.devEUI}")
+            self._write(pending.snapshot or pending.sensor_event, DATA_EVENT)
+
+    def data_packet(self, sensor_event: SensorEvent, now: float = None) -> None:
+        """
+        Buffers a data packet. Writes the event once enough packets were buffered or the oldest buffered packet is
+        older than `interval`.
+
+        Args:
+            sensor_event (SensorEvent): Event the packet was parsed into.
+            now (float, optional): Current `time.monotonic()`. Defaults to now.
+        """
+        now = monotonic() if now is None else now
+        devEUI = sensor_event.devEUI
+        self.packets += 1
+
+        with self._device_lock(devEUI):
+            with self._pending_lock:
+                pending = self._pending.get(devEUI)
+                stale = None
+                if pending is None or pending.sensor_event is not sensor_event:
+                    # A new event replaced the buffered one without a summary, keep the old one's packets
+                    stale = pending
+                    pending = self._pending[devEUI] = _PendingWrite(sensor_event, now)
+                pending.packets += 1
+                pending.last_time = now
+                due = pending.packets >= self.max_packets or now - pending.first_time >= self.interval
+                if due:
+                    del self._pending[devEUI]
+
+            self._flush_pending(stale)
+            if due:
+                self._write(sensor_event, DATA_EVENT)
+            else:
+                # Taken while the event is complete, it may be flushed from another thread
+                pending.snapshot = sensor_event.copy()
+
+    def heartbeat_packet(self, sensor_event: SensorEvent) -> None:
+        """
+        Flushes the buffered data packets of the device and writes the heartbeat.
+
+        Args:
+            sensor_event (SensorEvent): Event the packet was parsed into.
+        """
+        self._flush_and_write(sensor_event, HEARTBEAT_EVENT)
+
+    def event_summary_packet(self, sensor_event: SensorEvent, prev_sensor_event: SensorEvent = None) -> None:
+        """
+        Flushes the buffered data packets of the device and writes the event summary, closing the live event.
+
+        Args:
+            sensor_event (SensorEvent): Event the packet was parsed into.
+            prev_sensor_event (SensorEvent, optional): Previous event of the device. Defaults to None.
+        """
+        self._flush_and_write(sensor_event, EVENT_SUMMARY_EVENT, prev_sensor_event)
+
+    def _flush_and_write(self, sensor_event: SensorEvent, eventType: int,
+                         prev_sensor_event: SensorEvent = None) -> None:
+        with self._device_lock(sensor_event.devEUI):
+            pending = self._take(sensor_event.devEUI)
+            # Buffered packets of the same event are part of the state written below
+            if pending is not None and pending.sensor_event is not sensor_event:
+                self._flush_pending(pending)
+            self._write(sensor_event, eventType, prev_sensor_event)
+
+    def flush(self, devEUI: str = None) -> None:
+        """
+        Writes buffered data packets immediately.
+
+        Args:
+            devEUI (str, optional): Device to flush. Defaults to None (all devices).
+        """
+        with self._pending_lock:
+            devices = list(self._pending) if devEUI is None else [devEUI]
+        for device in devices:
+            self._flush_device(device)
+
+    def flush_idle(self, now: float = None) -> int:
+        """
+        Writes buffered data packets of devices that received their first buffered packet more than `interval` seconds
+        ago. Covers the end of a stroke when the event summary is lost or late.
+
+        Args:
+            now (float, optional): Current `time.monotonic()`. Defaults to now.
+
+        Returns:
+            int: Number of devices flushed.
+        """
+        now = monotonic() if now is None else now
+        with self._pending_lock:
+            devices = [devEUI for devEUI, pending in self._pending.items() if now - pending.first_time >= self.interval]
+        for devEUI in devices:
+            self._flush_device(devEUI)
+        return len(devices)
+
+    def _flush_device(self, devEUI: str) -> None:
+        with self._device_lock(devEUI):
+            try:
+                self._flush_pending(self._take(devEUI))
+            except Exception as e:
+                logging.exception(f"Could not flush buffered data packets of {devEUI}: {e}")
+
+    def start(self) -> None:
+        """
+        Starts a daemon thread executing `flush_idle` every `interval` seconds.
+        """
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, name="write-coalescer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the idle flush thread and writes everything still buffered.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.flush_idle()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Number of data packets received, database writes, devices with buffered packets and
+            buffered packets.
+        """
+        with self._pending_lock:
+            pending: List[_PendingWrite] = list(self._pending.values())
+        return {
+            "packets": self.packets,
+            "writes": self.writes,
+            "pending_devices": len(pending),
+            "pending_packets": sum(p.packets for p in pending),
+        }
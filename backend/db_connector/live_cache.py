@@ -0,0 +1,154 @@
+"""
+Live Event Cache Module
+
+This module provides a `LiveEventCache` mapping `(devEUI, heartbeat CRC)` to the primary keys of the live event of a
+device. `upsert_live_sensor_event` fills it when it creates a live event and drops the entry when the event summary
+closes it, so the packets in between load the event by primary key instead of searching `events`, `sensors` and
+`device_datas` for the streaming event with the highest id.
+
+With `TORQUE_STORAGE=packets`, the cache also remembers which data records of each live event are stored, so only new
+packets are sent.
+
+Entries are hints: a cached event is checked to still exist and to still be streaming before it is updated, otherwise
+the entry is dropped and the event is searched for as before (e.g. when the transaction creating it was rolled back).
+
+Date:
+    October 2026
+"""
+
+from collections import OrderedDict
+from os import getenv
+from threading import Lock
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+
+# (devEUI, heartbeat record payload CRC)
+LiveEventKey = Tuple[str, int]
+
+
+class LiveEventKeys(NamedTuple):
+    """
+    Primary keys of a live event and of the rows it references.
+    """
+    event_id: int
+    sensor_id: int
+    device_info_id: int
+    device_data_id: int
+    device_trend_info_id: int
+
+
+class LiveEventCache:
+    """
+    Thread-safe, bounded mapping of `(devEUI, heartbeat CRC)` to `LiveEventKeys`, the least recently used entry is
+    dropped once `max_entries` is reached.
+    """
+    max_entries: int = int(getenv("LIVE_EVENT_CACHE_SIZE", 10000))
+
+    def __init__(self, max_entries: int = None):
+        """
+        Initializes the object.
+
+        Args:
+            max_entries (int, optional): Maximum number of live events held. Defaults to `LIVE_EVENT_CACHE_SIZE` or
+                10000.
+
+        Raises:
+            ValueError: When `max_entries` is not positive.
+        """
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if self.max_entries <= 0:
+            raise ValueError("Maximum number of cached events must be positive")
+
+        self._entries: OrderedDict[LiveEventKey, LiveEventKeys] = OrderedDict()     # Least recently used first
+        self._packets: Dict[LiveEventKey, Dict[int, int]] = {}
+        self._lock = Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, devEUI: str, crc: int) -> Optional[LiveEventKeys]:
+        """
+        Args:
+            devEUI (str): Device.
+            crc (int): Heartbeat record payload CRC of the event.
+
+        Returns:
+            LiveEventKeys | None: Primary keys of the live event, None when it is not cached.
+        """
+        with self._lock:
+            keys = self._entries.get((devEUI, crc))
+            if keys is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((devEUI, crc))
+            self.hits += 1
+            return keys
+
+    def put(self, devEUI: str, crc: int, keys: LiveEventKeys) -> None:
+        """
+        Caches the primary keys of a live event, replacing the previous event with the same key.
+
+        Args:
+            devEUI (str): Device.
+            crc (int): Heartbeat record payload CRC of the event.
+            keys (LiveEventKeys): Primary keys of the event.
+        """
+        with self._lock:
+            if self._entries.get((devEUI, crc)) != keys:
+                self._packets[(devEUI, crc)] = {}
+            self._entries[(devEUI, crc)] = keys
+            self._entries.move_to_end((devEUI, crc))
+            while len(self._entries) > self.max_entries:
+                key, _ = self._entries.popitem(last=False)
+                self._packets.pop(key, None)
+
+    def packets(self, devEUI: str, crc: int) -> Optional[Dict[int, int]]:
+        """
+        Args:
+            devEUI (str): Device.
+            crc (int): Heartbeat record payload CRC of the event.
+
+        Returns:
+            Dict[int, int] | None: Hash of the data records stored for the cached event, by packet sequence (updated by
+            `queries.write_data_records` once committed), None when the event is not cached.
+        """
+        with self._lock:
+            return self._packets.get((devEUI, crc))
+
+    def discard(self, devEUI: str, crc: int, stale: bool = False) -> None:
+        """
+        Drops the entry of an event, if cached.
+
+        Args:
+            devEUI (str): Device.
+            crc (int): Heartbeat record payload CRC of the event.
+            stale (bool, optional): Whether the cached event was found to be gone or closed (counted in the stats).
+                Defaults to False.
+        """
+        with self._lock:
+            self._packets.pop((devEUI, crc), None)
+            if self._entries.pop((devEUI, crc), None) is not None and stale:
+                self.stale += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._packets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Number of cached events, hits, misses and stale entries found.
+        """
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+        }
@@ -12,7 +12,7 @@ Date:
     March 2025
 """
 
-from sqlalchemy import String, Integer, DateTime, ForeignKey, Boolean, Double
+from sqlalchemy import String, Integer, BigInteger, DateTime, ForeignKey, Boolean, Double, LargeBinary, Index, text
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import DeclarativeBase, mapped_column, Mapped, relationship
 
@@ -29,11 +29,21 @@ class Sensor(Base):
     Sensor entity.
     """
     __tablename__ = "sensors"
+    __table_args__ = (
+        # devEUI prefix search (`LIKE 'prefix%'`), the unique index only serves equality with a non-C collation
+        Index("ix_sensors_devEUI_pattern", "devEUI", postgresql_ops={"devEUI": "text_pattern_ops"}),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
     devEUI: Mapped[str] = mapped_column(String, unique=True, nullable=False)
 
+    # Summary of the events of the sensor, maintained as events are added, closed and dropped (see
+    # `queries.count_sensor_events`) so sensors are listed without reading their events
+    eventCount: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("0"))
+    lastEventTimestamp: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    isStreaming: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default=text("false"))  # Of the last event
+
     events: Mapped[list["Event"]] = relationship(back_populates="sensor")
 
 class AuxSensor(Base):
@@ -49,37 +59,63 @@ class AuxSensor(Base):
 
 class AuxSensorData(Base):
     """
-    Auxiliary sensor data entity containing individual data points.
+    Auxiliary sensor data entity containing individual data points. Partitioned by month of `timestamp` (see
+    `partitions`).
     """
     __tablename__ = "aux_sensor_data"
+    __table_args__ = (
+        Index("ix_aux_sensor_data_sensor_timestamp", "aux_sensor_id", "timestamp"),    # Data of a sensor
+        {"postgresql_partition_by": 'RANGE ("timestamp")'},
+    )
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     aux_sensor_id: Mapped[int] = mapped_column(ForeignKey("aux_sensors.id"), nullable=False)
-    timestamp: Mapped[DateTime] = mapped_column(DateTime, nullable=False)
+    # Partition key, part of the primary key of the table (rows are still identified by id alone)
+    timestamp: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)
     value: Mapped[float] = mapped_column(Double, nullable=False)
 
     sensor: Mapped["AuxSensor"] = relationship(back_populates="sensor_data")
-        
+
+    __mapper_args__ = {"primary_key": [id]}
+
 
 class Event(Base):
     """
-    Sensor event entity.
+    Sensor event entity. Partitioned by month of `timestamp` (see `partitions`).
     """
     __tablename__ = "events"
-
-    id: Mapped[int] = mapped_column(primary_key=True)
-
-    timestamp: Mapped[DateTime] = mapped_column(DateTime, nullable=False)
+    __table_args__ = (
+        Index("ix_events_sensor_id_id", "sensorID", "id"),     # Events of a sensor, in id order
+        # Live events of a sensor (`queries.find_live_event`), only a few rows per sensor so the heartbeat CRC is
+        # checked on the matching device data rows instead of being indexed
+        Index("ix_events_live", "sensorID", "id", postgresql_where=text('"isStreaming"')),
+        # Events of some sensors in a time window (`queries.get_events_between`)
+        Index("ix_events_sensor_id_timestamp", "sensorID", "timestamp"),
+        # Events of all sensors in a time window. Events are appended in time order, so block ranges summarize well and
+        # the index stays a few pages per partition
+        Index("ix_events_timestamp_brin", "timestamp", postgresql_using="brin"),
+        {"postgresql_partition_by": 'RANGE ("timestamp")'},
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    # Partition key, part of the primary key of the table (events are still identified by id alone)
+    timestamp: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)
     isStreaming: Mapped[bool] = mapped_column(Boolean, nullable=False)
-    deviceInfoID: Mapped[int] = mapped_column(ForeignKey("device_infos.id"), unique=True, nullable=False)
-    deviceDataID: Mapped[int] = mapped_column(ForeignKey("device_datas.id"), unique=True, nullable=False)
-    deviceTrendInfoID: Mapped[int] = mapped_column(ForeignKey("device_trend_infos.id"), unique=True, nullable=False)
+    # Unique per event, but a unique constraint of a partitioned table must include the partition key
+    deviceInfoID: Mapped[int] = mapped_column(ForeignKey("device_infos.id"), index=True, nullable=False)
+    deviceDataID: Mapped[int] = mapped_column(ForeignKey("device_datas.id"), index=True, nullable=False)
+    deviceTrendInfoID: Mapped[int] = mapped_column(ForeignKey("device_trend_infos.id"), index=True, nullable=False)
     sensorID: Mapped[int] = mapped_column(ForeignKey("sensors.id"), nullable=False)
 
     deviceInfo: Mapped["DeviceInfo"] = relationship(back_populates="event")
     deviceData: Mapped["DeviceData"] = relationship(back_populates="event")
     deviceTrendInfo: Mapped["DeviceTrendInfo"] = relationship(back_populates="event")
     sensor: Mapped["Sensor"] = relationship(back_populates="events")
+    dataRecords: Mapped[list["DataRecord"]] = relationship(back_populates="event", order_by="DataRecord.recordNumber",
+                                                           primaryjoin="Event.id == foreign(DataRecord.eventID)")
+
+    __mapper_args__ = {"primary_key": [id]}
 
 
 class DeviceInfo(Base):
@@ -131,6 +167,7 @@ class DeviceData(Base):
     recordNumbers: Mapped[list[int]] = mapped_column(ARRAY(Integer), nullable=False)
     recordLengths: Mapped[list[int]] = mapped_column(ARRAY(Integer), nullable=False)
     torqueData: Mapped[list[int]] = mapped_column(ARRAY(Integer), nullable=False)
+    torqueDataPacked: Mapped[bytes] = mapped_column(LargeBinary, nullable=True)  # Replaces torqueData, see torque_codec
     hiddenDataIndices: Mapped[list[int]] = mapped_column(ARRAY(Integer), nullable=False)
     typeOfStroke: Mapped[int] = mapped_column(Integer, nullable=False)
     dataRecordPayloadCRCs: Mapped[list[int]] = mapped_column(ARRAY(Integer), nullable=False)
@@ -140,4 +177,60 @@ class DeviceData(Base):
     heartbeatRecordPayloadCRC: Mapped[int] = mapped_column(Integer, nullable=False)
     calculatedHeartbeatRecordPayloadCRC: Mapped[int] = mapped_column(Integer, nullable=False)
 
-    event: Mapped["Event"] = relationship(back_populates="deviceData")
\ No newline at end of file
+    event: Mapped["Event"] = relationship(back_populates="deviceData")
+
+
+class DataRecord(Base):
+    """
+    Data record (packet) of an event. Holds the torque samples and CRCs of one packet when events are stored with
+    `TORQUE_STORAGE=packets`, instead of the per-packet arrays of `DeviceData`.
+    """
+    __tablename__ = "data_records"
+
+    # Not a foreign key, `events` is partitioned and only unique on (id, timestamp)
+    eventID: Mapped[int] = mapped_column(Integer, primary_key=True)
+    recordNumber: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    torqueData: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)     # Little-endian int16 samples
+    payloadCRC: Mapped[int] = mapped_column(Integer, nullable=False)
+    calculatedPayloadCRC: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    event: Mapped["Event"] = relationship(back_populates="dataRecords",
+                                          primaryjoin="foreign(DataRecord.eventID) == Event.id")
+
+
+class TrendRollup:
+    """
+    Trend rollup columns: number of closed events of a sensor whose timestamp falls in a bucket, and the min, max and sum
+    (the mean being sum / eventCount) of each trend of their `DeviceTrendInfo`. Maintained by `rollups`.
+    """
+    sensorID: Mapped[int] = mapped_column(ForeignKey("sensors.id"), primary_key=True)
+    bucket: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)     # Start of the hour or day
+
+    eventCount: Mapped[int] = mapped_column(Integer, nullable=False)
+    strokeTimeMin: Mapped[int] = mapped_column(Integer, nullable=False)
+    strokeTimeMax: Mapped[int] = mapped_column(Integer, nullable=False)
+    strokeTimeSum: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    maxTorqueMin: Mapped[int] = mapped_column(Integer, nullable=False)
+    maxTorqueMax: Mapped[int] = mapped_column(Integer, nullable=False)
+    maxTorqueSum: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    temperatureMin: Mapped[int] = mapped_column(Integer, nullable=False)
+    temperatureMax: Mapped[int] = mapped_column(Integer, nullable=False)
+    temperatureSum: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    batteryVoltageMin: Mapped[int] = mapped_column(Integer, nullable=False)
+    batteryVoltageMax: Mapped[int] = mapped_column(Integer, nullable=False)
+    batteryVoltageSum: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+
+class HourlyTrendRollup(TrendRollup, Base):
+    """
+    Trends of the closed events of a sensor per hour.
+    """
+    __tablename__ = "trend_rollups_hourly"
+
+
+class DailyTrendRollup(TrendRollup, Base):
+    """
+    Trends of the closed events of a sensor per day.
+    """
+    __tablename__ = "trend_rollups_daily"
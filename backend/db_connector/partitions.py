@@ -0,0 +1,345 @@
+"""
+Partitions Module
+
+This module manages the monthly partitions of the tables partitioned by time (`events` and `aux_sensor_data`, declared
+with `PARTITION BY RANGE ("timestamp")`). Partition `<table>_<YYYY>_<MM>` holds the rows of one month:
+- `ensure_partition` creates the partition of a timestamp when it is missing, it is called by the queries inserting
+  rows (the partitions of the current and next months are also created on startup by `DBConnector`).
+- `drop_expired_partitions` drops the partitions older than `PARTITION_RETENTION_MONTHS`. The device info, data and
+  trend info rows (and data records) of the dropped events are deleted with them.
+
+Tables that are not partitioned (before `alembic upgrade head`) are left untouched. Partitions are not declared in the
+models, so `include_name` keeps them (and their indexes) out of alembic autogenerate.
+
+Example:
+    `python -m db_connector.partitions list` (from the `backend` folder)
+    `python -m db_connector.partitions create --months 3`
+    `python -m db_connector.partitions retention --months 24`
+
+Date:
+    October 2026
+"""
+
+import argparse
+import logging
+import re
+from datetime import datetime
+from os import getenv
+from threading import Lock
+from typing import Iterable, List, Set, Tuple
+from sqlalchemy import event as sqlalchemy_event, text
+
+
+# Tables partitioned by month of their `timestamp` column
+PARTITIONED_TABLES = ("events", "aux_sensor_data")
+
+# Number of full months kept before the current one, older partitions are dropped by `drop_expired_partitions`. 0 keeps
+# every partition
+PARTITION_RETENTION_MONTHS = int(getenv("PARTITION_RETENTION_MONTHS", 0))
+
+# Number of months after the current one whose partitions are created ahead of time
+PARTITION_PREMAKE_MONTHS = int(getenv("PARTITION_PREMAKE_MONTHS", 1))
+
+# Rows referenced by each event, deleted with the events of a dropped partition
+_EVENT_CHILD_TABLES = {"deviceInfoID": "device_infos", "deviceDataID": "device_datas",
+                       "deviceTrendInfoID": "device_trend_infos"}
+_EVENT_CHILD_COLUMNS = ", ".join(f'"{column}"' for column in _EVENT_CHILD_TABLES)
+
+# (table, month) of the partitions known to exist (or of tables that are not partitioned), added once committed
+_known: Set[Tuple[str, datetime]] = set()
+_known_lock = Lock()
+
+
+def month_start(timestamp: datetime) -> datetime:
+    """
+    Args:
+        timestamp (datetime): Time.
+
+    Returns:
+        datetime: First instant of the month of `timestamp`.
+    """
+    return datetime(timestamp.year, timestamp.month, 1)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    """
+    Args:
+        month (datetime): First instant of a month.
+        months (int): Number of months to add, may be negative.
+
+    Returns:
+        datetime: First instant of the resulting month.
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    """
+    Args:
+        table (str): Partitioned table.
+        month (datetime): Any instant of the month.
+
+    Returns:
+        str: Name of the partition of the month.
+    """
+    return f"{table}_{month:%Y_%m}"
+
+
+def _partition_pattern(table: str) -> re.Pattern:
+    return re.compile(rf"^{table}_(\d{{4}})_(\d{{2}})$")
+
+
+def include_name(name: str, type_: str, parent_names: dict) -> bool:
+    """
+    `include_name` hook of alembic autogenerate (see `alembic/env.py`).
+
+    Args:
+        name (str): Name of the schema, table, index...
+        type_ (str): Kind of object (`table`, `index`...).
+        parent_names (dict): Names of the schema and table holding the object.
+
+    Returns:
+        bool: False for monthly partitions and their indexes, which would otherwise be reported as removed.
+    """
+    if type_ == "table":
+        return not any(_partition_pattern(table).match(name) for table in PARTITIONED_TABLES)
+    if parent_names.get("table_name") is not None:
+        return include_name(parent_names["table_name"], "table", {})
+    return True
+
+
+def _check_table(table: str) -> None:
+    if table not in PARTITIONED_TABLES:
+        raise ValueError(f"Table {table} is not partitioned by time")
+
+
+def create_partition(session, table: str, month: datetime) -> bool:
+    """
+    Creates the partition of a month if it does not exist. Concurrent creations of the same partition are serialized
+    with an advisory lock.
+
+    Args:
+        session (_type_): Session object. See module header.
+        table (str): One of `PARTITIONED_TABLES`.
+        month (datetime): Any instant of the month.
+
+    Raises:
+        ValueError: Raised when the table is not partitioned by time.
+
+    Returns:
+        bool: Whether the partition was created, False when it already existed or the table is not partitioned.
+    """
+    _check_table(table)
+    month = month_start(month)
+    name = partition_name(table, month)
+
+    partitioned = session.scalar(text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                                      "WHERE partrelid = to_regclass(:table))"), {"table": table})
+    if not partitioned:
+        return False
+
+    session.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": name})
+    if session.scalar(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}):
+        return False
+
+    logging.info(f"Creating partition {name}")
+    session.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+    return True
+
+
+def ensure_partition(session, table: str, timestamp: datetime) -> None:
+    """
+    Makes sure the partition of a timestamp exists before rows are inserted into it. Partitions are only looked up the
+    first time a month is seen by the process.
+
+    Args:
+        session (_type_): Session object. See module header.
+        table (str): One of `PARTITIONED_TABLES`.
+        timestamp (datetime): Time of the rows to insert.
+    """
+    key = (table, month_start(timestamp))
+    with _known_lock:
+        if key in _known:
+            return
+
+    create_partition(session, table, timestamp)
+
+    def remember(_):
+        with _known_lock:
+            _known.add(key)
+
+    # A rolled back creation is retried with the next rows
+    sqlalchemy_event.listen(session, "after_commit", remember, once=True)
+
+
+def ensure_partitions(session, table: str, timestamps: Iterable[datetime]) -> None:
+    """
+    Same as `ensure_partition` for the months of many timestamps.
+
+    Args:
+        session (_type_): Session object. See module header.
+        table (str): One of `PARTITIONED_TABLES`.
+        timestamps (Iterable[datetime]): Time of the rows to insert.
+    """
+    for month in sorted({month_start(timestamp) for timestamp in timestamps}):
+        ensure_partition(session, table, month)
+
+
+def create_upcoming_partitions(session, months: int = None, now: datetime = None) -> List[str]:
+    """
+    Creates the partitions of the current month and of the following ones, so rows are not inserted into a month
+    whose partition is being created.
+
+    Args:
+        session (_type_): Session object. See module header.
+        months (int, optional): Number of months after the current one. Defaults to `PARTITION_PREMAKE_MONTHS`.
+        now (datetime, optional): Current time. Defaults to now.
+
+    Returns:
+        List[str]: Names of the partitions created.
+    """
+    months = PARTITION_PREMAKE_MONTHS if months is None else months
+    current = month_start(now or datetime.now())
+    created = []
+    for table in PARTITIONED_TABLES:
+        for offset in range(months + 1):
+            month = add_months(current, offset)
+            if create_partition(session, table, month):
+                created.append(partition_name(table, month))
+    return created
+
+
+def list_partitions(session, table: str) -> List[Tuple[str, datetime]]:
+    """
+    Args:
+        session (_type_): Session object. See module header.
+        table (str): One of `PARTITIONED_TABLES`.
+
+    Returns:
+        List[Tuple[str, datetime]]: Name and month of the monthly partitions of the table, oldest first. Partitions
+        not named by this module are ignored.
+    """
+    _check_table(table)
+    pattern = _partition_pattern(table)
+    names = session.scalars(text(
+        "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:table)"
+    ), {"table": table}).all()
+
+    partitions = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            partitions.append((name, datetime(int(match[1]), int(match[2]), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def drop_partition(session, table: str, name: str) -> None:
+    """
+    Drops a partition. The data records, device info, data and trend info rows of the events of an `events` partition
+    are deleted as well, and the events are subtracted from the event count of their sensor. Sensors whose last event
+    is dropped take the timestamp and streaming status of their last remaining event, NULL and false without one.
+
+    Args:
+        session (_type_): Session object. See module header.
+        table (str): One of `PARTITIONED_TABLES`.
+        name (str): Partition name (see `list_partitions`).
+    """
+    logging.info(f"Dropping partition {name}")
+    if table != "events":
+        session.execute(text(f'DROP TABLE "{name}"'))
+        return
+
+    # Sensors whose last event is dropped get the last remaining one (or none) once the partition is gone
+    counted = session.execute(text(
+        f'UPDATE sensors SET "eventCount" = "eventCount" - expired.count '
+        f'FROM (SELECT "sensorID", count(*) AS count, max("timestamp") AS last FROM "{name}" '
+        f'GROUP BY "sensorID") expired WHERE sensors.id = expired."sensorID" '
+        f'RETURNING sensors.id, sensors."lastEventTimestamp" <= expired.last'
+    )).all()
+    stale_sensor_ids = [sensor_id for sensor_id, stale in counted if stale]
+    session.execute(text(f'DELETE FROM data_records USING "{name}" WHERE data_records."eventID" = "{name}".id'))
+    session.execute(text(f'CREATE TEMPORARY TABLE expired_events ON COMMIT DROP AS '
+                         f'SELECT {_EVENT_CHILD_COLUMNS} FROM "{name}"'))
+    session.execute(text(f'DROP TABLE "{name}"'))
+    for column, child_table in _EVENT_CHILD_TABLES.items():
+        session.execute(text(f'DELETE FROM {child_table} USING expired_events '
+                             f'WHERE {child_table}.id = expired_events."{column}"'))
+    session.execute(text("DROP TABLE expired_events"))
+    if stale_sensor_ids:
+        session.execute(text(
+            'UPDATE sensors SET "lastEventTimestamp" = latest."timestamp", '
+            '"isStreaming" = coalesce(latest."isStreaming", false) '
+            'FROM sensors stale LEFT JOIN LATERAL (SELECT "timestamp", "isStreaming" FROM events '
+            'WHERE events."sensorID" = stale.id ORDER BY "timestamp" DESC, id DESC LIMIT 1) latest ON true '
+            'WHERE sensors.id = stale.id AND stale.id = ANY(:sensor_ids)'
+        ), {"sensor_ids": stale_sensor_ids})
+
+
+def drop_expired_partitions(session, retention_months: int = None, now: datetime = None) -> List[str]:
+    """
+    Drops the partitions of the months older than the retention, whole partitions are dropped instead of deleting
+    rows.
+
+    Args:
+        session (_type_): Session object. See module header.
+        retention_months (int, optional): Number of full months kept before the current one, 0 keeps everything.
+            Defaults to `PARTITION_RETENTION_MONTHS`.
+        now (datetime, optional): Current time. Defaults to now.
+
+    Raises:
+        ValueError: Raised when the retention is negative.
+
+    Returns:
+        List[str]: Names of the partitions dropped.
+    """
+    retention_months = PARTITION_RETENTION_MONTHS if retention_months is None else retention_months
+    if retention_months < 0:
+        raise ValueError("Partition retention must not be negative")
+    if retention_months == 0:
+        return []
+
+    cutoff = add_months(month_start(now or datetime.now()), -retention_months)
+    dropped = []
+    for table in PARTITIONED_TABLES:
+        for name, month in list_partitions(session, table):
+            if month < cutoff:
+                drop_partition(session, table, name)
+                dropped.append(name)
+
+    with _known_lock:
+        _known.difference_update({key for key in _known if key[1] < cutoff})
+    return dropped
+
+
+def main():
+    from db_connector import DBConnector
+
+    parser = argparse.ArgumentParser(description="Manages the monthly partitions of events and aux_sensor_data.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List the partitions")
+    create = subparsers.add_parser("create", help="Create the partitions of the current and next months")
+    create.add_argument("--months", type=int, default=None, help="Months after the current one")
+    retention = subparsers.add_parser("retention", help="Drop the partitions older than the retention")
+    retention.add_argument("--months", type=int, default=None, help="Full months kept before the current one")
+    args = parser.parse_args()
+
+    conn = DBConnector()
+    logging.getLogger().setLevel(logging.INFO)   # DBConnector enables debug logging
+    with conn.Session.begin() as session:
+        if args.command == "list":
+            for table in PARTITIONED_TABLES:
+                for name, _ in list_partitions(session, table):
+                    print(name)
+        elif args.command == "create":
+            print("\n".join(create_upcoming_partitions(session, args.months)) or "No partition created")
+        else:
+            print("\n".join(drop_expired_partitions(session, args.months)) or "No partition dropped")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,16 +17,49 @@ Date:
     March 2025
 """
 
-from .models import Sensor, Event, DeviceData, DeviceInfo, DeviceTrendInfo, AuxSensor, AuxSensorData
+from .models import Sensor, Event, DeviceData, DeviceInfo, DeviceTrendInfo, DataRecord, AuxSensor, AuxSensorData
+from .live_cache import LiveEventCache, LiveEventKeys
+from .torque_codec import TORQUE_ENCODINGS, encode_torque, decode_torque
+from .partitions import ensure_partition, ensure_partitions
+from .rollups import add_to_rollups, rollup_model, trend_values
 from mqtt_client.sensor_event import SensorEvent
 from mqtt_client.aux_sensor_event import AuxSensorEvent
-from sqlalchemy import select, desc
-from sqlalchemy.orm import joinedload
+from mqtt_client.torque import pack_torque_samples, unpack_torque_samples
+from sqlalchemy import (select, desc, insert, update, exists, cast, bindparam, case, func, or_, Boolean, DateTime, String,
+                        event as sqlalchemy_event)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime
-from typing import List
+from os import getenv
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 import logging
 
 
+# Storage of the data records of new and updated events:
+# - `array`: torque samples, record numbers, record lengths and CRCs in the arrays of `device_datas`, rewritten whenever
+#   the event is updated
+# - `packets`: one append-only `data_records` row per packet, the `device_datas` arrays are left empty
+TORQUE_STORAGE = getenv("TORQUE_STORAGE", "array")
+
+# Encoding of the torque samples of new and updated events stored with `TORQUE_STORAGE=array`:
+# - `array`: `device_datas.torqueData` integer array
+# - `raw`, `delta-zlib` or `delta-lz4`: `device_datas.torqueDataPacked` (see `torque_codec`), `torqueData` is left empty
+TORQUE_ENCODING = getenv("TORQUE_ENCODING", "array")
+
+# Per-packet array columns of `DeviceData`
+PACKET_ARRAY_COLUMNS = ("recordNumbers", "recordLengths", "torqueData", "dataRecordPayloadCRCs",
+                        "calculatedDataRecordPayloadCRCs")
+
+# Trend columns of the events listings (`get_event_columns`), by name of the list returned
+EVENT_TREND_COLUMNS = {
+    "batteryVoltages": DeviceTrendInfo.batteryVoltage,
+    "maxTorques": DeviceTrendInfo.maxTorque,
+    "strokeTimes": DeviceTrendInfo.strokeTime,
+    "temperatures": DeviceTrendInfo.temperature,
+}
+
+
 def create_tables(session):
     """
     Creates the schema in the database if not already present.
@@ -50,28 +83,192 @@ def flatten_data(sensor_event: SensorEvent):
         record_lengths: list of how long each packet is
     """
     logging.debug("Flattening data")
-    # Transform sensor data to be compatible with db
-    flattened_torque_data: List[int] = []
-    record_numbers: List[int] = []
-    record_lengths: List[int] = []
-
-    if sensor_event.torqueData:
-        for i, seq in enumerate(sensor_event.torqueData):
-            if seq is not None:
-                flattened_torque_data.extend(seq)
-                record_lengths.append(len(seq))
-                record_numbers.append(i + 1)
-            else:
-                record_lengths.append(0)
-                record_numbers.append(-1)
+    return sensor_event.flatten_torque()
+
+
+def packet_storage() -> bool:
+    """
+    Returns:
+        bool: Whether data records are stored in `data_records` rows (see `TORQUE_STORAGE`).
+
+    Raises:
+        ValueError: When `TORQUE_STORAGE` is not recognized.
+    """
+    if TORQUE_STORAGE not in ("array", "packets"):
+        raise ValueError(f"Unrecognized torque storage {TORQUE_STORAGE}")
+    return TORQUE_STORAGE == "packets"
+
+
+def torque_encoding() -> Optional[str]:
+    """
+    Returns:
+        str | None: Encoding of the torque samples in `device_datas.torqueDataPacked` (see `TORQUE_ENCODING`), None
+        when they are stored in the `torqueData` array.
+
+    Raises:
+        ValueError: When `TORQUE_ENCODING` is not recognized.
+    """
+    if TORQUE_ENCODING == "array":
+        return None
+    if TORQUE_ENCODING not in TORQUE_ENCODINGS:
+        raise ValueError(f"Unrecognized torque encoding {TORQUE_ENCODING}")
+    return TORQUE_ENCODING
+
+
+def packet_columns(sensor_event: SensorEvent) -> Dict[str, Any]:
+    """
+    Args:
+        sensor_event (SensorEvent): Event.
+
+    Returns:
+        Dict[str, Any]: Values of the per-packet array columns of `DeviceData` (`PACKET_ARRAY_COLUMNS`), empty when
+        data records are stored in `data_records` rows, and of `torqueDataPacked` (None unless `TORQUE_ENCODING` is
+        set, `torqueData` is then empty).
+    """
+    if packet_storage():
+        return {**{column: [] for column in PACKET_ARRAY_COLUMNS}, "torqueDataPacked": None}
+    encoding = torque_encoding()
+    flattened_torque_data, record_numbers, record_lengths = flatten_data(sensor_event)
+    return {
+        "recordNumbers": record_numbers,
+        "recordLengths": record_lengths,
+        "torqueData": flattened_torque_data if encoding is None else [],
+        "torqueDataPacked": encode_torque(flattened_torque_data, encoding) if encoding is not None else None,
+        "dataRecordPayloadCRCs": sensor_event.dataPacketPayloadCRCs,
+        "calculatedDataRecordPayloadCRCs": sensor_event.calculatedDataPacketPayloadCRCs,
+    }
+
+
+def data_record_rows(sensor_event: SensorEvent, written: Dict[int, int] = None) -> List[Dict[str, Any]]:
+    """
+    Args:
+        sensor_event (SensorEvent): Event.
+        written (Dict[int, int], optional): Hash of the packets already stored, by packet sequence. These packets are
+            skipped unless they were overwritten since. Defaults to None (every packet).
+
+    Returns:
+        List[Dict[str, Any]]: `data_records` rows (without `eventID`) of the received packets.
+    """
+    rows = []
+    for packet_seq in range(1, sensor_event.packet_count + 1):
+        if not sensor_event.has_packet(packet_seq):
+            continue
+        if written is not None and written.get(packet_seq) == sensor_event.packet_hash(packet_seq):
+            continue
+        rows.append({
+            "recordNumber": packet_seq,
+            "torqueData": pack_torque_samples(sensor_event.packet_torque_data(packet_seq)),
+            "payloadCRC": sensor_event.packet_crc(packet_seq),
+            "calculatedPayloadCRC": sensor_event.packet_calculated_crc(packet_seq),
+        })
+    return rows
+
+
+@lru_cache(maxsize=None)
+def data_records_statement():
+    """
+    Returns:
+        Insert: INSERT of `data_records` rows (`eventID` bound as `event_id`). A packet that is already stored is only
+        rewritten if it changed (overwritten by a packet with the same sequence number).
+    """
+    table = DataRecord.__table__
+    statement = pg_insert(table).values(eventID=bindparam("event_id"))
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.eventID, table.c.recordNumber],
+        set_={column: statement.excluded[column] for column in ("torqueData", "payloadCRC", "calculatedPayloadCRC")},
+        where=(table.c.torqueData != statement.excluded.torqueData)
+            | (table.c.payloadCRC != statement.excluded.payloadCRC),
+    )
+
+
+def write_data_records(session, event_id: int, sensor_event: SensorEvent, written: Dict[int, int] = None) -> int:
+    """
+    Stores the data records of an event in `data_records` rows, only sending the packets that are new or changed.
+
+    Args:
+        session (_type_): Session object. See module header.
+        event_id (int): Event id.
+        sensor_event (SensorEvent): Event.
+        written (Dict[int, int], optional): Hash of the packets already stored, by packet sequence, updated once the
+            transaction is committed (see `LiveEventCache.packets`). Defaults to None (every packet is sent).
+
+    Returns:
+        int: Number of packets sent.
+    """
+    rows = data_record_rows(sensor_event, written)
+    if not rows:
+        return 0
+    for row in rows:
+        row["event_id"] = event_id
+    session.execute(data_records_statement(), rows)
+
+    if written is not None:
+        remember_data_records(session, sensor_event, [row["recordNumber"] for row in rows], written)
+    return len(rows)
+
+
+def remember_data_records(session, sensor_event: SensorEvent, packet_seqs: List[int], written: Dict[int, int]) -> None:
+    """
+    Adds the hash of stored packets to `written` once the transaction is committed, so a rolled back write is sent
+    again.
+
+    Args:
+        session (_type_): Session object. See module header.
+        sensor_event (SensorEvent): Event.
+        packet_seqs (List[int]): Sequence numbers of the packets written.
+        written (Dict[int, int]): Hash of the packets stored, by packet sequence.
+    """
+    hashes = {packet_seq: sensor_event.packet_hash(packet_seq) for packet_seq in packet_seqs}
+    sqlalchemy_event.listen(session, "after_commit", lambda _: written.update(hashes), once=True)
 
-    return (flattened_torque_data, record_numbers, record_lengths)
+
+def event_packet_data(event: Event) -> Dict[str, List[int]]:
+    """
+    Reassembles the per-packet data of a stored event, from the `DeviceData` arrays or from its `data_records` rows
+    (arrays take precedence when both are filled, the event was last written with `TORQUE_STORAGE=array`). Torque
+    samples stored with `TORQUE_ENCODING` are decoded.
+
+    Args:
+        event (Event): Event, with `deviceData` and `dataRecords` loaded (see `get_event`).
+
+    Returns:
+        Dict[str, List[int]]: `PACKET_ARRAY_COLUMNS` as stored with `TORQUE_STORAGE=array`: record numbers (-1 for
+        missing packets), record lengths, flat torque samples and CRCs (None for missing packets).
+    """
+    device_data = event.deviceData
+    if device_data.recordNumbers or not event.dataRecords:
+        packet_data = {column: getattr(device_data, column) for column in PACKET_ARRAY_COLUMNS}
+        if device_data.torqueDataPacked is not None:
+            packet_data["torqueData"] = decode_torque(device_data.torqueDataPacked)
+        return packet_data
+
+    count = event.dataRecords[-1].recordNumber
+    record_numbers, record_lengths = [-1] * count, [0] * count
+    crcs, calculated_crcs = [None] * count, [None] * count
+    torque_data = []
+    for data_record in event.dataRecords:
+        index = data_record.recordNumber - 1
+        samples = unpack_torque_samples(data_record.torqueData)
+        record_numbers[index] = data_record.recordNumber
+        record_lengths[index] = len(samples)
+        crcs[index] = data_record.payloadCRC
+        calculated_crcs[index] = data_record.calculatedPayloadCRC
+        torque_data += samples
+
+    return {
+        "recordNumbers": record_numbers,
+        "recordLengths": record_lengths,
+        "torqueData": torque_data,
+        "dataRecordPayloadCRCs": crcs,
+        "calculatedDataRecordPayloadCRCs": calculated_crcs,
+    }
 
 
 def hide_duplicate_packets(data: int, record_numbers: int, record_lengths: int, crc: List[int],
                            prev_data: int, prev_record_numbers: int, prev_record_lengths: int, prev_crc: List[int]):
     """
-    Finds duplicate packets from 2 events
+    Finds duplicate packets from 2 events. Live events are handled during ingest by
+    `mqtt_client.duplicates.DuplicateDetector`, this is kept for postprocessing stored events.
     Args:
         data (int): list of flattened torque data for the event
         record_numbers (List[int]): list of record numbers for the event
@@ -92,22 +289,27 @@ def hide_duplicate_packets(data: int, record_numbers: int, record_lengths: int,
     index = len(record_lengths) - 1
     prev_index = len(prev_record_lengths) - 1
 
+    # Packet boundaries are walked back from the end of the data, instead of summing the lengths for every packet
+    end = len(data)
+    prev_end = len(prev_data)
+
     # Loop while both indices are valid
     while index >= 0 and prev_index >= 0:
-        start       = sum(record_lengths[:index])
-        end         = start + record_lengths[index]
-
-        prev_start  = sum(prev_record_lengths[:prev_index])
-        prev_end    = prev_start + prev_record_lengths[prev_index]
+        start       = end - record_lengths[index]
+        prev_start  = prev_end - prev_record_lengths[prev_index]
 
         # If data and CRC match, store the packet number
         if ((data[start:end] == prev_data[prev_start:prev_end]) and (crc[index] == prev_crc[prev_index])):
-            duplicate_packets.insert(0, record_numbers[index])
+            duplicate_packets.append(record_numbers[index])
         else:
             break
 
         index      -= 1
         prev_index -= 1
+        end         = start
+        prev_end    = prev_start
+
+    duplicate_packets.reverse()
     return duplicate_packets
 
 
@@ -132,6 +334,7 @@ def add_aux_sensor_data(session, aux_sensor_event: AuxSensorEvent):
         session.add(new_sensor)
         session.flush()
     
+    ensure_partition(session, "aux_sensor_data", aux_sensor_event.timestamp)
     aux_sensor_data = AuxSensorData(
         aux_sensor_id = aux_sensor_event.aux_sensor_id,
         timestamp = aux_sensor_event.timestamp,
@@ -141,15 +344,41 @@ def add_aux_sensor_data(session, aux_sensor_event: AuxSensorEvent):
     # Add session to db (also adds other entities)
     session.add(aux_sensor_data) 
 
-def add_sensor_event(session, sensor_event: SensorEvent):
+
+def device_info_row(sensor_event: SensorEvent) -> dict:
     """
-    Adds a sensor event to the database. SensorEvent is initialized with default data.
+    Args:
+        sensor_event (SensorEvent): Event.
+
+    Returns:
+        dict: Column values of the device info row of the event. Text fields are 0 until the heartbeat is received, they
+        are converted to strings as a single row insert would (a multi-row insert mixing both types fails).
+    """
+    return {
+        "firmwareVersion": str(sensor_event.fwVersion),
+        "pwaRevision": str(sensor_event.pwaVersion),
+        "serialNumber": str(sensor_event.serialNumber),
+        "deviceType": str(sensor_event.deviceType),
+        "deviceLocation": str(sensor_event.deviceLocation),
+        "diagnostic": sensor_event.diagnostic,
+        "openValveCount": sensor_event.openValveCount,
+        "closeValveCount": sensor_event.closeValveCount,
+    }
+
+
+def build_event(sensor_event: SensorEvent, sensor: Sensor, timestamp: datetime = None) -> Event:
+    """
+    Creates the entities of a sensor event (event, device info, device data, device trend info and data records with
+    `TORQUE_STORAGE=packets`) without adding them to a session.
 
     Args:
-        session (_type_): Session object. See module header.
         sensor_event (SensorEvent): Event that will be added to database
+        sensor (Sensor): Sensor of the event
+        timestamp (datetime, optional): Time of the event. Defaults to now.
+
+    Returns:
+        Event: Event entity, referencing the other entities.
     """
-    logging.info("Attempting to add sensor event")
     # Create device trend info entity
     device_trend_info = DeviceTrendInfo(
         strokeTime = sensor_event.strokeTime,
@@ -158,20 +387,13 @@ def add_sensor_event(session, sensor_event: SensorEvent):
         batteryVoltage = sensor_event.batteryVoltage,
     )
 
-    # Transform sensor data to be compatible with db
-    flattened_torque_data, record_numbers, record_lengths = flatten_data(sensor_event)
-
-    # Create device data entity
+    # Create device data entity, per-packet arrays are transformed to be compatible with db (see `packet_columns`)
     device_data = DeviceData(
+        **packet_columns(sensor_event),
         lastTorqueBeforeSleep = sensor_event.lastTorqueBeforeSleep,
         firstTorqueAfterSleep = sensor_event.firstTorqueAfterSleep,
-        recordNumbers = record_numbers,
-        recordLengths = record_lengths,
-        torqueData = flattened_torque_data,
         hiddenDataIndices = sensor_event.hiddenDataIndices,
         typeOfStroke = sensor_event.typeOfStroke,
-        dataRecordPayloadCRCs = sensor_event.dataPacketPayloadCRCs,
-        calculatedDataRecordPayloadCRCs = sensor_event.calculatedDataPacketPayloadCRCs,
         eventRecordPayloadCRC = sensor_event.eventSummaryPayloadCRC,
         calculatedEventRecordPayloadCRC = sensor_event.calculatedEventSummaryPayloadCRC,
         heartbeatRecordPayloadCRC = sensor_event.heartbeatRecordPayloadCRC,
@@ -179,37 +401,271 @@ def add_sensor_event(session, sensor_event: SensorEvent):
     )
 
     # Create device info entity
-    device_info = DeviceInfo(
-        firmwareVersion = sensor_event.fwVersion,
-        pwaRevision = sensor_event.pwaVersion,
-        serialNumber = sensor_event.serialNumber,
-        deviceType = sensor_event.deviceType,
-        deviceLocation = sensor_event.deviceLocation,
-        diagnostic = sensor_event.diagnostic,
-        openValveCount = sensor_event.openValveCount,
-        closeValveCount = sensor_event.closeValveCount,
-    )
-
-    # Create sensor entity if not exists
-    sensor: Sensor = session.query(Sensor).filter_by(devEUI=sensor_event.devEUI).first()
-    if sensor is None:
-        sensor = Sensor(devEUI = sensor_event.devEUI)
+    device_info = DeviceInfo(**device_info_row(sensor_event))
 
     # Create event entity
-    event = Event(
-        timestamp=datetime.now(),
+    return Event(
+        timestamp = timestamp or datetime.now(),
         deviceInfo = device_info,
         deviceData = device_data,
         deviceTrendInfo = device_trend_info,
         sensor = sensor,
         isStreaming = sensor_event.isStreaming,
+        dataRecords = [DataRecord(**row) for row in data_record_rows(sensor_event)] if packet_storage() else [],
     )
 
+
+def add_sensor_event(session, sensor_event: SensorEvent, timestamp: datetime = None) -> Event:
+    """
+    Adds a sensor event to the database. SensorEvent is initialized with default data.
+
+    Args:
+        session (_type_): Session object. See module header.
+        sensor_event (SensorEvent): Event that will be added to database
+        timestamp (datetime, optional): Time of the event. Defaults to now.
+
+    Returns:
+        Event: Added event entity.
+    """
+    logging.info("Attempting to add sensor event")
+
+    # Create sensor entity if not exists
+    sensor: Sensor = session.query(Sensor).filter_by(devEUI=sensor_event.devEUI).first()
+    if sensor is None:
+        sensor = Sensor(devEUI = sensor_event.devEUI)
+
     # Add session to db (also adds other entities)
+    event = build_event(sensor_event, sensor, timestamp)
+    ensure_partition(session, "events", event.timestamp)
     session.add(event)
+    session.flush()
 
+    # Events stored closed are rolled up now, live events when they are closed
+    count_sensor_events(session, [(event.sensorID, event.timestamp, event.isStreaming)])
+    if not event.isStreaming:
+        add_to_rollups(session, [(event.sensorID, event.timestamp, trend_values(sensor_event))])
+    return event
 
-def upsert_live_sensor_event(session, sensor_event: SensorEvent, eventType: int = -1, prev_sensor_event: SensorEvent = None):
+
+@lru_cache(maxsize=None)
+def sensor_counters_statement():
+    """
+    Builds the statement adding events to the counters of a sensor. Counts are incremented in SQL, so concurrent
+    writers do not lose events, and the streaming status is only replaced by the one of a newer event. Parameters are
+    `sensor_id`, `added_count`, `added_timestamp` (time of the last event added) and `added_streaming`.
+
+    Returns:
+        Update: UPDATE of `sensors`.
+    """
+    sensors = Sensor.__table__
+    timestamp = bindparam("added_timestamp", type_=DateTime)
+    latest = or_(sensors.c.lastEventTimestamp == None, sensors.c.lastEventTimestamp <= timestamp)
+    return update(sensors).where(sensors.c.id == bindparam("sensor_id")).values(
+        eventCount=sensors.c.eventCount + bindparam("added_count"),
+        lastEventTimestamp=func.greatest(sensors.c.lastEventTimestamp, timestamp),
+        isStreaming=case((latest, bindparam("added_streaming", type_=Boolean)), else_=sensors.c.isStreaming),
+    )
+
+
+def count_sensor_events(session, added_events: List[Tuple[int, datetime, bool]]) -> None:
+    """
+    Adds events to the counters of their sensors (event count, last event timestamp and streaming status of the last
+    event, see `Sensor`), with one UPDATE per sensor.
+
+    Args:
+        session (_type_): Session object. See module header.
+        added_events (List[Tuple[int, datetime, bool]]): Sensor id, timestamp and streaming status of each event added,
+            in insertion order.
+    """
+    counters = {}
+    for sensor_id, timestamp, is_streaming in added_events:
+        count, last, streaming = counters.get(sensor_id, (0, None, False))
+        if last is None or timestamp >= last:
+            last, streaming = timestamp, is_streaming
+        counters[sensor_id] = (count + 1, last, streaming)
+
+    if counters:
+        session.execute(sensor_counters_statement(), [
+            {"sensor_id": sensor_id, "added_count": count, "added_timestamp": last, "added_streaming": streaming}
+            for sensor_id, (count, last, streaming) in counters.items()
+        ])
+
+
+def close_event(session, sensor_id: int, timestamp: datetime, sensor_event: SensorEvent) -> None:
+    """
+    Records that a live event was closed by its event summary: the event is added to the trend rollups and its sensor
+    stops streaming, unless a newer event was added since.
+
+    Args:
+        session (_type_): Session object. See module header.
+        sensor_id (int): ID of sensor.
+        timestamp (datetime): Time of the event.
+        sensor_event (SensorEvent): Final state of the event.
+    """
+    add_to_rollups(session, [(sensor_id, timestamp, trend_values(sensor_event))])
+    sensors = Sensor.__table__
+    session.execute(update(sensors).where(sensors.c.id == sensor_id, sensors.c.lastEventTimestamp <= timestamp)
+                    .values(isStreaming=False))
+
+
+def int_array_literal(values: List[int]) -> str:
+    """
+    Args:
+        values (List[int]): Integers, `None` for NULL elements.
+
+    Returns:
+        str: PostgreSQL array literal (`{1,2,NULL}`). Parsed much faster by the server than the `ARRAY[1, 2, NULL]`
+        expression psycopg2 sends for a list, which matters for torque data.
+    """
+    if None in values:
+        return "{" + ",".join("NULL" if value is None else str(value) for value in values) + "}"
+    return "{" + ",".join(map(str, values)) + "}"
+
+
+def bulk_insert_statement(model):
+    """
+    Args:
+        model (_type_): Entity class.
+
+    Returns:
+        Insert: INSERT statement of the table of `model`, returning ids in parameter order. Array columns are bound as
+        array literals (see `int_array_literal`) cast to the column type.
+    """
+    table = model.__table__
+    array_values = {column.name: cast(bindparam(column.name, type_=String), column.type)
+                    for column in table.columns if isinstance(column.type, ARRAY)}
+    return insert(table).values(array_values).returning(table.c.id, sort_by_parameter_order=True)
+
+
+def event_rows(sensor_event: SensorEvent) -> Tuple[dict, dict, dict]:
+    """
+    Args:
+        sensor_event (SensorEvent): Event.
+
+    Returns:
+        Tuple[dict, dict, dict]: Column values of the device info, device data and device trend info rows of the event,
+        arrays as array literals (see `bulk_insert_statement`).
+    """
+    columns = packet_columns(sensor_event)
+    device_info = device_info_row(sensor_event)
+    device_data = {
+        "lastTorqueBeforeSleep": sensor_event.lastTorqueBeforeSleep,
+        "firstTorqueAfterSleep": sensor_event.firstTorqueAfterSleep,
+        **{column: int_array_literal(values) if column in PACKET_ARRAY_COLUMNS else values
+           for column, values in columns.items()},
+        "hiddenDataIndices": int_array_literal(sensor_event.hiddenDataIndices),
+        "typeOfStroke": sensor_event.typeOfStroke,
+        "eventRecordPayloadCRC": sensor_event.eventSummaryPayloadCRC,
+        "calculatedEventRecordPayloadCRC": sensor_event.calculatedEventSummaryPayloadCRC,
+        "heartbeatRecordPayloadCRC": sensor_event.heartbeatRecordPayloadCRC,
+        "calculatedHeartbeatRecordPayloadCRC": sensor_event.calculatedHeartbeatRecordPayloadCRC,
+    }
+    device_trend_info = {
+        "strokeTime": sensor_event.strokeTime,
+        "maxTorque": sensor_event.maxTorque,
+        "temperature": sensor_event.temperature,
+        "batteryVoltage": sensor_event.batteryVoltage,
+    }
+    return device_info, device_data, device_trend_info
+
+
+def resolve_sensor_ids(session, devEUIs: List[str]) -> Dict[str, int]:
+    """
+    Finds the ids of sensors with a single query, creating the missing sensors with a single INSERT. Sensors created
+    concurrently by another session are picked up instead of failing.
+
+    Args:
+        session (_type_): Session object. See module header.
+        devEUIs (List[str]): Sensors to resolve.
+
+    Returns:
+        Dict[str, int]: devEUI mapped to sensor id.
+    """
+    devEUIs = list(dict.fromkeys(devEUIs))
+    sensor_ids = dict(session.execute(select(Sensor.devEUI, Sensor.id).where(Sensor.devEUI.in_(devEUIs))).all())
+
+    missing = [devEUI for devEUI in devEUIs if devEUI not in sensor_ids]
+    if missing:
+        session.execute(pg_insert(Sensor.__table__).on_conflict_do_nothing(index_elements=["devEUI"]),
+                        [{"devEUI": devEUI} for devEUI in missing])
+        sensor_ids.update(session.execute(select(Sensor.devEUI, Sensor.id).where(Sensor.devEUI.in_(missing))).all())
+    return sensor_ids
+
+
+def add_sensor_events_bulk(session, sensor_events: List[SensorEvent], timestamps: List[datetime] = None) -> List[int]:
+    """
+    Adds many sensor events with set-based statements, without ORM objects. Sensors are resolved with
+    `resolve_sensor_ids`, then the rows of each table are inserted with a multi-row INSERT ... RETURNING (batched by
+    SQLAlchemy's insertmanyvalues), the ids being returned in the order of `sensor_events`. Events are inserted (and
+    given ids) in order. Stores the same rows as `add_sensor_event`.
+
+    Args:
+        session (_type_): Session object. See module header.
+        sensor_events (List[SensorEvent]): Events that will be added to database
+        timestamps (List[datetime], optional): Time of each event. Defaults to now.
+
+    Returns:
+        List[int]: Ids of the new events, in the order of `sensor_events`.
+
+    Raises:
+        ValueError: When `timestamps` is set and its length differs from `sensor_events`.
+    """
+    logging.info(f"Attempting to bulk add {len(sensor_events)} sensor events")
+    if timestamps is not None and len(timestamps) != len(sensor_events):
+        raise ValueError(f"Got {len(timestamps)} timestamps for {len(sensor_events)} sensor events")
+    if not sensor_events:
+        return []
+
+    sensor_ids = resolve_sensor_ids(session, [sensor_event.devEUI for sensor_event in sensor_events])
+
+    device_infos, device_datas, device_trend_infos = [], [], []
+    for sensor_event in sensor_events:
+        device_info, device_data, device_trend_info = event_rows(sensor_event)
+        device_infos.append(device_info)
+        device_datas.append(device_data)
+        device_trend_infos.append(device_trend_info)
+
+    def insert_rows(model, rows: List[dict]) -> List[int]:
+        return session.scalars(bulk_insert_statement(model), rows).all()
+
+    device_info_ids = insert_rows(DeviceInfo, device_infos)
+    device_data_ids = insert_rows(DeviceData, device_datas)
+    device_trend_info_ids = insert_rows(DeviceTrendInfo, device_trend_infos)
+
+    now = datetime.now()
+    timestamps = [timestamp or now for timestamp in timestamps or [None] * len(sensor_events)]
+    ensure_partitions(session, "events", timestamps)
+    event_ids = insert_rows(Event, [
+        {
+            "timestamp": timestamp,
+            "isStreaming": sensor_event.isStreaming,
+            "deviceInfoID": device_info_id,
+            "deviceDataID": device_data_id,
+            "deviceTrendInfoID": device_trend_info_id,
+            "sensorID": sensor_ids[sensor_event.devEUI],
+        }
+        for sensor_event, timestamp, device_info_id, device_data_id, device_trend_info_id
+        in zip(sensor_events, timestamps, device_info_ids, device_data_ids, device_trend_info_ids)
+    ])
+
+    if packet_storage():
+        data_records = [
+            {"eventID": event_id, **row}
+            for event_id, sensor_event in zip(event_ids, sensor_events) for row in data_record_rows(sensor_event)
+        ]
+        if data_records:
+            session.execute(insert(DataRecord.__table__), data_records)
+
+    count_sensor_events(session, [(sensor_ids[sensor_event.devEUI], timestamp, sensor_event.isStreaming)
+                                  for sensor_event, timestamp in zip(sensor_events, timestamps)])
+    add_to_rollups(session, [(sensor_ids[sensor_event.devEUI], timestamp, trend_values(sensor_event))
+                             for sensor_event, timestamp in zip(sensor_events, timestamps)
+                             if not sensor_event.isStreaming])
+    return event_ids
+
+
+def upsert_live_sensor_event(session, sensor_event: SensorEvent, eventType: int = -1, prev_sensor_event: SensorEvent = None,
+                             cache: LiveEventCache = None):
     """
     Updates an event in the database. If live event doesn't exist, initialize it.
     This assumes all events happen one after another, and cannot occur at the same time.
@@ -218,58 +674,79 @@ def upsert_live_sensor_event(session, sensor_event: SensorEvent, eventType: int
         session (_type_): Session object. See module header.
         sensor_event (SensorEvent): Event that will be added to database
         event_type (int): -1 for default, 0 for heartbeat, 1 for data record, 2 for event summary
-        prev_sensor_event (SensorEvent): Previous event to be used as a comparison and check for duplicates
+        prev_sensor_event (SensorEvent): Previous event. Unused, duplicate packets are already in `hiddenDataIndices`
+        cache (LiveEventCache, optional): Primary keys of the live events, filled when a live event is created and
+            emptied when it is closed. Defaults to None (the live event is always searched for).
     """
     logging.info("Attempting to update sensor event")
+    devEUI, crc = sensor_event.devEUI, sensor_event.heartbeatRecordPayloadCRC
+
+    # Load the cached live event and its rows by primary key, the entry is dropped if the event was closed or is gone
+    existing_event: Event = None
+    keys = cache.get(devEUI, crc) if cache is not None else None
+    if keys is not None:
+        existing_event = session.get(Event, keys.event_id, options=[
+            joinedload(Event.deviceData), joinedload(Event.deviceInfo), joinedload(Event.deviceTrendInfo)
+        ])
+        if existing_event is None or not existing_event.isStreaming or existing_event.sensorID != keys.sensor_id:
+            cache.discard(devEUI, crc, stale=True)
+            existing_event = None
 
     # Query for an existing event with the same devEUI, live stream, and heartbeat CRC, with the highest ID
-    existing_event: Event = session.scalars(
-        select(Event).join(
-            Event.sensor
-        ).join(
-            Event.deviceData
-        ).filter(
-            Event.isStreaming == True,
-            Sensor.devEUI == sensor_event.devEUI,
-            DeviceData.heartbeatRecordPayloadCRC == sensor_event.heartbeatRecordPayloadCRC,
-        ).order_by(desc(Event.id))
-    ).first()
+    if existing_event is None:
+        existing_event = session.scalars(
+            select(Event).join(
+                Event.sensor
+            ).join(
+                Event.deviceData
+            ).filter(
+                Event.isStreaming == True,
+                Sensor.devEUI == devEUI,
+                DeviceData.heartbeatRecordPayloadCRC == crc,
+            ).order_by(desc(Event.id))
+        ).first()
 
     if existing_event is None:
         logging.info("No matching event found, creating a new one")
         sensor_event.isStreaming = True if eventType != 2 else False
-        return add_sensor_event(session, sensor_event)
+        event = add_sensor_event(session, sensor_event)
+        if cache is not None and event.isStreaming:
+            session.flush()
+            cache.put(devEUI, crc, LiveEventKeys(event.id, event.sensorID, event.deviceInfoID, event.deviceDataID,
+                                                 event.deviceTrendInfoID))
+            if packet_storage():
+                remember_data_records(session, sensor_event, [row.recordNumber for row in event.dataRecords],
+                                      cache.packets(devEUI, crc))
+        return
 
     # non-live events shouldn't be updated
     if existing_event.isStreaming == False:
         logging.warning("update_sensor_event(): Update of event failed. Attempted update of a non-live event")
         return
 
-    # Transform sensor data to be compatible with db
+    # Transform sensor data to be compatible with db. Packets to hide are found during ingest (see DuplicateDetector)
     hidden_packets = sensor_event.hiddenDataIndices
-    flattened_torque_data, record_numbers, record_lengths = flatten_data(sensor_event)
-
-    # update list of packets to hide if event summary reached
-    # if ((eventType == 2) and (prev_sensor_event != None)):
-    #     hidden_packets = hide_duplicate_packets(flattened_torque_data, record_numbers, record_lengths, sensor_event.dataPacketPayloadCRCs,
-    #                                             *flatten_data(prev_sensor_event), prev_sensor_event.calculatedDataPacketPayloadCRCs)
+    columns = packet_columns(sensor_event)
+    if packet_storage():
+        write_data_records(session, existing_event.id, sensor_event,
+                           cache.packets(devEUI, crc) if cache is not None and eventType != 2 else None)
 
     # Set streaming to false if event summary reached
     if eventType == 2:
         existing_event.isStreaming = False
+        close_event(session, existing_event.sensorID, existing_event.timestamp, sensor_event)
+        if cache is not None:
+            cache.discard(devEUI, crc)
 
     # replace current event in db with sensor event. Sensor_event should be the updated version of the event
     logging.info("Found existing event, updating fields")
 
+    for column, values in columns.items():
+        setattr(existing_event.deviceData, column, values)
     existing_event.deviceData.lastTorqueBeforeSleep = sensor_event.lastTorqueBeforeSleep
     existing_event.deviceData.firstTorqueAfterSleep = sensor_event.firstTorqueAfterSleep
-    existing_event.deviceData.recordNumbers = record_numbers
-    existing_event.deviceData.recordLengths = record_lengths
-    existing_event.deviceData.torqueData = flattened_torque_data
     existing_event.deviceData.hiddenDataIndices = hidden_packets
     existing_event.deviceData.typeOfStroke = sensor_event.typeOfStroke
-    existing_event.deviceData.dataRecordPayloadCRCs = sensor_event.dataPacketPayloadCRCs
-    existing_event.deviceData.calculatedDataRecordPayloadCRCs = sensor_event.calculatedDataPacketPayloadCRCs
     existing_event.deviceData.eventRecordPayloadCRC = sensor_event.eventSummaryPayloadCRC
     existing_event.deviceData.calculatedEventRecordPayloadCRC = sensor_event.calculatedEventSummaryPayloadCRC
     existing_event.deviceData.heartbeatRecordPayloadCRC = sensor_event.heartbeatRecordPayloadCRC
@@ -290,6 +767,172 @@ def upsert_live_sensor_event(session, sensor_event: SensorEvent, eventType: int
     existing_event.deviceInfo.closeValveCount = sensor_event.closeValveCount
 
 
+# Bound parameter prefixes of `live_update_statement`, per table
+_LIVE_UPDATE_PREFIXES = {DeviceInfo: "info_", DeviceData: "data_", DeviceTrendInfo: "trend_"}
+
+
+@lru_cache(maxsize=None)
+def live_update_statement():
+    """
+    Builds (once, SQLAlchemy then reuses its compiled form) the statement writing a live event in a single round trip.
+    The event row is updated first, only while it is still streaming, and data-modifying CTEs update the device info,
+    device data and device trend info rows by id only if it was. Parameters are `event_id`, `isStreaming` and, for each
+    child table, its id and columns prefixed as in `_LIVE_UPDATE_PREFIXES` (e.g. `data_id`, `data_torqueData`).
+
+    Returns:
+        Select: Statement returning the id and timestamp of the updated event, no row when the event is gone or was
+        closed.
+    """
+    events = Event.__table__
+    live_event = update(events).where(
+        events.c.id == bindparam("event_id"),
+        events.c.isStreaming == True,
+    ).values(isStreaming=bindparam("isStreaming")).returning(events.c.id, events.c.timestamp).cte("live_event")
+
+    children = []
+    for model, prefix in _LIVE_UPDATE_PREFIXES.items():
+        table = model.__table__
+        values = {}
+        for column in table.columns:
+            if column.primary_key:
+                continue
+            if isinstance(column.type, ARRAY):
+                values[column.name] = cast(bindparam(prefix + column.name, type_=String), column.type)
+            else:
+                values[column.name] = bindparam(prefix + column.name, type_=column.type)
+        children.append(update(table).where(
+            table.c.id == bindparam(prefix + "id"),
+            exists(select(live_event.c.id)),
+        ).values(values).returning(table.c.id).cte("live_" + table.name))
+
+    return select(live_event.c.id, live_event.c.timestamp).add_cte(*children)
+
+
+def live_update_parameters(sensor_event: SensorEvent, keys: LiveEventKeys, is_streaming: bool) -> dict:
+    """
+    Args:
+        sensor_event (SensorEvent): Current state of the live event.
+        keys (LiveEventKeys): Primary keys of the event.
+        is_streaming (bool): Whether the event stays live.
+
+    Returns:
+        dict: Parameters of `live_update_statement`.
+    """
+    parameters = {"event_id": keys.event_id, "isStreaming": is_streaming, "info_id": keys.device_info_id,
+                  "data_id": keys.device_data_id, "trend_id": keys.device_trend_info_id}
+    for model, row in zip((DeviceInfo, DeviceData, DeviceTrendInfo), event_rows(sensor_event)):
+        prefix = _LIVE_UPDATE_PREFIXES[model]
+        parameters.update((prefix + name, value) for name, value in row.items())
+    return parameters
+
+
+def find_live_event(session, devEUI: str, crc: int) -> Optional[LiveEventKeys]:
+    """
+    Searches for the live event of a device, the streaming event with the given heartbeat CRC and the highest id.
+
+    Args:
+        session (_type_): Session object. See module header.
+        devEUI (str): Device.
+        crc (int): Heartbeat record payload CRC of the event.
+
+    Returns:
+        LiveEventKeys | None: Primary keys of the event, None when there is no live event.
+    """
+    row = session.execute(
+        select(Event.id, Event.sensorID, Event.deviceInfoID, Event.deviceDataID, Event.deviceTrendInfoID).join(
+            Event.sensor
+        ).join(
+            Event.deviceData
+        ).filter(
+            Event.isStreaming == True,
+            Sensor.devEUI == devEUI,
+            DeviceData.heartbeatRecordPayloadCRC == crc,
+        ).order_by(desc(Event.id)).limit(1)
+    ).first()
+    return LiveEventKeys(*row) if row is not None else None
+
+
+def upsert_live_sensor_event_core(session, sensor_event: SensorEvent, eventType: int = -1,
+                                  prev_sensor_event: SensorEvent = None, cache: LiveEventCache = None):
+    """
+    Same as `upsert_live_sensor_event`, without ORM objects: the live event is written with `live_update_statement`,
+    a single statement per packet when its primary keys are cached (plus the INSERT of the new data records with
+    `TORQUE_STORAGE=packets`). Otherwise the event is searched for first
+    (`find_live_event`), or created with `add_sensor_event` once per event.
+
+    Args:
+        session (_type_): Session object. See module header.
+        sensor_event (SensorEvent): Event that will be added to database
+        eventType (int): -1 for default, 0 for heartbeat, 1 for data record, 2 for event summary
+        prev_sensor_event (SensorEvent): Previous event. Unused, duplicate packets are already in `hiddenDataIndices`
+        cache (LiveEventCache, optional): Primary keys of the live events, see `upsert_live_sensor_event`. Defaults to
+            None (the live event is always searched for).
+    """
+    devEUI, crc = sensor_event.devEUI, sensor_event.heartbeatRecordPayloadCRC
+    is_streaming = eventType != 2
+
+    # The cached event may have been closed or be gone, then it is searched for like an uncached one
+    keys = cache.get(devEUI, crc) if cache is not None else None
+    if keys is not None:
+        updated = session.execute(live_update_statement(),
+                                  live_update_parameters(sensor_event, keys, is_streaming)).first()
+        if updated:
+            # Only the packets received since the last write are sent with `TORQUE_STORAGE=packets`
+            if packet_storage():
+                write_data_records(session, keys.event_id, sensor_event,
+                                   cache.packets(devEUI, crc) if is_streaming else None)
+            if not is_streaming:
+                close_event(session, keys.sensor_id, updated.timestamp, sensor_event)
+                cache.discard(devEUI, crc)
+            return
+        cache.discard(devEUI, crc, stale=True)
+
+    keys = find_live_event(session, devEUI, crc)
+    if keys is None:
+        logging.info("No matching event found, creating a new one")
+        sensor_event.isStreaming = is_streaming
+        event = add_sensor_event(session, sensor_event)
+        if cache is not None and is_streaming:
+            session.flush()
+            cache.put(devEUI, crc, LiveEventKeys(event.id, event.sensorID, event.deviceInfoID, event.deviceDataID,
+                                                 event.deviceTrendInfoID))
+            if packet_storage():
+                remember_data_records(session, sensor_event, [row.recordNumber for row in event.dataRecords],
+                                      cache.packets(devEUI, crc))
+        return
+
+    updated = session.execute(live_update_statement(), live_update_parameters(sensor_event, keys, is_streaming)).first()
+    if updated is None:
+        # Closed by another writer since it was found, its packets must not be appended to the closed event
+        logging.info("Live event was closed concurrently, packet dropped")
+        return
+    if not is_streaming:
+        close_event(session, keys.sensor_id, updated.timestamp, sensor_event)
+    if cache is not None and is_streaming:
+        cache.put(devEUI, crc, keys)
+    if packet_storage():
+        write_data_records(session, keys.event_id, sensor_event,
+                           cache.packets(devEUI, crc) if cache is not None and is_streaming else None)
+
+
+def time_range(column, start: datetime = None, end: datetime = None) -> list:
+    """
+    Args:
+        column (_type_): Timestamp column.
+        start (datetime, optional): Lower bound (inclusive). Defaults to None.
+        end (datetime, optional): Upper bound (exclusive). Defaults to None.
+
+    Returns:
+        list: Filter conditions of the bounds that are set.
+    """
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start)
+    if end is not None:
+        conditions.append(column < end)
+    return conditions
+
+
 def get_aux_sensors(session):
     """
     Returns a list of auxilary sensors.
@@ -320,31 +963,159 @@ def get_sensors(session):
                            ).unique().all()
 
 
-def get_events(session, sensor_id: int):
+def get_sensor_summaries(session, prefix: str = None, after_id: int = None, limit: int = None):
+    """
+    Returns the summary of each sensor (id, devEUI, eventCount, lastEventTimestamp and isStreaming) from the counters
+    of `sensors`, without reading events. Paginated by id: pass the id of the last sensor of a page as `after_id` to
+    get the next one.
+
+    Args:
+        session (_type_): Session object. See module header.
+        prefix (str, optional): Only sensors whose devEUI starts with it. Defaults to None (all sensors).
+        after_id (int, optional): Only sensors with a greater id. Defaults to None (from the first sensor).
+        limit (int, optional): Maximum number of sensors. Defaults to None (no limit).
+
+    Returns:
+        List[Row]: Summaries in id order.
+    """
+    query = select(Sensor.id, Sensor.devEUI, Sensor.eventCount, Sensor.lastEventTimestamp, Sensor.isStreaming)
+    if prefix:
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.where(Sensor.devEUI.like(escaped + "%", escape="\\"))
+    if after_id is not None:
+        query = query.where(Sensor.id > after_id)
+    return session.execute(query.order_by(Sensor.id).limit(limit)).all()
+
+
+def get_events(session, sensor_id: int, start: datetime = None, end: datetime = None):
     """
     Returns a list of events for a sensor.
 
     Args:
         session (_type_): Session object. See module header.
         sensor_id (int): ID of sensor.
+        start (datetime, optional): Only events from this time. Defaults to None (no lower bound).
+        end (datetime, optional): Only events before this time. Defaults to None (no upper bound).
 
     Returns:
         List[Event]: List of events containing `Event` objects.
     """
+    # Bounds on the partition key, only the partitions of the months in range are scanned. Ordered by id, the
+    # partitions would otherwise be appended in time order
     return session.scalars(select(Event)
                            .filter_by(sensorID=sensor_id)
+                           .filter(*time_range(Event.timestamp, start, end))
                            .options(joinedload(Event.deviceTrendInfo))
+                           .order_by(Event.id)
                            ).all()
 
-def get_aux_sensor_data(session, sensor_id: int):
+
+def get_event_columns(session, sensor_id: int, after_id: int = None, limit: int = None, since: datetime = None,
+                      before: datetime = None, latest: bool = False) -> Dict[str, list]:
+    """
+    Returns the ids, timestamps and trends of the events of a sensor in columnar form (one list per column), selected
+    with a single query of only those columns, ordered and limited in SQL. Paginated by id: pass the last id of a page
+    as `after_id` to get the next one.
+
+    Args:
+        session (_type_): Session object. See module header.
+        sensor_id (int): ID of sensor.
+        after_id (int, optional): Only events with a greater id. Defaults to None (from the first event).
+        limit (int, optional): Maximum number of events. Defaults to None (no limit).
+        since (datetime, optional): Only events from this time. Defaults to None (no lower bound).
+        before (datetime, optional): Only events before this time. Defaults to None (no upper bound).
+        latest (bool, optional): The last `limit` events instead of the first ones, still in id order. Defaults to
+            False.
+
+    Returns:
+        Dict[str, list]: `ids`, `timestamps` and each of `EVENT_TREND_COLUMNS`, in id order.
+    """
+    query = select(Event.id, Event.timestamp, *EVENT_TREND_COLUMNS.values()).join(
+        Event.deviceTrendInfo
+    ).filter(
+        Event.sensorID == sensor_id,
+        *time_range(Event.timestamp, since, before),
+    )
+    if after_id is not None:
+        query = query.filter(Event.id > after_id)
+    rows = session.execute(query.order_by(desc(Event.id) if latest else Event.id).limit(limit)).all()
+    if latest:
+        rows.reverse()
+
+    names = ["ids", "timestamps", *EVENT_TREND_COLUMNS]
+    return {name: [row[i] for row in rows] for i, name in enumerate(names)}
+
+
+def get_events_between(session, sensor_ids: Optional[List[int]], start: datetime, end: datetime,
+                       limit: int = None) -> Dict[str, list]:
+    """
+    Returns the events of one or many sensors in a time window, in columnar form like `get_event_columns` (plus the
+    sensor of each event). The bounds on the partition key only scan the partitions of the window, in which events are
+    found with `ix_events_sensor_id_timestamp` (given sensors) or `ix_events_timestamp_brin` (all sensors), so narrow
+    windows cost the same whatever the size of the table.
+
+    Args:
+        session (_type_): Session object. See module header.
+        sensor_ids (List[int] | None): IDs of sensors, None for all sensors.
+        start (datetime): Only events from this time.
+        end (datetime): Only events before this time.
+        limit (int, optional): Maximum number of events (the first ones). Defaults to None (no limit).
+
+    Returns:
+        Dict[str, list]: `ids`, `sensorIDs`, `timestamps` and each of `EVENT_TREND_COLUMNS`, in time order.
+    """
+    query = select(Event.id, Event.sensorID, Event.timestamp, *EVENT_TREND_COLUMNS.values()).join(
+        Event.deviceTrendInfo
+    ).filter(
+        *time_range(Event.timestamp, start, end),
+    )
+    if sensor_ids is not None:
+        query = query.filter(Event.sensorID.in_(sensor_ids))
+    rows = session.execute(query.order_by(Event.timestamp, Event.id).limit(limit)).all()
+
+    names = ["ids", "sensorIDs", "timestamps", *EVENT_TREND_COLUMNS]
+    return {name: [row[i] for row in rows] for i, name in enumerate(names)}
+
+
+def get_aux_sensor_data(session, sensor_id: int, start: datetime = None, end: datetime = None):
     """
     retrieves the data tied to a sensor
 
     Args:
         session (_type_): Session object. See module header.
         sensor_id (int): ID of a sensor
+        start (datetime, optional): Only data from this time. Defaults to None (no lower bound).
+        end (datetime, optional): Only data before this time. Defaults to None (no upper bound).
+    """
+    return session.scalars(select(AuxSensorData)
+                           .filter_by(aux_sensor_id=sensor_id)
+                           .filter(*time_range(AuxSensorData.timestamp, start, end))
+                           ).all()
+
+
+def get_trend_rollups(session, sensor_id: int, resolution: str = "hour", start: datetime = None, end: datetime = None):
+    """
+    Returns the trend rollups of a sensor, one per bucket holding closed events (see `rollups`).
+
+    Args:
+        session (_type_): Session object. See module header.
+        sensor_id (int): ID of sensor.
+        resolution (str, optional): `hour` or `day`. Defaults to `hour`.
+        start (datetime, optional): Only buckets from this time. Defaults to None (no lower bound).
+        end (datetime, optional): Only buckets before this time. Defaults to None (no upper bound).
+
+    Raises:
+        ValueError: Raised when the resolution is unknown.
+
+    Returns:
+        List[TrendRollup]: Rollups in bucket order.
     """
-    return session.scalars(select(AuxSensorData).filter_by(aux_sensor_id=sensor_id)).all()
+    model = rollup_model(resolution)
+    return session.scalars(select(model)
+                           .filter_by(sensorID=sensor_id)
+                           .filter(*time_range(model.bucket, start, end))
+                           .order_by(model.bucket)
+                           ).all()
 
 
 def get_event(session, sensor_id: int, event_id: int):
@@ -363,5 +1134,6 @@ def get_event(session, sensor_id: int, event_id: int):
                            .filter_by(id=event_id, sensorID=sensor_id)
                            .options(joinedload(Event.deviceInfo),
                                     joinedload(Event.deviceData),
-                                    joinedload(Event.deviceTrendInfo))
+                                    joinedload(Event.deviceTrendInfo),
+                                    selectinload(Event.dataRecords))
                            ).first()
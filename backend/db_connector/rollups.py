@@ -0,0 +1,187 @@
+"""
+Rollups Module
+
+This module maintains the hourly and daily trend rollups of each sensor (`trend_rollups_hourly` and
+`trend_rollups_daily`, see `TrendRollup`), so trends over long time ranges are read from one row per bucket instead of
+one row per event.
+
+Closed events are added to the buckets of their timestamp once, when they are stored closed or when the event summary
+closes a live event (`queries.upsert_live_sensor_event`), with an INSERT ... ON CONFLICT DO UPDATE merging them into
+the existing rows. Live events are not rolled up. Rollups are kept when partitions are dropped (see `partitions`),
+`rebuild_rollups` recomputes them from the events stored.
+
+Example:
+    `python -m db_connector.rollups rebuild` (from the `backend` folder)
+
+Date:
+    October 2026
+"""
+
+import argparse
+import logging
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from .models import Event, DeviceTrendInfo, HourlyTrendRollup, DailyTrendRollup
+
+
+# `DeviceTrendInfo` columns (and `SensorEvent` attributes) rolled up
+TREND_METRICS = ("strokeTime", "maxTorque", "temperature", "batteryVoltage")
+
+# Rollup model of each resolution
+ROLLUP_RESOLUTIONS = {"hour": HourlyTrendRollup, "day": DailyTrendRollup}
+
+# (sensor id, event timestamp, value of each of `TREND_METRICS`) of a closed event
+ClosedEvent = Tuple[int, datetime, Dict[str, int]]
+
+
+def rollup_model(resolution: str) -> type:
+    """
+    Args:
+        resolution (str): One of `ROLLUP_RESOLUTIONS`.
+
+    Raises:
+        ValueError: Raised when the resolution is unknown.
+
+    Returns:
+        type: Rollup model of the resolution.
+    """
+    if resolution not in ROLLUP_RESOLUTIONS:
+        raise ValueError(f"Unrecognized rollup resolution {resolution}")
+    return ROLLUP_RESOLUTIONS[resolution]
+
+
+def bucket_start(timestamp: datetime, resolution: str) -> datetime:
+    """
+    Args:
+        timestamp (datetime): Time of an event.
+        resolution (str): One of `ROLLUP_RESOLUTIONS`.
+
+    Returns:
+        datetime: Start of the bucket of the timestamp.
+    """
+    rollup_model(resolution)
+    timestamp = timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0) if resolution == "day" else timestamp
+
+
+def rollup_rows(closed_events: Iterable[ClosedEvent], resolution: str) -> List[dict]:
+    """
+    Aggregates closed events per sensor and bucket (a statement may not update the same row twice).
+
+    Args:
+        closed_events (Iterable[ClosedEvent]): Closed events.
+        resolution (str): One of `ROLLUP_RESOLUTIONS`.
+
+    Returns:
+        List[dict]: Rows of the rollup model, one per sensor and bucket.
+    """
+    rows = {}
+    for sensor_id, timestamp, trends in closed_events:
+        key = (sensor_id, bucket_start(timestamp, resolution))
+        row = rows.get(key)
+        if row is None:
+            rows[key] = row = {"sensorID": sensor_id, "bucket": key[1], "eventCount": 0}
+            for metric in TREND_METRICS:
+                row.update({f"{metric}Min": trends[metric], f"{metric}Max": trends[metric], f"{metric}Sum": 0})
+        row["eventCount"] += 1
+        for metric in TREND_METRICS:
+            row[f"{metric}Min"] = min(row[f"{metric}Min"], trends[metric])
+            row[f"{metric}Max"] = max(row[f"{metric}Max"], trends[metric])
+            row[f"{metric}Sum"] += trends[metric]
+    return list(rows.values())
+
+
+@lru_cache(maxsize=None)
+def rollup_statement(model: type):
+    """
+    Builds the statement merging rows into the existing rollups: counts and sums are added, minimums and maximums
+    compared.
+
+    Args:
+        model (type): Rollup model.
+
+    Returns:
+        Insert: INSERT ... ON CONFLICT DO UPDATE of the rollup table.
+    """
+    table = model.__table__
+    statement = pg_insert(table)
+    merged = {"eventCount": table.c.eventCount + statement.excluded.eventCount}
+    for metric in TREND_METRICS:
+        merged[f"{metric}Min"] = func.least(table.c[f"{metric}Min"], statement.excluded[f"{metric}Min"])
+        merged[f"{metric}Max"] = func.greatest(table.c[f"{metric}Max"], statement.excluded[f"{metric}Max"])
+        merged[f"{metric}Sum"] = table.c[f"{metric}Sum"] + statement.excluded[f"{metric}Sum"]
+    return statement.on_conflict_do_update(index_elements=["sensorID", "bucket"], set_=merged)
+
+
+def add_to_rollups(session, closed_events: Iterable[ClosedEvent]) -> None:
+    """
+    Adds closed events to the rollups of every resolution. Each event must only be added once.
+
+    Args:
+        session (_type_): Session object. See module header.
+        closed_events (Iterable[ClosedEvent]): Closed events.
+    """
+    closed_events = list(closed_events)
+    if not closed_events:
+        return
+    for resolution, model in ROLLUP_RESOLUTIONS.items():
+        session.execute(rollup_statement(model), rollup_rows(closed_events, resolution))
+
+
+def trend_values(sensor_event) -> Dict[str, int]:
+    """
+    Args:
+        sensor_event (SensorEvent): Event.
+
+    Returns:
+        Dict[str, int]: Value of each of `TREND_METRICS`.
+    """
+    return {metric: getattr(sensor_event, metric) for metric in TREND_METRICS}
+
+
+def rebuild_rollups(session) -> None:
+    """
+    Recomputes the rollups of every resolution from the closed events stored. Buckets of events that are no longer
+    stored (e.g. dropped partitions) are lost.
+
+    Args:
+        session (_type_): Session object. See module header.
+    """
+    trend_info = DeviceTrendInfo.__table__
+    for resolution, model in ROLLUP_RESOLUTIONS.items():
+        logging.info(f"Rebuilding {model.__tablename__}")
+        bucket = func.date_trunc(resolution, Event.timestamp)
+        aggregates = [func.count()]
+        for metric in TREND_METRICS:
+            aggregates += [func.min(trend_info.c[metric]), func.max(trend_info.c[metric]),
+                           func.sum(trend_info.c[metric])]
+
+        session.execute(delete(model.__table__))
+        session.execute(insert(model.__table__).from_select(
+            [column.name for column in model.__table__.columns],
+            select(Event.sensorID, bucket, *aggregates)
+            .join(trend_info, trend_info.c.id == Event.deviceTrendInfoID)
+            .where(Event.isStreaming == False)
+            .group_by(Event.sensorID, bucket)
+        ))
+
+
+def main():
+    from db_connector import DBConnector
+
+    parser = argparse.ArgumentParser(description="Manages the hourly and daily trend rollups.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="Recompute the rollups from the events stored")
+    parser.parse_args()
+
+    conn = DBConnector()
+    logging.getLogger().setLevel(logging.INFO)   # DBConnector enables debug logging
+    with conn.Session.begin() as session:
+        rebuild_rollups(session)
+
+
+if __name__ == "__main__":
+    main()
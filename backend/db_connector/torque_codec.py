@@ -0,0 +1,123 @@
+"""
+Torque Codec Module
+
+This module provides the compact encodings of the torque samples of an event stored in `device_datas.torqueDataPacked`
+(see `TORQUE_ENCODING` in `queries`). Samples are signed 16-bit on the wire, so they are stored as little-endian int16
+instead of 4 byte integers, optionally delta encoded and compressed:
+- `raw`: Little-endian int16 samples.
+- `delta-zlib`: Differences between consecutive samples (modulo 2^16, so any pair of samples round trips), compressed
+  with zlib. Torque curves are smooth, so the differences are small and compress well.
+- `delta-lz4`: Same with lz4 block compression, faster to decode. Optional, lz4 is only imported when this encoding is
+  used.
+
+The first byte of an encoded value identifies its encoding, so values written with different encodings can be read
+back without knowing the setting in use when they were written.
+
+Date:
+    October 2026
+"""
+
+import sys
+import zlib
+from array import array
+from itertools import accumulate, chain
+from typing import List, Sequence
+from mqtt_client.torque import pack_torque_samples, unpack_torque_samples
+
+
+# Encoding -> identifier stored in the first byte
+TORQUE_ENCODINGS = {"raw": 0, "delta-zlib": 1, "delta-lz4": 2}
+
+# zlib compression level, 6 is the zlib default
+ZLIB_LEVEL = 6
+
+_ENCODING_NAMES = {identifier: name for name, identifier in TORQUE_ENCODINGS.items()}
+
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def delta_encode(samples: Sequence[int]) -> bytes:
+    """
+    Args:
+        samples (Sequence[int]): Signed 16-bit torque samples.
+
+    Returns:
+        bytes: Little-endian uint16 differences between consecutive samples (the first one from 0), modulo 2^16.
+    """
+    deltas = array("H", [(sample - previous) & 0xFFFF for previous, sample in zip(chain((0,), samples), samples)])
+    if not _LITTLE_ENDIAN:
+        deltas.byteswap()
+    return deltas.tobytes()
+
+
+def delta_decode(data: bytes) -> List[int]:
+    """
+    Decodes differences encoded with `delta_encode`.
+
+    Args:
+        data (bytes): Little-endian uint16 differences.
+
+    Returns:
+        List[int]: Signed 16-bit torque samples.
+    """
+    deltas = array("H")
+    deltas.frombytes(data)
+    if not _LITTLE_ENDIAN:
+        deltas.byteswap()
+    # Running sum modulo 2^16, reinterpreted as signed
+    samples = array("h")
+    samples.frombytes(array("H", accumulate(deltas, lambda total, delta: (total + delta) & 0xFFFF)).tobytes())
+    return samples.tolist()
+
+
+def encode_torque(samples: Sequence[int], encoding: str) -> bytes:
+    """
+    Encodes the torque samples of an event.
+
+    Args:
+        samples (Sequence[int]): Signed 16-bit torque samples (flattened, see `SensorEvent.flatten_torque`).
+        encoding (str): One of `TORQUE_ENCODINGS`.
+
+    Raises:
+        ValueError: Raised when the encoding is not recognized.
+
+    Returns:
+        bytes: Encoding identifier followed by the encoded samples.
+    """
+    if encoding not in TORQUE_ENCODINGS:
+        raise ValueError(f"Unrecognized torque encoding {encoding}")
+
+    if encoding == "raw":
+        data = pack_torque_samples(array("h", samples))
+    elif encoding == "delta-zlib":
+        data = zlib.compress(delta_encode(samples), ZLIB_LEVEL)
+    else:
+        import lz4.block
+        data = lz4.block.compress(delta_encode(samples))
+    return bytes((TORQUE_ENCODINGS[encoding],)) + data
+
+
+def decode_torque(data: bytes) -> List[int]:
+    """
+    Decodes torque samples encoded with `encode_torque`, whatever their encoding.
+
+    Args:
+        data (bytes): Encoded samples.
+
+    Raises:
+        ValueError: Raised when the encoding identifier is not recognized.
+
+    Returns:
+        List[int]: Signed 16-bit torque samples.
+    """
+    data = memoryview(data).cast("B")   # psycopg2 returns bytea as a memoryview of chars
+    encoding = _ENCODING_NAMES.get(data[0]) if len(data) else None
+    if encoding is None:
+        raise ValueError("Unrecognized torque encoding identifier")
+
+    if encoding == "raw":
+        return unpack_torque_samples(data[1:])
+    elif encoding == "delta-zlib":
+        return delta_decode(zlib.decompress(data[1:]))
+    import lz4.block
+    return delta_decode(lz4.block.decompress(data[1:]))
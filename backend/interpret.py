@@ -15,6 +15,7 @@ Date:
 
 import sys, os
 from mqtt_client import SensorEvent
+from mqtt_client.capture import TOPICS_FILE, CaptureReader, read_dump_files
 import logging
 
 
@@ -58,15 +59,14 @@ def dump_data():
 
     event = SensorEvent()
 
-    for filename in os.listdir(folder_path):
-        filepath = os.path.join(folder_path, filename)
-        if not os.path.isfile(filepath):
-            continue
+    # Capture directory or folder of .data files
+    if os.path.isfile(os.path.join(folder_path, TOPICS_FILE)):
+        messages = CaptureReader(folder_path)
+    else:
+        messages = read_dump_files(folder_path)
 
-        _, _, name, filetype = filename.split(".")
-        topic = "/".join(name.split("_"))
-
-        event.parse_from_data(topic, open(filepath, "rb").read())
+    for _, topic, payload in messages:
+        event.parse_from_data(topic, payload)
 
     print(event)
     print(f"{event.torqueData = }")
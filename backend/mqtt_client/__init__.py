@@ -21,8 +21,10 @@ from paho.mqtt.client import MQTTMessage
 from paho.mqtt.reasoncodes import ReasonCode
 from paho.mqtt.properties import Properties
 from paho.mqtt.enums import CallbackAPIVersion
-from threading import Thread
+from threading import Event, Thread
 from os import getenv
+from time import time
+from functools import partial
 from typing import Dict, List, Any
 from collections.abc import Callable
 import logging
@@ -31,6 +33,11 @@ from typing import Union
 
 from .sensor_event import SensorEvent
 from .aux_sensor_event import AuxSensorEvent
+from .ingest import IngestPipeline, ShardedIngestPipeline
+from .inflight import InFlightTable, InFlightEntry, is_incomplete
+from .sharing import SharedSubscription, SummaryReorderBuffer
+from .journal import Journal
+from .duplicates import DuplicateDetector
 
 
 class ThreadedMQTTClient(Thread):
@@ -39,12 +46,29 @@ class ThreadedMQTTClient(Thread):
     Executes callbacks when certain messages from certain topics are received. Topic should be in format of
     `sensors/<devEUI>/port/<portNumber>`.
 
+    By default messages are parsed and callbacks executed on the MQTT network thread. When `ingest_workers` is set, the
+    network thread only queues `(topic, payload, recv_time)` and a pool of worker threads does the parsing and callbacks.
+    With the `sharded` ingest mode (default) each device is pinned to one worker, keeping its packets in order (see
+    `ShardedIngestPipeline`). The `shared` mode uses a single queue (see `IngestPipeline`) and a single worker, since
+    several workers would handle packets of the same device concurrently.
+
+    Events being received are held in a bounded `InFlightTable`. Incomplete events of devices evicted from the table
+    (silent for too long or least recently seen above capacity) are passed to `on_abandoned_event`.
+
+    When a share group is set, several clients (processes) consume the sensor topics through an MQTT 5 shared
+    subscription, each one processing the devices it owns and forwarding the others (see `SharedSubscription`). Since
+    forwarded packets may be overtaken by packets received directly, event summaries are held for
+    `MQTT_SUMMARY_GRACE` seconds before being processed (see `SummaryReorderBuffer`).
+
+    When a journal directory is set, every message is appended to a `Journal` before being parsed, and the events that
+    were being received are rebuilt from it on startup.
+
     Raises:
         ValueError: When either username or password is not set.
     """
     mqtt_client: mqtt.Client = None
     dump_dir: str = "data"
-    sensor_events: Dict[str, SensorEvent] = {}
+    sensor_events: InFlightTable = None
 
     # Callbacks
     on_heartbeat_packet: Callable[[SensorEvent], None] = None
@@ -52,6 +76,7 @@ class ThreadedMQTTClient(Thread):
     on_event_summary_packet: Callable[[SensorEvent], None] = None
     on_complete_event: Callable[[SensorEvent], None] = None
     on_co2_packet: Callable[[AuxSensorEvent], None] = None #callback for CO2 sensor
+    on_abandoned_event: Callable[[Union[SensorEvent, AuxSensorEvent]], None] = None
 
     # Broker Information
     broker: str = getenv("MQTT_HOST", "mosquitto")
@@ -61,8 +86,26 @@ class ThreadedMQTTClient(Thread):
     username: str = getenv("MQTT_USERNAME", None)
     password: str = getenv("MQTT_PASSWORD", None)
 
+    # Ingest pipeline (0 workers processes messages on the network thread)
+    ingest_workers: int = int(getenv("MQTT_INGEST_WORKERS", 0))
+    ingest_queue_size: int = int(getenv("MQTT_INGEST_QUEUE_SIZE", 1024))
+    ingest_overflow: str = getenv("MQTT_INGEST_OVERFLOW", "block")
+    ingest_mode: str = getenv("MQTT_INGEST_MODE", "sharded")
+    ingest: IngestPipeline = None
+
+    # Shared subscription (None subscribes to every message)
+    sharing: SharedSubscription = None
+    reorder: SummaryReorderBuffer = None
+
+    # Ingest journal (empty disables it)
+    journal_dir: str = getenv("MQTT_JOURNAL_DIR", "")
+    journal: Journal = None
+
     def __init__(self, on_heartbeat_packet: Callable = None, on_data_packet: Callable = None, on_event_summary_packet: Callable = None, on_complete_event: Callable = None, 
-                 on_co2_packet: Callable = None):
+                 on_co2_packet: Callable = None, ingest_workers: int = None, ingest_queue_size: int = None,
+                 ingest_overflow: str = None, ingest_mode: str = None, on_abandoned_event: Callable = None,
+                 inflight_max_devices: int = None, inflight_ttl: float = None, share_group: str = None,
+                 consumer_index: int = None, consumer_count: int = None, journal_dir: str = None):
         """
         Initializes the object.
 
@@ -71,12 +114,37 @@ class ThreadedMQTTClient(Thread):
             on_data_packet (Callable, optional): Executes when receiving a message from port 13. Defaults to None.
             on_event_summary_packet (Callable, optional): Executes when receiving a message from port 14. Defaults to None.
             on_complete_event (Callable, optional): Deprecated.
+            on_co2_packet (Callable, optional): Executes when receiving a message from port 15. Defaults to None.
+            ingest_workers (int, optional): Number of ingest worker threads. Defaults to `MQTT_INGEST_WORKERS` or 0.
+            ingest_queue_size (int, optional): Maximum number of queued messages. Defaults to `MQTT_INGEST_QUEUE_SIZE`
+                or 1024.
+            ingest_overflow (str, optional): `block` or `drop_oldest`. Defaults to `MQTT_INGEST_OVERFLOW` or `block`.
+            ingest_mode (str, optional): `sharded` (one queue per worker, devices pinned to a worker) or `shared` (one
+                queue, at most one worker). Defaults to `MQTT_INGEST_MODE` or `sharded`.
+            on_abandoned_event (Callable, optional): Executes with the incomplete event of a device evicted from the
+                in-flight table. Defaults to None.
+            inflight_max_devices (int, optional): See `InFlightTable`. Defaults to `MQTT_INFLIGHT_MAX_DEVICES`.
+            inflight_ttl (float, optional): See `InFlightTable`. Defaults to `MQTT_INFLIGHT_TTL`.
+            share_group (str, optional): MQTT 5 shared subscription group. Defaults to `MQTT_SHARE_GROUP` or none.
+            consumer_index (int, optional): See `SharedSubscription`. Defaults to `MQTT_CONSUMER_INDEX` or 0.
+            consumer_count (int, optional): See `SharedSubscription`. Defaults to `MQTT_CONSUMER_COUNT` or 1.
+            journal_dir (str, optional): Directory of the ingest journal. Defaults to `MQTT_JOURNAL_DIR` or none.
+
+        Raises:
+            ValueError: When the ingest mode (or the `shared` mode with several workers) or the shared subscription
+                settings are not valid.
         """
         super().__init__(daemon=True)  # Kill when parent process exits
-        
+
+        # Shared subscriptions require MQTT 5
+        if share_group is None:
+            share_group = SharedSubscription.group
+        if share_group:
+            self.sharing = SharedSubscription(share_group, consumer_index, consumer_count)
+
         #Initialize MQTT client
-        self.mqtt_client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2)
-        self.sensor_events = {}
+        self.mqtt_client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2,
+                                       protocol=mqtt.MQTTv5 if self.sharing is not None else mqtt.MQTTv311)
 
         #Callbacks
         self.on_heartbeat_packet = on_heartbeat_packet
@@ -84,6 +152,91 @@ class ThreadedMQTTClient(Thread):
         self.on_event_summary_packet = on_event_summary_packet
         self.on_complete_event = on_complete_event
         self.on_co2_packet = on_co2_packet
+        self.on_abandoned_event = on_abandoned_event
+
+        # In-flight events
+        self.sensor_events = InFlightTable(inflight_max_devices, inflight_ttl, self._on_evict)
+
+        # Ingest pipeline
+        if ingest_workers is not None:
+            self.ingest_workers = ingest_workers
+        if ingest_queue_size is not None:
+            self.ingest_queue_size = ingest_queue_size
+        if ingest_overflow is not None:
+            self.ingest_overflow = ingest_overflow
+        if ingest_mode is not None:
+            self.ingest_mode = ingest_mode
+        if self.ingest_mode not in ("sharded", "shared"):
+            raise ValueError(f"Unrecognized ingest mode {self.ingest_mode}")
+        # Workers of a shared queue would parse packets of the same device into the same event concurrently
+        if self.ingest_mode == "shared" and self.ingest_workers > 1:
+            raise ValueError("The shared ingest mode supports a single worker, use the sharded mode for more")
+
+        # Ingest journal
+        if journal_dir is not None:
+            self.journal_dir = journal_dir
+        if self.journal_dir:
+            self.journal = Journal(self.journal_dir)
+
+    def ingest_stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Queue depth and worker stats (see `IngestPipeline.stats`), or None if messages are processed
+            on the network thread.
+        """
+        return self.ingest.stats() if self.ingest is not None else None
+
+    def inflight_stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Occupancy, memory and eviction stats of the in-flight table (see `InFlightTable.stats`).
+        """
+        return self.sensor_events.stats()
+
+    def journal_stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Journal stats (see `Journal.stats`), or None if the journal is disabled.
+        """
+        return self.journal.stats() if self.journal is not None else None
+
+    def recover(self) -> int:
+        """
+        Rebuilds the events being received from the journal. Messages are parsed without executing callbacks, since
+        completed events were already written. Afterwards, `on_data_packet` (or `on_heartbeat_packet` when no data
+        record was received) is executed once for every rebuilt event, so its database row is brought up to date.
+
+        Returns:
+            int: Number of events rebuilt.
+        """
+        if self.journal is None:
+            return 0
+
+        logging.info(f">> Replaying journal {self.journal_dir}")
+        userdata = {"sensor_events": self.sensor_events}
+        messages = 0
+        for recv_time, topic, payload in self.journal.replay():
+            try:
+                ThreadedMQTTClient._process_message(userdata, topic, payload, recv_time)
+            except Exception as e:
+                logging.warning(f"Could not replay message from topic {topic}: {e}")
+            messages += 1
+
+        rebuilt = [entry["current_event"] for _, entry in self.sensor_events.items()
+                   if isinstance(entry["current_event"], SensorEvent) and is_incomplete(entry["current_event"])]
+        for event in rebuilt:
+            callback = self.on_data_packet if event.packet_count else self.on_heartbeat_packet
+            if callback is not None:
+                callback(event)
+        logging.info(f">> Replayed {messages} messages, rebuilt {len(rebuilt)} events")
+        return len(rebuilt)
+
+    def _on_evict(self, devEUI: str, entry: InFlightEntry, reason: str):
+        if self.journal is not None:
+            self.journal.release(devEUI)
+        if self.on_abandoned_event is not None:
+            logging.info(f">> Executing on_abandoned_event for {devEUI}")
+            self.on_abandoned_event(entry["current_event"])
 
     def run(self):
         """
@@ -101,22 +254,19 @@ class ThreadedMQTTClient(Thread):
         # Add client callbacks and data
         self.mqtt_client.on_connect = ThreadedMQTTClient._on_connect
         self.mqtt_client.on_message = ThreadedMQTTClient._on_message
-        self.mqtt_client.user_data_set({
-            "topics": self.topics,
-            "sensor_events": self.sensor_events,
-            "on_heartbeat_packet": self.on_heartbeat_packet,
-            "on_data_packet": self.on_data_packet,
-            "on_event_summary_packet": self.on_event_summary_packet,
-            "on_complete_event": self.on_complete_event,
-            "on_co2_packet": self.on_co2_packet,
-        })
+        self.mqtt_client.user_data_set(self.prepare())
 
         # Set auth, connect, subscribe
         try:
             self.mqtt_client.username_pw_set(self.username, self.password)
             err = self.mqtt_client.connect(self.broker, self.broker_port)
             logging.debug(f">> MQTTErrorCode: {err}")
-            self.mqtt_client.subscribe(self.topics)
+            if self.sharing is not None:
+                logging.info(f">> Joining share group {self.sharing.group} as consumer {self.sharing.consumer_index} "
+                             f"of {self.sharing.consumer_count}")
+                self.mqtt_client.subscribe(self.sharing.subscriptions(self.topics))
+            else:
+                self.mqtt_client.subscribe(self.topics)
             logging.info(">> Subscribed and connected")
         except Exception as e:
             logging.error(f"Could not connect to MQTT broker {self.broker} with error: {e}")
@@ -129,6 +279,79 @@ class ThreadedMQTTClient(Thread):
         logging.info(f">> Looping forever!!!")
         self.mqtt_client.loop_forever()
 
+    def prepare(self) -> Dict[str, Any]:
+        """
+        Rebuilds events from the journal and starts the ingest workers. Executed by `run` before connecting.
+
+        Returns:
+            Dict[str, Any]: User data of the MQTT client (callbacks, sensor events, ingest pipeline...).
+        """
+        userdata = {
+            "topics": self.topics,
+            "sensor_events": self.sensor_events,
+            "on_heartbeat_packet": self.on_heartbeat_packet,
+            "on_data_packet": self.on_data_packet,
+            "on_event_summary_packet": self.on_event_summary_packet,
+            "on_complete_event": self.on_complete_event,
+            "on_co2_packet": self.on_co2_packet,
+            "sharing": self.sharing,
+            "journal": self.journal,
+        }
+
+        # Rebuild events from the journal before receiving new messages
+        if self.journal is not None:
+            self.recover()
+            self.journal.open()
+
+        # Start ingest workers
+        if self.ingest_workers > 0:
+            pipeline = ShardedIngestPipeline if self.ingest_mode == "sharded" else IngestPipeline
+            self.ingest = pipeline(partial(ThreadedMQTTClient._process_message, userdata),
+                                   self.ingest_workers, self.ingest_queue_size, self.ingest_overflow)
+            self.ingest.start()
+            userdata["ingest"] = self.ingest
+
+        # Hold event summaries while forwarded data records may still arrive
+        if self.sharing is not None and self.sharing.consumer_count > 1:
+            self.reorder = SummaryReorderBuffer(partial(ThreadedMQTTClient._dispatch, userdata))
+            self._reorder_stop = Event()
+            Thread(target=self._release_summaries, daemon=True).start()
+            userdata["reorder"] = self.reorder
+        return userdata
+
+    def _release_summaries(self):
+        while not self._reorder_stop.wait(self.reorder.grace / 2):
+            self.reorder.release_due()
+
+    def deliver(self, userdata: Dict[str, Any], topic: str, payload: bytes):
+        """
+        Handles a message as if it was received from the broker. Used to feed messages without a broker (simulation).
+
+        Args:
+            userdata (Dict[str, Any]): Returned by `prepare`.
+            topic (str): MQTT topic.
+            payload (bytes): Message payload.
+        """
+        msg = MQTTMessage(topic=topic.encode())
+        msg.payload = payload
+        ThreadedMQTTClient._on_message(self.mqtt_client, userdata, msg)
+
+    def stop(self, timeout: float = None):
+        """
+        Disconnects from the broker, which ends `run`, releases the held event summaries and drains the ingest workers.
+
+        Args:
+            timeout (float, optional): Maximum time to wait for each ingest worker in seconds. Defaults to None.
+        """
+        self.mqtt_client.disconnect()
+        if self.reorder is not None:
+            self._reorder_stop.set()
+            self.reorder.release_all()
+        if self.ingest is not None:
+            self.ingest.stop(timeout)
+        if self.journal is not None:
+            self.journal.close()
+
     @staticmethod
     def _on_connect(client: mqtt.Client, userdata: Any, flags: mqtt.ConnectFlags, reason_code: ReasonCode,
                     properties: Properties):
@@ -142,44 +365,83 @@ class ThreadedMQTTClient(Thread):
 
     @staticmethod
     def _on_message(client: mqtt.Client, userdata: Any, msg: MQTTMessage):
-        sensor_events: Dict[str, Dict[str, Union[SensorEvent, AuxSensorEvent]]] = userdata.get("sensor_events")
+        sharing: SharedSubscription | None = userdata.get("sharing")
+        reorder: SummaryReorderBuffer | None = userdata.get("reorder")
+        topic = msg.topic
+        recv_time = time()
+
+        # Forward messages of devices owned by another member of the share group
+        if sharing is not None:
+            topic, forward_topic = sharing.route(topic)
+            if forward_topic is not None:
+                client.publish(forward_topic, msg.payload, qos=2)
+                return
+
+        # Hold event summaries until late data records arrive
+        if reorder is not None:
+            reorder.push(topic, msg.payload, recv_time)
+        else:
+            ThreadedMQTTClient._dispatch(userdata, topic, msg.payload, recv_time)
+
+    @staticmethod
+    def _dispatch(userdata: Any, topic: str, payload: bytes, recv_time: float):
+        ingest: IngestPipeline | None = userdata.get("ingest")
+        journal: Journal | None = userdata.get("journal")
+
+        # Journal before parsing, in processing order so recovery rebuilds the same events
+        if journal is not None:
+            journal.append(recv_time, topic, payload)
+
+        # Hand off to the ingest workers if there are any
+        if ingest is not None:
+            ingest.submit(topic, payload, recv_time)
+        else:
+            ThreadedMQTTClient._process_message(userdata, topic, payload, recv_time)
+
+    @staticmethod
+    def _process_message(userdata: Any, topic: str, payload: bytes, recv_time: float):
+        """
+        Parses a message into the device's current event and executes the callbacks.
+
+        Args:
+            userdata (Any): User data of the MQTT client (callbacks and sensor events).
+            topic (str): MQTT topic.
+            payload (bytes): Message payload.
+            recv_time (float): Time the message was received.
+        """
+        sensor_events: InFlightTable = userdata.get("sensor_events")
         on_heartbeat_packet: Callable | None = userdata.get("on_heartbeat_packet")
         on_data_packet: Callable | None = userdata.get("on_data_packet")
         on_event_summary_packet: Callable | None = userdata.get("on_event_summary_packet")
         on_co2_packet: Callable | None = userdata.get("on_co2_packet")
 
-        payload: bytes = msg.payload
-        topic: str = msg.topic
-
         _, devEUI, _, port, *_ = topic.strip().split("/")
         logging.info(f">> RECEIVED MESSAGE ON PORT {port}")
 
         # Add a new sensor event if it doesn't exist or get the existing one. Start with an empty current event
-        if sensor_events.get(devEUI) is None:
-            sensor_events[devEUI] = {
-                "old_event": None,
-                "current_event": AuxSensorEvent() if port == "15" else SensorEvent()
-            }
+        event = sensor_events.touch(devEUI, lambda: {
+            "old_event": None,
+            "current_event": AuxSensorEvent() if port == "15" else SensorEvent(),
+            "duplicates": DuplicateDetector(),
+        })
         # Parse data for the current event
-        event = sensor_events[devEUI]
         event["current_event"].parse_from_data(topic, payload)
         # Execute callbacks
         if port == "12":
             logging.info(">> Executing on_heartbeat_packet")
-            event["current_event"] = AuxSensorEvent()
             on_heartbeat_packet(event["current_event"]) if on_heartbeat_packet is not None else None
-            event["current_event"] = AuxSensorEvent()
         elif port == "13":
+            event["duplicates"].data_packet(event["current_event"], payload)
             logging.info(">> Executing on_data_packet")
             on_data_packet(event["current_event"]) if on_data_packet is not None else None
         elif port == "14":
+            event["duplicates"].finalize(event["current_event"])
             logging.info(">> Executing on_event_summary_packet")
             on_event_summary_packet(event["current_event"], event["old_event"]) if on_event_summary_packet is not None else None
             event["old_event"] = event["current_event"]
-            del event["current_event"]
-            event["current_event"] = AuxSensorEvent()
+            event["current_event"] = SensorEvent()
+            event["duplicates"] = DuplicateDetector(event["old_event"])
         elif port == "15":
             logging.info(">> Executing on_co2_packet")
             on_co2_packet(event["current_event"]) if on_co2_packet is not None else None
-            del event["current_event"]
-            event["current_event"] = SensorEvent()
+            event["current_event"] = AuxSensorEvent()
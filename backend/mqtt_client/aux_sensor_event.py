@@ -14,9 +14,7 @@ Date:
 
 import logging
 from typing import List
-from struct import unpack   # See https://docs.python.org/3.11/library/struct.html#format-characters
-from .misc import cstr_to_str
-from .crc16 import CRC16_CCITT
+from .records import CO2_RECORD
 from datetime import datetime
 
 
@@ -77,16 +75,14 @@ class AuxSensorEvent:
             logging.warning("CO2 packet too short")
             return
         
-        base_str = data[3:8].decode("utf-8") 
+        base_str, scaling_factor, self.aux_sensor_id = CO2_RECORD.unpack_values(memoryview(data))
         if base_str == '\x00\x00\x00\x00\x00':
             base_str = "10"
         base_value = int(base_str)
 
-        scaling_factor = data[12]
         if scaling_factor == 0:
             scaling_factor=10
         self.co2_percentage = base_value * scaling_factor
-        self.aux_sensor_id = data[14:20].decode("utf-8")
         #self.co2_percentage =  data[3:8].decode("utf-8")
         #self.co2_percentage = self.co2_percentage * int(data[12])
             
@@ -0,0 +1,459 @@
+"""
+Message Capture Module
+
+This module provides an indexed capture format for recording the raw messages of the MQTT broker (field captures) and
+replaying them into the parser or a broker.
+
+A capture is a directory holding:
+- `topics.txt`: Topic table, one UTF-8 topic per `\n` terminated line (other line breaks are part of the topic). The
+  topic id is the line number (starting at 0).
+- `capture-<index>.seg`: Segment files, the payloads of the messages appended back to back.
+- `capture-<index>.idx`: Index of a segment, one `<timestamp: f64><topic id: u16><offset: u32><length: u32>` entry per
+  message, in the order received.
+
+Scanning a capture (time range, topics) only reads the index, payloads are read from the memory mapped segment of the
+entries that match. A new segment is started when the current one reaches `segment_size` bytes and every time a
+capture is opened for writing. A torn last entry (crash while writing) is ignored when reading.
+
+The previous dump format (one `<time>.<topic with / replaced by _>.data` file per message) can be read with
+`read_dump_files` and converted with `python -m mqtt_client.capture convert <dump folder> <capture directory>`.
+
+Example:
+    `python -m mqtt_client.capture info data/capture` (from the `backend` folder)
+    `python -m mqtt_client.capture replay data/capture --direct --speed 0`
+    `python -m mqtt_client.capture replay data/capture --broker localhost --speed 10`
+
+Date:
+    October 2026
+"""
+
+import argparse
+import logging
+import mmap
+from collections.abc import Callable
+from os import getenv, listdir, makedirs
+from os.path import getsize, isfile, join
+from struct import Struct
+from time import monotonic, sleep
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import re
+
+
+# (timestamp, topic, payload)
+CaptureRecord = Tuple[float, str, bytes]
+# (timestamp, topic id, offset, length)
+IndexEntry = Tuple[float, int, int, int]
+
+INDEX_ENTRY = Struct("<dHII")
+TOPICS_FILE = "topics.txt"
+SEGMENT_NAME = "capture-{:06d}.seg"
+INDEX_NAME = "capture-{:06d}.idx"
+SEGMENT_PATTERN = re.compile(r"capture-(\d{6})\.seg$")
+MAX_TOPICS = 1 << 16
+# Messages published to a broker before waiting for their acknowledgement
+PUBLISH_WINDOW = 1000
+
+
+def topic_from_filename(filename: str) -> Tuple[float, str]:
+    """
+    Args:
+        filename (str): Name of a file written by the previous dump format (`<time>.<sanitized topic>.data`).
+
+    Returns:
+        Tuple[float, str]: Time the message was received and its topic.
+    """
+    seconds, fraction, name, _ = filename.split(".")
+    return float(f"{seconds}.{fraction}"), "/".join(name.split("_"))
+
+
+def read_dump_files(folder: str) -> List[CaptureRecord]:
+    """
+    Reads a folder of the previous dump format.
+
+    Args:
+        folder (str): Folder of `.data` files.
+
+    Returns:
+        List[CaptureRecord]: Messages ordered by time.
+    """
+    records = []
+    for filename in listdir(folder):
+        path = join(folder, filename)
+        if not isfile(path) or not filename.endswith(".data"):
+            continue
+        timestamp, topic = topic_from_filename(filename)
+        with open(path, "rb") as f:
+            records.append((timestamp, topic, f.read()))
+    records.sort(key=lambda record: record[0])
+    return records
+
+
+def _round_trips(topic: str) -> bool:
+    """
+    Args:
+        topic (str): MQTT topic.
+
+    Returns:
+        bool: Whether `read_topics` reads the topic back from its line of the topic table.
+    """
+    try:
+        topic.encode("utf-8")
+    except UnicodeEncodeError:
+        return False
+    return "\n" not in topic
+
+
+class CaptureWriter:
+    """
+    Appends messages to a capture. Not thread-safe, meant to be used from the MQTT network thread.
+
+    Raises:
+        ValueError: When the segment size is not positive or above 4 GiB (offsets are 32 bits).
+    """
+    segment_size: int = int(getenv("CAPTURE_SEGMENT_SIZE", 64 * 1024 * 1024))
+    flush_interval: float = float(getenv("CAPTURE_FLUSH_INTERVAL", 1.0))
+
+    def __init__(self, directory: str, segment_size: int = None, flush_interval: float = None):
+        """
+        Initializes the object and starts a new segment.
+
+        Args:
+            directory (str): Capture directory. Created if missing, an existing capture is continued.
+            segment_size (int, optional): Size in bytes after which a new segment is started. Defaults to
+                `CAPTURE_SEGMENT_SIZE` or 64 MiB.
+            flush_interval (float, optional): Maximum time in seconds appended messages stay buffered in memory.
+                Defaults to `CAPTURE_FLUSH_INTERVAL` or 1.0.
+        """
+        if segment_size is not None:
+            self.segment_size = segment_size
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        if not 0 < self.segment_size <= 1 << 32:
+            raise ValueError("Segment size must be positive and at most 4 GiB")
+
+        self.directory = directory
+        makedirs(directory, exist_ok=True)
+
+        self.topic_ids: Dict[str, int] = {topic: i for i, topic in enumerate(read_topics(directory))}
+        self._topics_file = open(join(directory, TOPICS_FILE), "a", encoding="utf-8", newline="")
+        self._segment = max(segments(directory), default=-1)
+        self._segment_file = None
+        self._index_file = None
+        self._offset = 0
+        self._last_flush = monotonic()
+        self.messages = 0
+        self.bytes = 0
+        self._rotate()
+
+    def __enter__(self) -> "CaptureWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _topic_id(self, topic: str) -> int:
+        topic_id = self.topic_ids.get(topic)
+        if topic_id is None:
+            if len(self.topic_ids) >= MAX_TOPICS or not _round_trips(topic):
+                raise ValueError(f"Can not add topic {topic!r} to the capture")
+            topic_id = self.topic_ids[topic] = len(self.topic_ids)
+            # Written right away, index entries referring to it must never outlive it
+            self._topics_file.write(topic + "\n")
+            self._topics_file.flush()
+        return topic_id
+
+    def append(self, timestamp: float, topic: str, payload: bytes) -> None:
+        """
+        Appends a message.
+
+        Args:
+            timestamp (float): Time the message was received (`time.time()`).
+            topic (str): MQTT topic.
+            payload (bytes): Message payload.
+
+        Raises:
+            ValueError: When the topic can not be added to the topic table (it contains a `\n` or can not be encoded
+                to UTF-8, or the table is full). Nothing is written.
+        """
+        # Resolved first, a rejected topic must not leave its payload in the segment
+        topic_id = self._topic_id(topic)
+        if self._offset and self._offset + len(payload) > self.segment_size:
+            self._rotate()
+
+        self._segment_file.write(payload)
+        self._index_file.write(INDEX_ENTRY.pack(timestamp, topic_id, self._offset, len(payload)))
+        self._offset += len(payload)
+        self.messages += 1
+        self.bytes += len(payload)
+
+        now = monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self.flush()
+            self._last_flush = now
+
+    def flush(self) -> None:
+        """
+        Writes buffered messages to the segment and index files (payloads first, so an index entry never points past
+        the end of its segment).
+        """
+        self._segment_file.flush()
+        self._index_file.flush()
+
+    def _rotate(self) -> None:
+        self._close_segment()
+        self._segment += 1
+        self._segment_file = open(join(self.directory, SEGMENT_NAME.format(self._segment)), "wb")
+        self._index_file = open(join(self.directory, INDEX_NAME.format(self._segment)), "wb")
+        self._offset = 0
+        logging.debug(f"Started capture segment {self._segment}")
+
+    def _close_segment(self) -> None:
+        if self._segment_file is not None:
+            self.flush()
+            self._segment_file.close()
+            self._index_file.close()
+
+    def close(self) -> None:
+        """
+        Flushes and closes the capture.
+        """
+        self._close_segment()
+        self._segment_file = self._index_file = None
+        self._topics_file.close()
+
+
+def read_topics(directory: str) -> List[str]:
+    """
+    Args:
+        directory (str): Capture directory.
+
+    Returns:
+        List[str]: Topic table, indexed by topic id.
+    """
+    path = join(directory, TOPICS_FILE)
+    if not isfile(path):
+        return []
+    # Only `\n` ends a line, other line breaks are part of the topic
+    with open(path, encoding="utf-8", newline="") as f:
+        return f.read().split("\n")[:-1]
+
+
+def segments(directory: str) -> List[int]:
+    """
+    Args:
+        directory (str): Capture directory.
+
+    Returns:
+        List[int]: Indices of the segments of the capture, in order.
+    """
+    return sorted(int(match.group(1)) for match in map(SEGMENT_PATTERN.match, listdir(directory)) if match)
+
+
+class CaptureReader:
+    """
+    Reads a capture written by `CaptureWriter`.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initializes the object.
+
+        Args:
+            directory (str): Capture directory.
+        """
+        self.directory = directory
+        self.topics = read_topics(directory)
+        self.segments = segments(directory)
+
+    def index(self, segment: int) -> List[IndexEntry]:
+        """
+        Reads the index of a segment with a single read call. Entries that are torn or point past the end of the
+        segment (crash while writing) are dropped.
+
+        Args:
+            segment (int): Segment index.
+
+        Returns:
+            List[IndexEntry]: `(timestamp, topic id, offset, length)` of each message.
+        """
+        with open(join(self.directory, INDEX_NAME.format(segment)), "rb") as f:
+            data = f.read()
+        data = data[:len(data) - len(data) % INDEX_ENTRY.size]
+        segment_size = getsize(join(self.directory, SEGMENT_NAME.format(segment)))
+        topic_count = len(self.topics)
+
+        entries = list(INDEX_ENTRY.iter_unpack(data))
+        while entries and (entries[-1][2] + entries[-1][3] > segment_size or entries[-1][1] >= topic_count):
+            logging.warning(f"Capture segment {segment} has a torn index entry, ignoring it")
+            entries.pop()
+        return entries
+
+    def __len__(self) -> int:
+        return sum(getsize(join(self.directory, INDEX_NAME.format(segment))) // INDEX_ENTRY.size
+                   for segment in self.segments)
+
+    def __iter__(self) -> Iterator[CaptureRecord]:
+        return self.records()
+
+    def records(self, start: float = None, end: float = None, topics: Sequence[str] = None) \
+            -> Iterator[CaptureRecord]:
+        """
+        Reads the messages of the capture, in the order they were received.
+
+        Args:
+            start (float, optional): Only messages received at or after this time. Defaults to None.
+            end (float, optional): Only messages received before this time. Defaults to None.
+            topics (Sequence[str], optional): Only messages of these topics. Defaults to None (all topics).
+
+        Yields:
+            CaptureRecord: `(timestamp, topic, payload)` of each message.
+        """
+        if topics is not None:
+            topics = set(topics)
+        topic_ids = None if topics is None else {i for i, topic in enumerate(self.topics) if topic in topics}
+
+        for segment in self.segments:
+            entries = [entry for entry in self.index(segment)
+                       if (start is None or entry[0] >= start) and (end is None or entry[0] < end)
+                       and (topic_ids is None or entry[1] in topic_ids)]
+            if not entries:
+                continue
+
+            with open(join(self.directory, SEGMENT_NAME.format(segment)), "rb") as f:
+                if entries[-1][2] + entries[-1][3] == 0:
+                    # Only empty payloads, an empty file can not be memory mapped
+                    yield from ((entry[0], self.topics[entry[1]], b"") for entry in entries)
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    for timestamp, topic_id, offset, length in entries:
+                        yield timestamp, self.topics[topic_id], data[offset:offset + length]
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Returns:
+            Dict[str, object]: Number of messages, segments and topics, payload bytes, and first and last timestamps.
+        """
+        entries = [entry for segment in self.segments for entry in self.index(segment)]
+        return {
+            "messages": len(entries),
+            "segments": len(self.segments),
+            "topics": len(self.topics),
+            "bytes": sum(entry[3] for entry in entries),
+            "first": min((entry[0] for entry in entries), default=None),
+            "last": max((entry[0] for entry in entries), default=None),
+        }
+
+
+def replay(records: Iterable[CaptureRecord], publish: Callable[[str, bytes], None], speed: float = 1.0) -> int:
+    """
+    Streams messages to `publish`, keeping the time between them.
+
+    Args:
+        records (Iterable[CaptureRecord]): Messages ordered by time (e.g. a `CaptureReader`).
+        publish (Callable): Executed with `(topic, payload)` for every message.
+        speed (float, optional): Multiple of the original timing (2 replays twice as fast), 0 replays as fast as
+            possible. Defaults to 1.0.
+
+    Raises:
+        ValueError: When `speed` is negative.
+
+    Returns:
+        int: Number of messages replayed.
+    """
+    if speed < 0:
+        raise ValueError("Speed can not be negative")
+
+    count = 0
+    first: Optional[float] = None
+    start = monotonic()
+    for timestamp, topic, payload in records:
+        if speed > 0:
+            first = timestamp if first is None else first
+            delay = start + (timestamp - first) / speed - monotonic()
+            if delay > 0:
+                sleep(delay)
+        publish(topic, payload)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspects, converts and replays message captures")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    info = commands.add_parser("info", help="Show capture stats")
+    info.add_argument("directory")
+
+    convert = commands.add_parser("convert", help="Convert a folder of .data dump files to a capture")
+    convert.add_argument("folder")
+    convert.add_argument("directory")
+
+    replay_parser = commands.add_parser("replay", help="Stream a capture into the parser or a broker")
+    replay_parser.add_argument("directory")
+    target = replay_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--broker", help="Publish to this MQTT broker host (MQTT_USERNAME, MQTT_PASSWORD)")
+    target.add_argument("--direct", action="store_true", help="Parse with an in-process client, without a broker")
+    replay_parser.add_argument("--port", type=int, default=1883, help="MQTT broker port")
+    replay_parser.add_argument("--qos", type=int, default=2, choices=(0, 1, 2), help="Publish QoS")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="Multiple of the original timing, 0 for flat out")
+    replay_parser.add_argument("--start", type=float, help="Only messages received at or after this unix time")
+    replay_parser.add_argument("--end", type=float, help="Only messages received before this unix time")
+    replay_parser.add_argument("--topic", action="append", help="Only messages of this topic (repeatable)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, force=True)
+
+    if args.command == "info":
+        for key, value in CaptureReader(args.directory).stats().items():
+            print(f"{key:<10} {value}")
+        return
+
+    if args.command == "convert":
+        with CaptureWriter(args.directory) as writer:
+            for record in read_dump_files(args.folder):
+                writer.append(*record)
+        print(f"Converted {writer.messages} messages ({writer.bytes} bytes)")
+        return
+
+    records = CaptureReader(args.directory).records(args.start, args.end, args.topic)
+    if args.direct:
+        from mqtt_client import ThreadedMQTTClient
+        completed = []
+        client = ThreadedMQTTClient(on_event_summary_packet=lambda event, prev_event: completed.append(event),
+                                    on_co2_packet=completed.append)
+        userdata = client.prepare()
+        start = monotonic()
+        count = replay(records, lambda topic, payload: client.deliver(userdata, topic, payload), args.speed)
+        if client.ingest is not None:
+            client.ingest.stop()
+        elapsed = monotonic() - start
+        print(f"Replayed {count} messages in {elapsed:.3f} s, {len(completed)} events completed")
+    else:
+        import paho.mqtt.client as mqtt
+        publisher = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        publisher.username_pw_set(getenv("MQTT_USERNAME"), getenv("MQTT_PASSWORD"))
+        publisher.connect(args.broker, args.port)
+        publisher.loop_start()
+        sent = []
+
+        def publish(topic: str, payload: bytes):
+            # Waits for a window of messages at a time, instead of holding every message of the capture
+            sent.append(publisher.publish(topic, payload, qos=args.qos))
+            if len(sent) >= PUBLISH_WINDOW:
+                wait_published()
+
+        def wait_published():
+            for info in sent:
+                info.wait_for_publish()
+            sent.clear()
+
+        start = monotonic()
+        count = replay(records, publish, args.speed)
+        wait_published()
+        publisher.loop_stop()
+        publisher.disconnect()
+        print(f"Published {count} messages in {monotonic() - start:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,12 @@
 Standalone python file meant for debugging purposes. This program dumps the message payloads from the MQTT broker into
 files, requiring the `MQTT_USERNAME` and `MQTT_PASSWORD` to be set.
 
+By default messages are appended to an indexed capture (see `capture.py`), which can be replayed with
+`python -m mqtt_client.capture replay`. `--files` writes one `<time>.<topic>.data` file per message instead.
+
 Example:
-    `python dump_client.py`
+    `python -m mqtt_client.dump_client` (from the `backend` folder)
+    `python -m mqtt_client.dump_client --files`
 
 Authors:
     Aidan Queng (jaidanqueng@gmail.com), Texas A&M University
@@ -12,15 +16,16 @@ Date:
     November 2024
 """
 
-import json, re
+import argparse, re
 from typing import Any
 from time import time
-from os import getenv
+from os import getenv, makedirs
 import paho.mqtt.client as mqtt
 from paho.mqtt.client import Client, ConnectFlags, MQTTMessage
 from paho.mqtt.reasoncodes import ReasonCode
 from paho.mqtt.properties import Properties
 from paho.mqtt.enums import CallbackAPIVersion
+from .capture import CaptureWriter
 
 # Data Dump Directory
 DATA_DUMP_DIR = "data/"
@@ -35,8 +40,9 @@ MQTT_PASSWORD = getenv("MQTT_PASSWORD")
 # Initialize MQTT Client
 mqtt_client = Client(callback_api_version=CallbackAPIVersion.VERSION2)
 
-# This will hold the messages received from MQTT
-messages = []
+# Capture receiving the messages, None writes one file per message
+capture: CaptureWriter = None
+message_count = 0
 
 
 def sanitize_topic(topic):
@@ -55,16 +61,24 @@ def on_connect(client: Client, userdata: Any, flags: mqtt.ConnectFlags, reason_c
 
 
 def on_message(client: Client, userdata: Any, msg: MQTTMessage):
+    global message_count
     payload: bytes = msg.payload
     topic: str = msg.topic
 
     print(f"Received from topic {topic} with payload: {payload}")
-    messages.append(payload)  # Store received messages
+    message_count += 1
 
-    # Store msg in file
-    with open(f"{DATA_DUMP_DIR}{time()}.{sanitize_topic(topic)}.data", "wb") as f:
-        f.write(payload)
-    print(f"Stored message with topic: {topic}")
+    # Store msg in the capture or a file
+    if capture is not None:
+        try:
+            capture.append(time(), topic, payload)
+        except ValueError as e:
+            print(f"Skipped message #{message_count}: {e}")
+            return
+    else:
+        with open(f"{DATA_DUMP_DIR}{time()}.{sanitize_topic(topic)}.data", "wb") as f:
+            f.write(payload)
+    print(f"Stored message #{message_count} with topic: {topic}")
 
 
 # Connect to the MQTT broker
@@ -73,6 +87,22 @@ mqtt_client.on_message = on_message
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Dumps the messages of the MQTT broker")
+    parser.add_argument("--broker", default=MQTT_BROKER, help="MQTT broker host")
+    parser.add_argument("--port", type=int, default=MQTT_PORT, help="MQTT broker port")
+    parser.add_argument("--capture", default=f"{DATA_DUMP_DIR}capture", help="Capture directory")
+    parser.add_argument("--files", action="store_true", help=f"Write one file per message to {DATA_DUMP_DIR}")
+    args = parser.parse_args()
+
+    if args.files:
+        makedirs(DATA_DUMP_DIR, exist_ok=True)
+    else:
+        capture = CaptureWriter(args.capture)
+
     mqtt_client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
-    mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    mqtt_client.loop_forever()  # Start the MQTT client loop
+    mqtt_client.connect(args.broker, args.port, 60)
+    try:
+        mqtt_client.loop_forever()  # Start the MQTT client loop
+    finally:
+        if capture is not None:
+            capture.close()
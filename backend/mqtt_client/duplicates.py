@@ -0,0 +1,107 @@
+"""
+Duplicate Packet Module
+
+This module provides a `DuplicateDetector` marking the data records of an event that repeat the end of the previous
+event of the same device. These packets are hidden from the event data (`hiddenDataIndices`).
+
+The detector indexes the hashes of the last `tail_packets` packets of the previous event. Every data record is looked
+up in that index as it arrives (O(1)), so the hidden packets of a live event are kept up to date during ingest. A packet
+is only hidden while every packet after it is also a duplicate. On the event summary, `finalize` confirms the result by
+comparing the trailing packets of both events sample by sample, walking back from their last packets, which matches
+the previous `hide_duplicate_packets` postprocessing in O(number of duplicates).
+
+NOTE: The CRC of a data record covers its packet sequence number, so a packet can only duplicate the packet of the
+previous event with the same sequence number.
+
+Date:
+    October 2026
+"""
+
+from bisect import bisect_left, bisect_right
+from os import getenv
+from struct import unpack_from
+from typing import List, Set
+from .sensor_event import SensorEvent
+
+
+class DuplicateDetector:
+    """
+    Detects the packets of an event that duplicate the tail of the previous event of the device.
+    """
+    tail_packets: int = int(getenv("DUPLICATE_TAIL_PACKETS", 64))
+
+    __slots__ = ("previous_event", "_tail")
+
+    def __init__(self, previous_event: SensorEvent = None, tail_packets: int = None):
+        """
+        Initializes the object.
+
+        Args:
+            previous_event (SensorEvent, optional): Previous event of the device. Defaults to None (nothing is hidden).
+            tail_packets (int, optional): Number of trailing packets of the previous event indexed for live detection.
+                Defaults to `DUPLICATE_TAIL_PACKETS` or 64.
+        """
+        tail_packets = self.tail_packets if tail_packets is None else tail_packets
+        self.previous_event = previous_event
+
+        # Payload hashes of the previous event's tail
+        self._tail: Set[int] = set()
+        if previous_event is not None:
+            last = previous_event.packet_count
+            for packet_seq in range(max(1, last - tail_packets + 1), last + 1):
+                if previous_event.has_packet(packet_seq):
+                    self._tail.add(previous_event.packet_hash(packet_seq))
+
+    def data_packet(self, sensor_event: SensorEvent, data: bytes) -> bool:
+        """
+        Updates `sensor_event.hiddenDataIndices` after a data record was parsed into the event.
+
+        Args:
+            sensor_event (SensorEvent): Event the record was parsed into.
+            data (bytes): Data record.
+
+        Returns:
+            bool: Whether the packet matches a packet of the previous event's tail.
+        """
+        if len(data) < 2:
+            return False
+        packet_seq = unpack_from("<H", data)[0]
+        hidden: List[int] = sensor_event.hiddenDataIndices
+
+        if sensor_event.packet_hash(packet_seq) in self._tail:
+            index = bisect_left(hidden, packet_seq)
+            if index == len(hidden) or hidden[index] != packet_seq:
+                hidden.insert(index, packet_seq)
+            return True
+
+        # Packets before a packet that is not a duplicate are not part of the trailing duplicates
+        del hidden[:bisect_right(hidden, packet_seq)]
+        return False
+
+    def finalize(self, sensor_event: SensorEvent) -> List[int]:
+        """
+        Sets `sensor_event.hiddenDataIndices` to the trailing packets of the event that are identical (samples and CRC)
+        to the trailing packets of the previous event, aligned on their last packets.
+
+        Args:
+            sensor_event (SensorEvent): Completed event.
+
+        Returns:
+            List[int]: Packet sequence numbers to hide.
+        """
+        hidden: List[int] = []
+        previous_event = self.previous_event
+        if previous_event is not None:
+            packet_seq, previous_seq = sensor_event.packet_count, previous_event.packet_count
+            while packet_seq >= 1 and previous_seq >= 1:
+                crc = sensor_event.packet_crc(packet_seq)
+                if crc is None or crc != previous_event.packet_crc(previous_seq) or \
+                        sensor_event.packet_torque_data(packet_seq) != previous_event.packet_torque_data(previous_seq):
+                    break
+                hidden.append(packet_seq)
+                packet_seq -= 1
+                previous_seq -= 1
+            hidden.reverse()
+
+        sensor_event.hiddenDataIndices = hidden
+        return hidden
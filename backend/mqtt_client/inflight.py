@@ -0,0 +1,245 @@
+"""
+In-Flight Event Table Module
+
+This module provides an `InFlightTable` holding the events that are being received for each device (the current event
+and the previous one, used to detect duplicate packets). The table is bounded: devices that have been silent for longer
+than `ttl` seconds are evicted, and once `max_devices` is reached the least recently seen device is evicted. Incomplete
+events of evicted devices are handed to a callback, so they can be flushed to the database or marked as abandoned.
+
+Date:
+    October 2026
+"""
+
+from collections import OrderedDict
+from collections.abc import Callable
+from os import getenv
+from threading import RLock
+from time import monotonic
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import sys
+
+
+# Entry of a device: {"old_event": ..., "current_event": ...}
+InFlightEntry = Dict[str, Any]
+
+
+def event_memory_usage(event: Any) -> int:
+    """
+    Args:
+        event (Any): `SensorEvent`, `AuxSensorEvent` or None.
+
+    Returns:
+        int: Approximate number of bytes held by the event.
+    """
+    if event is None:
+        return 0
+    memory_usage = getattr(event, "memory_usage", None)
+    return memory_usage() if memory_usage is not None else sys.getsizeof(event)
+
+
+def is_incomplete(event: Any) -> bool:
+    """
+    Args:
+        event (Any): `SensorEvent`, `AuxSensorEvent` or None.
+
+    Returns:
+        bool: Whether at least one packet was parsed into the event. Events are replaced once completed, so an event
+        holding data is still being received.
+    """
+    return event is not None and event.devEUI is not None
+
+
+class InFlightTable:
+    """
+    Thread-safe, bounded mapping of devEUI to in-flight entries with idle TTL and LRU eviction.
+    """
+    max_devices: int = int(getenv("MQTT_INFLIGHT_MAX_DEVICES", 10000))
+    ttl: float = float(getenv("MQTT_INFLIGHT_TTL", 3600))
+
+    def __init__(self, max_devices: int = None, ttl: float = None,
+                 on_evict: Callable[[str, InFlightEntry, str], None] = None):
+        """
+        Initializes the object.
+
+        Args:
+            max_devices (int, optional): Maximum number of devices held. Defaults to `MQTT_INFLIGHT_MAX_DEVICES` or
+                10000.
+            ttl (float, optional): Seconds without packets after which a device is evicted. 0 disables idle eviction.
+                Defaults to `MQTT_INFLIGHT_TTL` or 3600.
+            on_evict (Callable, optional): Executed with `(devEUI, entry, reason)` after a device holding an incomplete
+                event is evicted. `reason` is `idle` or `capacity`. Defaults to None.
+
+        Raises:
+            ValueError: When `max_devices` is not positive or `ttl` is negative.
+        """
+        if max_devices is not None:
+            self.max_devices = max_devices
+        if ttl is not None:
+            self.ttl = ttl
+        if self.max_devices <= 0:
+            raise ValueError("Maximum number of devices must be positive")
+        if self.ttl < 0:
+            raise ValueError("TTL can not be negative")
+
+        self.on_evict = on_evict
+        self._entries: OrderedDict[str, Tuple[InFlightEntry, float]] = OrderedDict()     # Least recently seen first
+        self._lock = RLock()
+        self._last_sweep = monotonic()
+
+        # Stats
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+        self.abandoned = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, devEUI: str) -> bool:
+        return devEUI in self._entries
+
+    def __getitem__(self, devEUI: str) -> InFlightEntry:
+        with self._lock:
+            return self._entries[devEUI][0]
+
+    def get(self, devEUI: str, default: Any = None) -> Optional[InFlightEntry]:
+        """
+        Returns the entry of a device without marking it as seen.
+
+        Args:
+            devEUI (str): Device.
+            default (Any, optional): Returned when the device is not held. Defaults to None.
+
+        Returns:
+            InFlightEntry | None: Entry of the device.
+        """
+        with self._lock:
+            item = self._entries.get(devEUI)
+            return item[0] if item is not None else default
+
+    def items(self) -> List[Tuple[str, InFlightEntry]]:
+        """
+        Returns:
+            List[Tuple[str, InFlightEntry]]: Snapshot of the devices and their entries, least recently seen first.
+        """
+        with self._lock:
+            return [(devEUI, entry) for devEUI, (entry, _) in self._entries.items()]
+
+    def pop(self, devEUI: str, default: Any = None) -> Optional[InFlightEntry]:
+        """
+        Removes a device without executing the eviction callback.
+
+        Args:
+            devEUI (str): Device.
+            default (Any, optional): Returned when the device is not held. Defaults to None.
+
+        Returns:
+            InFlightEntry | None: Entry of the device.
+        """
+        with self._lock:
+            item = self._entries.pop(devEUI, None)
+            return item[0] if item is not None else default
+
+    def touch(self, devEUI: str, create: Callable[[], InFlightEntry], now: float = None) -> InFlightEntry:
+        """
+        Returns the entry of a device, creating it if needed, and marks the device as seen. Evicts idle devices (at
+        most every `ttl / 10` seconds) and the least recently seen devices above `max_devices`.
+
+        Args:
+            devEUI (str): Device.
+            create (Callable): Returns a new entry for a device that is not held.
+            now (float, optional): Current `time.monotonic()`. Defaults to now.
+
+        Returns:
+            InFlightEntry: Entry of the device.
+        """
+        now = monotonic() if now is None else now
+        evicted = []
+
+        with self._lock:
+            item = self._entries.pop(devEUI, None)
+            entry = item[0] if item is not None else create()
+            self._entries[devEUI] = (entry, now)
+
+            if self.ttl and now - self._last_sweep >= self.ttl / 10:
+                evicted += self._evict_idle(now)
+            while len(self._entries) > self.max_devices:
+                evicted_devEUI, (evicted_entry, _) = self._entries.popitem(last=False)
+                self.evicted_capacity += 1
+                evicted.append((evicted_devEUI, evicted_entry, "capacity"))
+
+        self._evicted(evicted)
+        return entry
+
+    def evict_idle(self, now: float = None) -> int:
+        """
+        Evicts devices that have been silent for longer than `ttl` seconds.
+
+        Args:
+            now (float, optional): Current `time.monotonic()`. Defaults to now.
+
+        Returns:
+            int: Number of devices evicted.
+        """
+        now = monotonic() if now is None else now
+        with self._lock:
+            evicted = self._evict_idle(now)
+        self._evicted(evicted)
+        return len(evicted)
+
+    def _evict_idle(self, now: float) -> List[Tuple[str, InFlightEntry, str]]:
+        self._last_sweep = now
+        evicted = []
+        if not self.ttl:
+            return evicted
+
+        # Entries are ordered by last seen time, stop at the first one that is not idle
+        while self._entries:
+            devEUI, (entry, last_seen) = next(iter(self._entries.items()))
+            if now - last_seen < self.ttl:
+                break
+            del self._entries[devEUI]
+            self.evicted_idle += 1
+            evicted.append((devEUI, entry, "idle"))
+        return evicted
+
+    def _evicted(self, evicted: List[Tuple[str, InFlightEntry, str]]) -> None:
+        # Executed outside the lock, the callback may write to the database
+        for devEUI, entry, reason in evicted:
+            if not is_incomplete(entry.get("current_event")):
+                logging.debug(f"Evicted {devEUI} from in-flight table ({reason})")
+                continue
+
+            self.abandoned += 1
+            logging.warning(f"Evicted {devEUI} from in-flight table ({reason}) with an incomplete event")
+            if self.on_evict is not None:
+                try:
+                    self.on_evict(devEUI, entry, reason)
+                except Exception as e:
+                    logging.exception(f"Could not handle evicted event of {devEUI}: {e}")
+
+    def memory_usage(self) -> int:
+        """
+        Returns:
+            int: Approximate number of bytes held by the events in the table.
+        """
+        with self._lock:
+            entries = [entry for entry, _ in self._entries.values()]
+        return sum(event_memory_usage(entry.get(key)) for entry in entries for key in ("old_event", "current_event"))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Number of devices held, capacity, occupancy (0 to 1), approximate memory held by events
+            (bytes), devices evicted for being idle or over capacity, and incomplete events abandoned by eviction.
+        """
+        devices = len(self._entries)
+        return {
+            "devices": devices,
+            "max_devices": self.max_devices,
+            "occupancy": devices / self.max_devices,
+            "memory": self.memory_usage(),
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity,
+            "abandoned": self.abandoned,
+        }
@@ -0,0 +1,317 @@
+"""
+Ingest Pipeline Module
+
+This module provides a bounded work queue and a pool of worker threads, so that the MQTT network thread only has to
+enqueue `(topic, payload, recv_time)` while parsing and database writes happen elsewhere. A slow database commit then
+fills the queue instead of stalling every MQTT message (and the QoS 2 handshakes) behind it.
+
+`ShardedIngestPipeline` gives every worker its own queue and routes each device to a fixed worker, so that the packets
+of a device are handled strictly in order while different devices are handled in parallel.
+
+Date:
+    October 2026
+"""
+
+from collections import deque
+from collections.abc import Callable
+from threading import Condition, Lock, Thread
+from time import time
+from typing import Any, Dict, List, Tuple
+from zlib import crc32
+import logging
+
+
+# Overflow policies
+OVERFLOW_BLOCK = "block"                # Block the producer until there is room (backpressure to the broker)
+OVERFLOW_DROP_OLDEST = "drop_oldest"    # Discard the oldest queued message to make room
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST)
+
+# Queued message: (topic, payload, recv_time)
+IngestItem = Tuple[str, bytes, float]
+
+
+class IngestQueue:
+    """
+    Bounded, thread-safe FIFO queue with a configurable overflow policy.
+
+    Raises:
+        ValueError: When the overflow policy is not recognized or the size is not positive.
+    """
+
+    def __init__(self, maxsize: int = 1024, overflow: str = OVERFLOW_BLOCK):
+        """
+        Initializes the object.
+
+        Args:
+            maxsize (int, optional): Maximum number of queued items. Defaults to 1024.
+            overflow (str, optional): `block` or `drop_oldest`. Defaults to `block`.
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unrecognized overflow policy {overflow}. Expected one of {OVERFLOW_POLICIES}")
+        if maxsize <= 0:
+            raise ValueError("Queue size must be positive")
+
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self._items: deque = deque()
+        self._cond = Condition(Lock())
+        self._closed = False
+
+        # Stats
+        self.enqueued = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, item: Any) -> bool:
+        """
+        Adds an item to the queue, applying the overflow policy when full.
+
+        Args:
+            item (Any): Item to add.
+
+        Returns:
+            bool: False if the queue is closed and the item was discarded.
+        """
+        with self._cond:
+            while len(self._items) >= self.maxsize and not self._closed:
+                if self.overflow == OVERFLOW_DROP_OLDEST:
+                    self._items.popleft()
+                    self.dropped += 1
+                else:
+                    self._cond.wait()
+
+            if self._closed:
+                return False
+
+            self._items.append(item)
+            self.enqueued += 1
+            self.high_water = max(self.high_water, len(self._items))
+            self._cond.notify_all()
+            return True
+
+    def get(self) -> Any:
+        """
+        Removes and returns the oldest item, blocking while the queue is empty.
+
+        Returns:
+            Any: The item, or None once the queue is closed and drained.
+        """
+        with self._cond:
+            while not self._items and not self._closed:
+                self._cond.wait()
+
+            if not self._items:
+                return None
+
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self) -> None:
+        """
+        Stops accepting items and wakes up every waiting thread. Items already queued can still be retrieved.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Current depth, capacity, high water mark, enqueued and dropped counts.
+        """
+        with self._cond:
+            return {
+                "depth": len(self._items),
+                "maxsize": self.maxsize,
+                "high_water": self.high_water,
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+            }
+
+
+class IngestPipeline:
+    """
+    Pool of worker threads consuming a single `IngestQueue`. Every item is passed to `handler(topic, payload,
+    recv_time)`. Exceptions raised by the handler are logged and do not stop the worker.
+
+    NOTE: Workers share one queue, so messages of a single device are only handled in order (and one at a time) with a
+    single worker. `ThreadedMQTTClient` refuses more than one, `ShardedIngestPipeline` keeps devices on one worker.
+    """
+
+    def __init__(self, handler: Callable[[str, bytes, float], None], workers: int = 1, maxsize: int = 1024,
+                 overflow: str = OVERFLOW_BLOCK):
+        """
+        Initializes the object.
+
+        Args:
+            handler (Callable): Executed by the workers for every message.
+            workers (int, optional): Number of worker threads. Defaults to 1.
+            maxsize (int, optional): See `IngestQueue`. Defaults to 1024.
+            overflow (str, optional): See `IngestQueue`. Defaults to `block`.
+        """
+        if workers <= 0:
+            raise ValueError("Number of workers must be positive")
+
+        self.handler = handler
+        self.queues: List[IngestQueue] = self._create_queues(workers, maxsize, overflow)
+        self._threads: List[Thread] = [
+            Thread(target=self._work, args=(self.queues[i % len(self.queues)],), name=f"ingest-worker-{i}",
+                   daemon=True)
+            for i in range(workers)
+        ]
+
+        # Stats
+        self._stats_lock = Lock()
+        self.processed = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def _create_queues(self, workers: int, maxsize: int, overflow: str) -> List[IngestQueue]:
+        return [IngestQueue(maxsize, overflow)]
+
+    @property
+    def queue(self) -> IngestQueue:
+        """
+        Returns:
+            IngestQueue: The first (for `IngestPipeline`, the only) queue.
+        """
+        return self.queues[0]
+
+    def start(self) -> None:
+        """
+        Starts the worker threads.
+        """
+        logging.info(f">> Starting {len(self._threads)} ingest worker(s)")
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Stops accepting messages and waits for the workers to drain the queue.
+
+        Args:
+            timeout (float, optional): Maximum time to wait for each worker in seconds. Defaults to None (forever).
+        """
+        for queue in self.queues:
+            queue.close()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(self, topic: str, payload: bytes, recv_time: float = None) -> bool:
+        """
+        Queues a message. Meant to be called from the MQTT network thread.
+
+        Args:
+            topic (str): MQTT topic.
+            payload (bytes): Message payload.
+            recv_time (float, optional): Time the message was received. Defaults to now.
+
+        Returns:
+            bool: False if the pipeline is stopped and the message was discarded.
+        """
+        return self.queue.put((topic, payload, time() if recv_time is None else recv_time))
+
+    def _work(self, queue: IngestQueue) -> None:
+        while True:
+            item: IngestItem = queue.get()
+            if item is None:
+                return
+
+            topic, payload, recv_time = item
+            try:
+                self.handler(topic, payload, recv_time)
+            except Exception as e:
+                logging.exception(f"Could not process message from topic {topic}: {e}")
+                error = True
+            else:
+                error = False
+            self._record(recv_time, error)
+
+    def _record(self, recv_time: float, error: bool) -> None:
+        latency = time() - recv_time
+        with self._stats_lock:
+            self.processed += 1
+            self.errors += error
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Queue stats (see `IngestQueue.stats`), plus workers, processed and error counts, and the
+            average and maximum time between receiving a message and finishing its processing (seconds).
+        """
+        stats = self.queue.stats()
+        with self._stats_lock:
+            stats.update({
+                "workers": len(self._threads),
+                "processed": self.processed,
+                "errors": self.errors,
+                "avg_latency": self.total_latency / self.processed if self.processed else 0.0,
+                "max_latency": self.max_latency,
+            })
+        return stats
+
+
+def device_from_topic(topic: str) -> str:
+    """
+    Args:
+        topic (str): MQTT topic in the format `sensors/<devEUI>/port/<port>`.
+
+    Returns:
+        str: The devEUI part of the topic.
+    """
+    return topic.split("/", 2)[1]
+
+
+class ShardedIngestPipeline(IngestPipeline):
+    """
+    Ingest pipeline with one queue per worker. The devEUI of each topic (`sensors/<devEUI>/port/<port>`) is hashed to a
+    fixed worker, so all packets of a device are handled in the order they were received, by a single thread, while
+    different devices are handled in parallel.
+
+    NOTE: Shards are threads, database I/O and the C parts of parsing release the GIL, the rest of the parsing does not.
+    """
+
+    def _create_queues(self, workers: int, maxsize: int, overflow: str) -> List[IngestQueue]:
+        # Capacity is per shard
+        return [IngestQueue(maxsize, overflow) for _ in range(workers)]
+
+    def shard_for(self, topic: str) -> int:
+        """
+        Returns the index of the worker responsible for the device publishing on `topic`. The hash is stable across
+        processes and restarts.
+
+        Args:
+            topic (str): MQTT topic.
+
+        Returns:
+            int: Shard index.
+        """
+        return crc32(device_from_topic(topic).encode()) % len(self.queues)
+
+    def submit(self, topic: str, payload: bytes, recv_time: float = None) -> bool:
+        return self.queues[self.shard_for(topic)].put((topic, payload, time() if recv_time is None else recv_time))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Same as `IngestPipeline.stats`, with queue stats summed over all shards, plus `shards`
+            (stats of each shard queue) and `imbalance` (messages enqueued on the busiest shard divided by the mean, 1.0
+            is perfectly balanced).
+        """
+        stats = super().stats()
+        shards = [queue.stats() for queue in self.queues]
+        for key in ("depth", "maxsize", "enqueued", "dropped"):
+            stats[key] = sum(shard[key] for shard in shards)
+        stats["high_water"] = max(shard["high_water"] for shard in shards)
+
+        mean = stats["enqueued"] / len(shards)
+        stats["imbalance"] = max(shard["enqueued"] for shard in shards) / mean if mean else 1.0
+        stats["shards"] = shards
+        return stats
@@ -0,0 +1,301 @@
+"""
+Ingest Journal Module
+
+This module provides an append-only journal of the raw messages received by the MQTT client. Every message is appended
+as `(recv_time, topic, payload)` before it is parsed, so the events being received survive a crash of the backend and
+are rebuilt on startup by replaying the journal.
+
+The journal is split in segment files (`journal-<index>.log`), a new segment is started when the current one reaches
+`segment_size` bytes and on every startup. Appends are buffered and flushed to disk (`fsync`) at most every
+`fsync_interval` seconds by a background thread, so a burst of messages shares a single `fsync` (group commit).
+
+Each record is `<length: u32><crc32: u32><recv_time: f64><topic length: u16><topic><payload>`, `length` and `crc32`
+covering everything after them. Replay stops at the first truncated or corrupted record of a segment (torn write).
+
+Segments are deleted once no device has an open event in them. An event is open from the first message of a device
+until its event summary (port 14) or CO2 (port 15) message.
+
+Date:
+    October 2026
+"""
+
+from os import fsync, getenv, listdir, makedirs, remove
+from os.path import join
+from struct import Struct
+from threading import Event, Lock, Thread
+from typing import Any, Dict, Iterator, List, Tuple
+from zlib import crc32
+import logging
+import re
+
+
+# (recv_time, topic, payload)
+JournalRecord = Tuple[float, str, bytes]
+
+RECORD_PREFIX = Struct("<II")       # length, crc32
+RECORD_HEADER = Struct("<dH")       # recv_time, topic length
+SEGMENT_NAME = "journal-{:012d}.log"
+SEGMENT_PATTERN = re.compile(r"journal-(\d{12})\.log$")
+
+# Ports closing the event of a device
+CLOSING_PORTS = ("14", "15")
+
+
+def encode_record(recv_time: float, topic: str, payload: bytes) -> bytes:
+    """
+    Args:
+        recv_time (float): Time the message was received.
+        topic (str): MQTT topic.
+        payload (bytes): Message payload.
+
+    Returns:
+        bytes: Journal record.
+    """
+    topic_bytes = topic.encode()
+    body = RECORD_HEADER.pack(recv_time, len(topic_bytes)) + topic_bytes + payload
+    return RECORD_PREFIX.pack(len(body), crc32(body)) + body
+
+
+def decode_records(data: bytes) -> Iterator[JournalRecord]:
+    """
+    Decodes the records of a segment. Stops at the first truncated or corrupted record.
+
+    Args:
+        data (bytes): Content of a segment.
+
+    Yields:
+        JournalRecord: `(recv_time, topic, payload)` of each record.
+    """
+    view = memoryview(data)
+    offset, end = 0, len(data)
+    prefix_size, header_size = RECORD_PREFIX.size, RECORD_HEADER.size
+
+    while offset + prefix_size <= end:
+        length, checksum = RECORD_PREFIX.unpack_from(view, offset)
+        body_start = offset + prefix_size
+        body_end = body_start + length
+        if length < header_size or body_end > end or crc32(view[body_start:body_end]) != checksum:
+            logging.warning(f"Journal segment truncated or corrupted at offset {offset}, skipping the rest")
+            return
+
+        recv_time, topic_length = RECORD_HEADER.unpack_from(view, body_start)
+        topic_end = body_start + header_size + topic_length
+        yield recv_time, bytes(view[body_start + header_size:topic_end]).decode(), bytes(view[topic_end:body_end])
+        offset = body_end
+
+
+class Journal:
+    """
+    Thread-safe, segment-rotated, append-only journal of received messages.
+
+    Raises:
+        ValueError: When the segment size is not positive or the fsync interval is negative.
+    """
+    segment_size: int = int(getenv("MQTT_JOURNAL_SEGMENT_SIZE", 16 * 1024 * 1024))
+    fsync_interval: float = float(getenv("MQTT_JOURNAL_FSYNC_INTERVAL", 0.01))
+
+    def __init__(self, directory: str, segment_size: int = None, fsync_interval: float = None):
+        """
+        Initializes the object. Nothing is written until `open` is called.
+
+        Args:
+            directory (str): Directory holding the segments. Created if missing.
+            segment_size (int, optional): Size in bytes after which a new segment is started. Defaults to
+                `MQTT_JOURNAL_SEGMENT_SIZE` or 16 MiB.
+            fsync_interval (float, optional): Maximum time in seconds between an append and its `fsync`. 0 syncs every
+                append. Defaults to `MQTT_JOURNAL_FSYNC_INTERVAL` or 0.01.
+        """
+        if segment_size is not None:
+            self.segment_size = segment_size
+        if fsync_interval is not None:
+            self.fsync_interval = fsync_interval
+        if self.segment_size <= 0:
+            raise ValueError("Segment size must be positive")
+        if self.fsync_interval < 0:
+            raise ValueError("Fsync interval can not be negative")
+
+        self.directory = directory
+        makedirs(directory, exist_ok=True)
+
+        self._lock = Lock()
+        self._file = None
+        self._segment = -1
+        self._segment_bytes = 0
+        self._dirty = False
+        self._open_segments: Dict[str, int] = {}    # devEUI -> segment of the first message of its open event
+        self._stopped = Event()
+        self._thread: Thread = None
+
+        # Stats
+        self.records = 0
+        self.bytes = 0
+        self.fsyncs = 0
+        self.deleted_segments = 0
+
+    def segments(self) -> List[int]:
+        """
+        Returns:
+            List[int]: Indices of the segments on disk, in order.
+        """
+        return sorted(int(match.group(1)) for match in map(SEGMENT_PATTERN.match, listdir(self.directory)) if match)
+
+    def _path(self, segment: int) -> str:
+        return join(self.directory, SEGMENT_NAME.format(segment))
+
+    def replay(self) -> Iterator[JournalRecord]:
+        """
+        Reads every record on disk, oldest first. Each segment is read with a single read call. Also restores which
+        segments hold open events, so they are kept until those events are closed.
+
+        Yields:
+            JournalRecord: `(recv_time, topic, payload)` of each record.
+        """
+        for segment in self.segments():
+            with open(self._path(segment), "rb") as f:
+                data = f.read()
+            for record in decode_records(data):
+                self._track(segment, record[1])
+                yield record
+            self._segment = max(self._segment, segment)
+
+    def open(self) -> None:
+        """
+        Starts a new segment and the background fsync thread.
+        """
+        with self._lock:
+            # Never append to an existing segment, its last record may be torn
+            self._segment = max([self._segment, *self.segments()])
+            self._rotate()
+        if self.fsync_interval > 0 and self._thread is None:
+            self._stopped.clear()
+            self._thread = Thread(target=self._run, name="journal-fsync", daemon=True)
+            self._thread.start()
+
+    def close(self) -> None:
+        """
+        Stops the fsync thread, syncs and closes the current segment.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+    def append(self, recv_time: float, topic: str, payload: bytes) -> int:
+        """
+        Appends a message. The record is on disk at most `fsync_interval` seconds later.
+
+        Args:
+            recv_time (float): Time the message was received.
+            topic (str): MQTT topic.
+            payload (bytes): Message payload.
+
+        Raises:
+            RuntimeError: When the journal is not open.
+
+        Returns:
+            int: Index of the segment the record was written to.
+        """
+        record = encode_record(recv_time, topic, payload)
+        with self._lock:
+            if self._file is None:
+                raise RuntimeError("Journal is not open")
+            if self._segment_bytes and self._segment_bytes + len(record) > self.segment_size:
+                self._rotate()
+
+            self._file.write(record)
+            self._segment_bytes += len(record)
+            self._dirty = True
+            self.records += 1
+            self.bytes += len(record)
+            self._track(self._segment, topic)
+
+            if self.fsync_interval == 0:
+                self._sync()
+            return self._segment
+
+    def _track(self, segment: int, topic: str) -> None:
+        parts = topic.split("/")
+        if len(parts) < 4:
+            return
+        devEUI, port = parts[1], parts[3]
+        if port in CLOSING_PORTS:
+            self._open_segments.pop(devEUI, None)
+        else:
+            self._open_segments.setdefault(devEUI, segment)
+
+    def release(self, devEUI: str) -> None:
+        """
+        Marks the open event of a device as no longer needed for recovery (e.g. abandoned).
+
+        Args:
+            devEUI (str): Device.
+        """
+        with self._lock:
+            self._open_segments.pop(devEUI, None)
+
+    def sync(self) -> None:
+        """
+        Flushes buffered records to disk now.
+        """
+        with self._lock:
+            self._sync()
+
+    def _sync(self) -> None:
+        if self._dirty and self._file is not None:
+            self._file.flush()
+            fsync(self._file.fileno())
+            self._dirty = False
+            self.fsyncs += 1
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.fsync_interval):
+            try:
+                self.sync()
+            except OSError as e:
+                logging.exception(f"Could not sync journal: {e}")
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+
+        self._segment += 1
+        self._file = open(self._path(self._segment), "ab")
+        self._segment_bytes = 0
+        logging.debug(f"Started journal segment {self._segment}")
+        self._delete_released()
+
+    def _delete_released(self) -> None:
+        # Segments before the oldest open event (and before the current segment) are no longer needed
+        low_water = min(self._open_segments.values(), default=self._segment)
+        low_water = min(low_water, self._segment)
+        for segment in self.segments():
+            if segment >= low_water:
+                break
+            try:
+                remove(self._path(segment))
+                self.deleted_segments += 1
+            except OSError as e:
+                logging.warning(f"Could not delete journal segment {segment}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Records and bytes appended, fsync calls, current segment, segments on disk and deleted,
+            and devices with an open event.
+        """
+        with self._lock:
+            return {
+                "records": self.records,
+                "bytes": self.bytes,
+                "fsyncs": self.fsyncs,
+                "segment": self._segment,
+                "segments": len(self.segments()),
+                "deleted_segments": self.deleted_segments,
+                "open_devices": len(self._open_segments),
+            }
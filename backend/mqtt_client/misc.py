@@ -33,3 +33,17 @@ def cstr_to_str(data: Iterable[bytes]) -> str:
         result += b.decode()
 
     return result
+
+
+def cstr_from_bytes(data: bytes) -> str:
+    """
+    Converts a c-style string stored in a fixed size buffer to a python string
+
+    Args:
+        data (bytes): Buffer containing the c-style string, padded with null bytes
+
+    Returns:
+        str: python string, up to the first null byte
+    """
+    end = data.find(b"\x00")
+    return (data if end < 0 else data[:end]).decode()
@@ -0,0 +1,201 @@
+"""
+Record Layout Module
+
+This module provides a declarative description of the fixed size packet records sent by the firmware. Each layout is
+compiled into a single `struct.Struct`, so a whole record is decoded with one `unpack_from` call instead of one
+`unpack` call per field. See [this repository](<https://github.com/Trans-Opt/Bray-LoRa-Firmware>) for detailed packet
+breakdown.
+
+Date:
+    October 2026
+"""
+
+from struct import Struct   # See https://docs.python.org/3.11/library/struct.html#format-characters
+from collections.abc import Callable
+from typing import Any, Dict, List, NamedTuple, Optional
+from .misc import cstr_from_bytes
+
+
+class RecordField(NamedTuple):
+    """
+    Single field of a record.
+
+    Attributes:
+        name (str | None): Attribute name the value is stored under. `None` for padding (`x`) fields.
+        fmt (str): `struct` format of the field, without byte order.
+        convert (Callable | None): Applied to the raw value after decoding. Strings (`s`) default to `cstr_from_bytes`.
+        encode (Callable | None): Inverse of `convert`, applied before encoding. Strings (`s`) default to
+            `str.encode`.
+    """
+    name: Optional[str]
+    fmt: str
+    convert: Optional[Callable[[Any], Any]] = None
+    encode: Optional[Callable[[Any], Any]] = None
+
+
+class RecordLayout:
+    """
+    Little-endian record layout compiled into a single `struct.Struct`.
+    """
+
+    def __init__(self, name: str, fields: List[RecordField]):
+        """
+        Initializes the object.
+
+        Args:
+            name (str): Name of the record, used in error messages.
+            fields (List[RecordField]): Fields in the order they appear in the packet.
+        """
+        self.name = name
+        self.fields = [field for field in fields if field.name is not None]
+        self.names = tuple(field.name for field in self.fields)
+        self.struct = Struct("<" + "".join(field.fmt for field in fields))
+
+        # (index, converter) of fields that need post-processing, and (index, encoder) of fields that need
+        # pre-processing
+        self._converters = []
+        self._encoders = []
+        for i, field in enumerate(self.fields):
+            convert, encode = field.convert, field.encode
+            if field.fmt.endswith("s"):
+                convert = convert or cstr_from_bytes
+                encode = encode or _encode
+            if convert is not None:
+                self._converters.append((i, convert))
+            if encode is not None:
+                self._encoders.append((i, encode))
+
+    @property
+    def size(self) -> int:
+        """
+        Returns:
+            int: Number of bytes covered by the layout.
+        """
+        return self.struct.size
+
+    def unpack_values(self, data: bytes) -> List[Any]:
+        """
+        Decodes a record into a list of values, in the order of `names`.
+
+        Args:
+            data (bytes): Bytes-like object (bytes, bytearray, memoryview) at least `size` bytes long. Extra bytes are
+                ignored.
+
+        Raises:
+            ValueError: Raised when `data` is shorter than the layout.
+
+        Returns:
+            List[Any]: Decoded values.
+        """
+        if len(data) < self.struct.size:
+            raise ValueError(f"{self.name} record too short. Expected {self.struct.size} bytes, got {len(data)}")
+
+        values = list(self.struct.unpack_from(data))
+        for i, convert in self._converters:
+            values[i] = convert(values[i])
+        return values
+
+    def unpack(self, data: bytes) -> Dict[str, Any]:
+        """
+        Decodes a record into a dictionary.
+
+        Args:
+            data (bytes): See `unpack_values`.
+
+        Returns:
+            Dict[str, Any]: Field names mapped to decoded values.
+        """
+        return dict(zip(self.names, self.unpack_values(data)))
+
+    def pack(self, **values: Any) -> bytes:
+        """
+        Encodes a record, the inverse of `unpack`. Mostly meant for generating test and simulation payloads.
+
+        Args:
+            **values (Any): Field names mapped to (converted) values. Missing fields are encoded as zero.
+
+        Returns:
+            bytes: Encoded record, `size` bytes long.
+        """
+        raw = [values.get(name) for name in self.names]
+        for i, encode in self._encoders:
+            if raw[i] is not None:
+                raw[i] = encode(raw[i])
+        for i, value in enumerate(raw):
+            if value is None:
+                raw[i] = b"" if self.fields[i].fmt.endswith("s") else 0
+        return self.struct.pack(*raw)
+
+    def unpack_into(self, obj: Any, data: bytes) -> None:
+        """
+        Decodes a record and sets each field as an attribute of `obj`.
+
+        Args:
+            obj (Any): Object receiving the attributes.
+            data (bytes): See `unpack_values`.
+        """
+        for name, value in zip(self.names, self.unpack_values(data)):
+            setattr(obj, name, value)
+
+
+def _year(value: int) -> int:
+    return value + 2000
+
+
+def _unyear(value: int) -> int:
+    return value - 2000
+
+
+def _decode(value: bytes) -> str:
+    return value.decode("utf-8")
+
+
+def _encode(value: str) -> bytes:
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+# Heartbeat record (port 12)
+HEARTBEAT_RECORD = RecordLayout("Heartbeat", [
+    RecordField("fwVersion", "4s"),
+    RecordField("pwaVersion", "2s"),
+    RecordField("serialNumber", "16s"),
+    RecordField("deviceType", "16s"),
+    RecordField("deviceLocation", "26s"),
+    RecordField("deviceInfoCRC", "H"),            # Never calculated in firmware
+    RecordField("month", "B"),
+    RecordField("day", "B"),
+    RecordField("year", "B", _year, _unyear),
+    RecordField("hour", "B"),
+    RecordField("minute", "B"),
+    RecordField("second", "B"),
+    RecordField("temperature", "h"),              # NOTE: THESE ARE SWITCHED AROUND IN THE DOCS AND FIRMWARE
+    RecordField("batteryVoltage", "H"),           # NOTE: THESE ARE SWITCHED AROUND IN THE DOCS AND FIRMWARE
+    RecordField("diagnostic", "B"),
+    RecordField("openValveCount", "H"),
+    RecordField("closeValveCount", "H"),
+    RecordField("lastTorqueBeforeSleep", "h"),
+    RecordField("firstTorqueAfterSleep", "h"),
+    RecordField("dataUnits", "B"),                # Not transferred
+    RecordField("calibrationFactor", "B"),        # Not transferred
+    RecordField(None, "7x"),
+    RecordField("heartbeatRecordPayloadCRC", "H"),
+])
+
+# Event summary record (port 14)
+EVENT_SUMMARY_RECORD = RecordLayout("Event summary", [
+    RecordField("typeOfStroke", "H"),
+    RecordField("strokeTime", "H"),
+    RecordField("maxTorque", "h"),
+    RecordField(None, "14x"),
+    RecordField("eventSummaryPayloadCRC", "H"),
+])
+
+# CO2 record (port 15). Values are ASCII digits, not c-strings.
+CO2_RECORD = RecordLayout("CO2", [
+    RecordField(None, "3x"),
+    RecordField("base", "5s", _decode),
+    RecordField(None, "4x"),
+    RecordField("scalingFactor", "B"),
+    RecordField(None, "1x"),
+    RecordField("auxSensorID", "6s", _decode),
+])
@@ -18,65 +18,277 @@ Date:
 """
 
 import logging
-from typing import List
+import sys
+from typing import List, Tuple
+from array import array
+from itertools import repeat
 from struct import unpack   # See https://docs.python.org/3.11/library/struct.html#format-characters
-from .misc import cstr_to_str
 from .crc16 import CRC16_CCITT
+from .records import HEARTBEAT_RECORD, EVENT_SUMMARY_RECORD
+from .torque import decode_torque_array
 
 
 class SensorEvent:
     """
     Data structure holding information on a sensor event. See the Smart Dev Comm documentation and `app.h` in firmware
     for packet structure breakdowns.
+
+    Torque samples of all data records are kept in a single growable int16 buffer, with the offset and length of each
+    packet stored separately and received packets tracked in a bitmap. `torqueData`, `dataPacketPayloadCRCs` and
+    `calculatedDataPacketPayloadCRCs` are exposed as list views (`None` for missing packets) for the database layer.
     """
-    devEUI: str = None
+    __slots__ = (
+        "devEUI",
+        # Event Summary Record
+        "typeOfStroke", "strokeTime", "maxTorque", "eventSummaryPayloadCRC", "calculatedEventSummaryPayloadCRC",
+        # Data record
+        "hiddenDataIndices", "_torque", "_offsets", "_lengths", "_received", "_crcs", "_calculated_crcs", "_hashes",
+        "_contiguous",
+        # Heartbeat record
+        "fwVersion", "pwaVersion", "serialNumber", "deviceType", "deviceLocation", "deviceInfoCRC", "month", "day",
+        "year", "hour", "minute", "second", "batteryVoltage", "temperature", "diagnostic", "openValveCount",
+        "closeValveCount", "lastTorqueBeforeSleep", "firstTorqueAfterSleep", "dataUnits", "calibrationFactor",
+        "heartbeatRecordPayloadCRC", "calculatedHeartbeatRecordPayloadCRC",
+        # Stream
+        "isStreaming",
+    )
+
+    devEUI: str
 
     # Event Summary Record
-    typeOfStroke: int = 0
-    strokeTime: int = 0
-    maxTorque: int = 0
-    eventSummaryPayloadCRC: int = 0
-    calculatedEventSummaryPayloadCRC: int = 0
+    typeOfStroke: int
+    strokeTime: int
+    maxTorque: int
+    eventSummaryPayloadCRC: int
+    calculatedEventSummaryPayloadCRC: int
 
     # Data record
-    torqueData: List[List[int]]
-    dataPacketPayloadCRCs: List[int]
-    calculatedDataPacketPayloadCRCs: List[int]
     hiddenDataIndices: List[int]
+    _torque: array              # int16 samples of every received packet, in arrival order
+    _offsets: array             # Start of each packet in `_torque`, indexed by packet sequence - 1
+    _lengths: array             # Number of samples of each packet, indexed by packet sequence - 1
+    _received: bytearray        # Bitmap of received packets, indexed by packet sequence - 1
+    _crcs: array
+    _calculated_crcs: array
+    _contiguous: bool           # True while `_torque` holds packets 1..n in order, without gaps or overwrites
 
     # Heartbeat record
-    fwVersion: int = 0
-    pwaVersion: int = 0
-    serialNumber: int = 0
-    deviceType: int = 0
-    deviceLocation: int = 0
-    deviceInfoCRC: int = 0
-    month: int = 1
-    day: int = 1
-    year: int = 1
-    hour: int = 0
-    minute: int = 0
-    second: int = 0
-    batteryVoltage: int = 0
-    temperature: int = 0
-    diagnostic: int = 0
-    openValveCount: int = 0
-    closeValveCount: int = 0
-    lastTorqueBeforeSleep: int = 0
-    firstTorqueAfterSleep: int = 0
-    dataUnits: int = 0              # Not transferred
-    calibrationFactor: int = 0      # Not transferred
-    heartbeatRecordPayloadCRC: int = 0
-    calculatedHeartbeatRecordPayloadCRC: int = 0
+    fwVersion: int
+    pwaVersion: int
+    serialNumber: int
+    deviceType: int
+    deviceLocation: int
+    deviceInfoCRC: int
+    month: int
+    day: int
+    year: int
+    hour: int
+    minute: int
+    second: int
+    batteryVoltage: int
+    temperature: int
+    diagnostic: int
+    openValveCount: int
+    closeValveCount: int
+    lastTorqueBeforeSleep: int
+    firstTorqueAfterSleep: int
+    dataUnits: int              # Not transferred
+    calibrationFactor: int      # Not transferred
+    heartbeatRecordPayloadCRC: int
+    calculatedHeartbeatRecordPayloadCRC: int
 
     # Stream
-    isStreaming: bool = False
+    isStreaming: bool
 
     def __init__(self):
-        self.torqueData = []
-        self.dataPacketPayloadCRCs = []
-        self.calculatedDataPacketPayloadCRCs = []
+        self.devEUI = None
+
+        self.typeOfStroke = 0
+        self.strokeTime = 0
+        self.maxTorque = 0
+        self.eventSummaryPayloadCRC = 0
+        self.calculatedEventSummaryPayloadCRC = 0
+
         self.hiddenDataIndices = []
+        self._torque = array("h")
+        self._offsets = array("L")
+        self._lengths = array("H")
+        self._received = bytearray()
+        self._crcs = array("H")
+        self._calculated_crcs = array("H")
+        self._hashes = array("q")
+        self._contiguous = True
+
+        self.fwVersion = 0
+        self.pwaVersion = 0
+        self.serialNumber = 0
+        self.deviceType = 0
+        self.deviceLocation = 0
+        self.deviceInfoCRC = 0
+        self.month = 1
+        self.day = 1
+        self.year = 1
+        self.hour = 0
+        self.minute = 0
+        self.second = 0
+        self.batteryVoltage = 0
+        self.temperature = 0
+        self.diagnostic = 0
+        self.openValveCount = 0
+        self.closeValveCount = 0
+        self.lastTorqueBeforeSleep = 0
+        self.firstTorqueAfterSleep = 0
+        self.dataUnits = 0
+        self.calibrationFactor = 0
+        self.heartbeatRecordPayloadCRC = 0
+        self.calculatedHeartbeatRecordPayloadCRC = 0
+
+        self.isStreaming = False
+
+    def memory_usage(self) -> int:
+        """
+        Returns:
+            int: Approximate number of bytes held by the event, including its packet tables.
+        """
+        return sys.getsizeof(self) + sum(sys.getsizeof(table) for table in (
+            self._torque, self._offsets, self._lengths, self._received, self._crcs, self._calculated_crcs,
+            self._hashes, self.hiddenDataIndices,
+        ))
+
+    def copy(self) -> "SensorEvent":
+        """
+        Returns:
+            SensorEvent: Independent copy of the event, packet tables included. Packets parsed into the event
+            afterwards do not change the copy.
+        """
+        event = SensorEvent.__new__(SensorEvent)
+        for name in self.__slots__:
+            value = getattr(self, name)
+            setattr(event, name, value[:] if isinstance(value, (array, bytearray, list)) else value)
+        return event
+
+    @property
+    def packet_count(self) -> int:
+        """
+        Returns:
+            int: Highest packet sequence seen so far (received or not).
+        """
+        return len(self._lengths)
+
+    def has_packet(self, packet_seq: int) -> bool:
+        """
+        Args:
+            packet_seq (int): Packet sequence number (starting at 1).
+
+        Returns:
+            bool: Whether the data record with this sequence number was received.
+        """
+        index = packet_seq - 1
+        return 0 <= index < len(self._lengths) and bool(self._received[index >> 3] & (1 << (index & 7)))
+
+    def packet_torque_data(self, packet_seq: int) -> array:
+        """
+        Args:
+            packet_seq (int): Packet sequence number (starting at 1).
+
+        Returns:
+            array: int16 torque samples of the packet, or None if the packet was not received.
+        """
+        if not self.has_packet(packet_seq):
+            return None
+        offset = self._offsets[packet_seq - 1]
+        return self._torque[offset:offset + self._lengths[packet_seq - 1]]
+
+    def packet_crc(self, packet_seq: int) -> int:
+        """
+        Args:
+            packet_seq (int): Packet sequence number (starting at 1).
+
+        Returns:
+            int: CRC sent with the packet, or None if the packet was not received.
+        """
+        return self._crcs[packet_seq - 1] if self.has_packet(packet_seq) else None
+
+    def packet_calculated_crc(self, packet_seq: int) -> int:
+        """
+        Args:
+            packet_seq (int): Packet sequence number (starting at 1).
+
+        Returns:
+            int: CRC calculated for the packet, or None if the packet was not received.
+        """
+        return self._calculated_crcs[packet_seq - 1] if self.has_packet(packet_seq) else None
+
+    def packet_hash(self, packet_seq: int) -> int:
+        """
+        Args:
+            packet_seq (int): Packet sequence number (starting at 1).
+
+        Returns:
+            int: Hash of the packet payload (samples and CRC, without the sequence number), or None if the packet was
+            not received. Only comparable within the same process.
+        """
+        return self._hashes[packet_seq - 1] if self.has_packet(packet_seq) else None
+
+    @property
+    def torqueData(self) -> List[List[int]]:
+        """
+        Returns:
+            List[List[int]]: Torque samples per packet, `None` for packets that were not received.
+        """
+        torque, offsets, lengths = self._torque, self._offsets, self._lengths
+        return [
+            torque[offsets[i]:offsets[i] + lengths[i]].tolist() if self.has_packet(i + 1) else None
+            for i in range(len(lengths))
+        ]
+
+    @property
+    def dataPacketPayloadCRCs(self) -> List[int]:
+        """
+        Returns:
+            List[int]: CRC sent with each packet, `None` for packets that were not received.
+        """
+        return [crc if self.has_packet(i + 1) else None for i, crc in enumerate(self._crcs)]
+
+    @property
+    def calculatedDataPacketPayloadCRCs(self) -> List[int]:
+        """
+        Returns:
+            List[int]: CRC calculated for each packet, `None` for packets that were not received.
+        """
+        return [crc if self.has_packet(i + 1) else None for i, crc in enumerate(self._calculated_crcs)]
+
+    def flatten_torque(self) -> Tuple[List[int], List[int], List[int]]:
+        """
+        Flattens torque data for use in database. Missing packets have a record number of -1 and a length of 0.
+
+        Returns:
+            flattened_torque_data: list of db compatible torque data
+            record_numbers: list of packet numbers
+            record_lengths: list of how long each packet is
+        """
+        record_numbers: List[int] = []
+        record_lengths: List[int] = []
+
+        for i, length in enumerate(self._lengths):
+            if self.has_packet(i + 1):
+                record_numbers.append(i + 1)
+                record_lengths.append(length)
+            else:
+                record_numbers.append(-1)
+                record_lengths.append(0)
+
+        # Fast path, the buffer already holds packets 1..n in order
+        if self._contiguous:
+            return (self._torque.tolist(), record_numbers, record_lengths)
+
+        flattened_torque_data = array("h")
+        for i, length in enumerate(self._lengths):
+            if self.has_packet(i + 1):
+                offset = self._offsets[i]
+                flattened_torque_data.extend(self._torque[offset:offset + length])
+
+        return (flattened_torque_data.tolist(), record_numbers, record_lengths)
 
     def parse_from_data(self, topic: str, data: bytes) -> None:
         """
@@ -119,10 +331,8 @@ class SensorEvent:
             data (bytes): Data to be interpreted.
         """
         logging.debug("Loading event summary record...")
-        self.typeOfStroke = unpack("<H", data[:2])[0]
-        self.strokeTime = unpack("<H", data[2:4])[0]
-        self.maxTorque = unpack("<h", data[4:6])[0]
-        self.eventSummaryPayloadCRC = unpack("<H", data[20:22])[0]
+        data = memoryview(data)
+        EVENT_SUMMARY_RECORD.unpack_into(self, data)
         self.calculatedEventSummaryPayloadCRC = CRC16_CCITT(data[:-2])
 
         if self.eventSummaryPayloadCRC != self.calculatedEventSummaryPayloadCRC:
@@ -137,31 +347,50 @@ class SensorEvent:
         """
         logging.debug("Loading data record...")
         packet_seq: int = unpack("<H", data[:2])[0]
-        packet_torque_data: List[int] = []
 
-        # Increase torque data list to proper length
-        len_diff: int = packet_seq - len(self.torqueData)
-        if len_diff > 0:
-            self.torqueData.extend([None] * len_diff)
-            self.dataPacketPayloadCRCs.extend([None] * len_diff)
-            self.calculatedDataPacketPayloadCRCs.extend([None] * len_diff)
+        if packet_seq == 0:
+            logging.warning("Ignoring data record with packet sequence 0")
+            return
+        index: int = packet_seq - 1
 
-        if self.torqueData[packet_seq - 1] is not None:
+        # Increase packet tables to proper length
+        len_diff: int = packet_seq - len(self._lengths)
+        if len_diff > 0:
+            self._offsets.extend(repeat(0, len_diff))
+            self._lengths.extend(repeat(0, len_diff))
+            self._crcs.extend(repeat(0, len_diff))
+            self._calculated_crcs.extend(repeat(0, len_diff))
+            self._hashes.extend(repeat(0, len_diff))
+            self._received.extend(bytes((len(self._lengths) + 7) // 8 - len(self._received)))
+
+        overwrite = self.has_packet(packet_seq)
+        if overwrite:
             logging.warning(f"Overwriting existing packet data for packet {packet_seq}!")
 
-        for i in range(2, len(data[2:-1]), 2):
-            packet_torque_data.append(unpack("<h", data[i:i + 2])[0])
+        # Samples are appended to the buffer, or written in place when overwriting a packet of the same length
+        packet_torque_data: array = decode_torque_array(data)
+        if overwrite and self._lengths[index] == len(packet_torque_data):
+            offset = self._offsets[index]
+            self._torque[offset:offset + len(packet_torque_data)] = packet_torque_data
+        else:
+            # Any packet after a gap, out of order or rewritten breaks the buffer order
+            if overwrite or len_diff != 1:
+                self._contiguous = False
+            self._offsets[index] = len(self._torque)
+            self._torque.extend(packet_torque_data)
+        self._lengths[index] = len(packet_torque_data)
 
         # Interpret CRC
         dataPacketPayloadCRC = unpack("<H", data[-2:])[0]
-        calculatedDataPacketPayloadCRC = CRC16_CCITT(data[:-2])
+        calculatedDataPacketPayloadCRC = CRC16_CCITT(memoryview(data)[:-2])
 
         if dataPacketPayloadCRC != calculatedDataPacketPayloadCRC:
             logging.warning(f"Data record CRCs do not match. Actual: {dataPacketPayloadCRC} Calculated {calculatedDataPacketPayloadCRC}")
 
-        self.torqueData[packet_seq - 1] = packet_torque_data
-        self.dataPacketPayloadCRCs[packet_seq - 1] = dataPacketPayloadCRC
-        self.calculatedDataPacketPayloadCRCs[packet_seq - 1] = calculatedDataPacketPayloadCRC
+        self._crcs[index] = dataPacketPayloadCRC
+        self._calculated_crcs[index] = calculatedDataPacketPayloadCRC
+        self._hashes[index] = hash(bytes(data[2:]))
+        self._received[index >> 3] |= 1 << (index & 7)
 
     def parse_from_heartbeat_record(self, data: bytes) -> None:
         """
@@ -171,28 +400,8 @@ class SensorEvent:
             data (bytes): Data to be interpreted.
         """
         logging.debug("Loading heartbeat record...")
-        self.fwVersion = cstr_to_str(unpack("<cccc", data[:4]))
-        self.pwaVersion = cstr_to_str(unpack("<cc", data[4:6]))
-        self.serialNumber = cstr_to_str(unpack("<" + 'c' * 16, data[6:22]))
-        self.deviceType = cstr_to_str(unpack("<" + 'c' * 16, data[22:38]))
-        self.deviceLocation = cstr_to_str(unpack("<" + 'c' * 26, data[38:64]))
-        self.deviceInfoCRC = unpack("<H", data[64:66])[0]  # Never calculated in firmware
-        self.month = unpack("<B", data[66:67])[0]
-        self.day = unpack("<B", data[67:68])[0]
-        self.year = unpack("<B", data[68:69])[0] + 2000
-        self.hour = unpack("<B", data[69:70])[0]
-        self.minute = unpack("<B", data[70:71])[0]
-        self.second = unpack("<B", data[71:72])[0]
-        self.temperature = unpack("<h", data[72:74])[0]     # NOTE: THESE ARE SWITCHED AROUND IN THE DOCS AND FIRMWARE
-        self.batteryVoltage = unpack("<H", data[74:76])[0]  # NOTE: THESE ARE SWITCHED AROUND IN THE DOCS AND FIRMWARE
-        self.diagnostic = unpack("<B", data[76:77])[0]
-        self.openValveCount = unpack("<H", data[77:79])[0]
-        self.closeValveCount = unpack("<H", data[79:81])[0]
-        self.lastTorqueBeforeSleep = unpack("<h", data[81:83])[0]
-        self.firstTorqueAfterSleep = unpack("<h", data[83:85])[0]
-        self.dataUnits = unpack("<B", data[85:86])[0]               # Not transferred
-        self.calibrationFactor = unpack("<B", data[86:87])[0]       # Not transferred
-        self.heartbeatRecordPayloadCRC = unpack("<H", data[94:96])[0]
+        data = memoryview(data)
+        HEARTBEAT_RECORD.unpack_into(self, data)
 
         # Calculate CRCs
         self.calculatedHeartbeatRecordPayloadCRC = CRC16_CCITT(data[:-2])
@@ -201,4 +410,8 @@ class SensorEvent:
             
 
     def __repr__(self) -> str:
-        return "{}({!r})".format(self.__class__.__name__, self.__dict__)
+        fields = {name: getattr(self, name) for name in self.__slots__ if not name.startswith("_")}
+        fields["torqueData"] = self.torqueData
+        fields["dataPacketPayloadCRCs"] = self.dataPacketPayloadCRCs
+        fields["calculatedDataPacketPayloadCRCs"] = self.calculatedDataPacketPayloadCRCs
+        return "{}({!r})".format(self.__class__.__name__, fields)
@@ -0,0 +1,206 @@
+"""
+Shared Subscription Module
+
+This module lets several backend processes consume the sensor topics together through MQTT 5 shared subscriptions
+(`$share/<group>/sensors/+/port/+`). The broker hands every message to one member of the group, but it balances per
+message, not per device, while a `SensorEvent` has to see all packets of its device.
+
+Each consumer is therefore assigned the devices whose devEUI hashes to its index (same hash as
+`ShardedIngestPipeline`). Messages of a device owned by another consumer are forwarded to that consumer on
+`ingest/<group>/<owner index>/sensors/<devEUI>/port/<port>`, which every consumer subscribes to for its own index.
+
+Packets of a device reach the owner either directly or through a forward, so they may be reordered when they are
+published closer together than one broker round trip. Data records are placed by sequence number, but an event summary
+overtaking the last data records would close the event without them. The owner therefore holds event summaries in a
+`SummaryReorderBuffer` for `MQTT_SUMMARY_GRACE` seconds, while late data records of the stroke are still parsed into
+the event.
+
+Date:
+    October 2026
+"""
+
+from collections.abc import Callable
+from os import getenv
+from threading import Lock
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+from zlib import crc32
+from .ingest import IngestItem, device_from_topic
+
+
+FORWARD_PREFIX = "ingest"
+
+
+def owner_of(devEUI: str, consumer_count: int) -> int:
+    """
+    Args:
+        devEUI (str): Device.
+        consumer_count (int): Number of consumers in the group.
+
+    Returns:
+        int: Index of the consumer holding the events of the device.
+    """
+    return crc32(devEUI.encode()) % consumer_count
+
+
+class SharedSubscription:
+    """
+    Topics and routing of one member of a shared subscription group.
+
+    Raises:
+        ValueError: When the group is empty, or the consumer index is outside of `[0, consumer_count)`.
+    """
+    group: str = getenv("MQTT_SHARE_GROUP", "")
+    consumer_index: int = int(getenv("MQTT_CONSUMER_INDEX", 0))
+    consumer_count: int = int(getenv("MQTT_CONSUMER_COUNT", 1))
+
+    def __init__(self, group: str = None, consumer_index: int = None, consumer_count: int = None):
+        """
+        Initializes the object.
+
+        Args:
+            group (str, optional): Share group name. Defaults to `MQTT_SHARE_GROUP`.
+            consumer_index (int, optional): Index of this consumer. Defaults to `MQTT_CONSUMER_INDEX` or 0.
+            consumer_count (int, optional): Number of consumers in the group. Defaults to `MQTT_CONSUMER_COUNT` or 1.
+        """
+        if group is not None:
+            self.group = group
+        if consumer_index is not None:
+            self.consumer_index = consumer_index
+        if consumer_count is not None:
+            self.consumer_count = consumer_count
+
+        if not self.group or any(c in self.group for c in "/+#"):
+            raise ValueError(f"Invalid share group {self.group!r}")
+        if not 0 <= self.consumer_index < self.consumer_count:
+            raise ValueError(f"Consumer index {self.consumer_index} outside of [0, {self.consumer_count})")
+
+        self._forward_prefix = f"{FORWARD_PREFIX}/{self.group}/"
+
+    def forward_topic(self, topic: str, consumer_index: int) -> str:
+        """
+        Args:
+            topic (str): Sensor topic (`sensors/<devEUI>/port/<port>`).
+            consumer_index (int): Consumer the message is forwarded to.
+
+        Returns:
+            str: Topic the consumer receives forwarded messages on.
+        """
+        return f"{self._forward_prefix}{consumer_index}/{topic}"
+
+    def subscriptions(self, topics: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+        """
+        Args:
+            topics (List[Tuple[str, int]]): Sensor topic filters and QoS.
+
+        Returns:
+            List[Tuple[str, int]]: Shared subscriptions to the sensor topics and subscriptions to the messages forwarded
+            to this consumer.
+        """
+        return [(f"$share/{self.group}/{topic}", qos) for topic, qos in topics] + \
+               [(self.forward_topic(topic, self.consumer_index), qos) for topic, qos in topics]
+
+    def route(self, topic: str) -> Tuple[str, Optional[str]]:
+        """
+        Decides whether a received message is processed here or forwarded to its owner.
+
+        Args:
+            topic (str): Topic the message was received on.
+
+        Returns:
+            Tuple[str, Optional[str]]: Sensor topic of the message, and the topic to forward it to (None to process it
+            here).
+        """
+        if topic.startswith(self._forward_prefix):
+            # Forwarded to this consumer, strip `ingest/<group>/<index>/`
+            return topic[len(self._forward_prefix):].split("/", 1)[1], None
+
+        owner = owner_of(device_from_topic(topic), self.consumer_count)
+        if owner == self.consumer_index:
+            return topic, None
+        return topic, self.forward_topic(topic, owner)
+
+
+class SummaryReorderBuffer:
+    """
+    Holds the event summary (port 14) of each device for a grace period before it is processed, so data records of the
+    stroke overtaken by the summary still reach the event. The summary does not carry the number of data records of the
+    stroke, so the grace period bounds the wait. Other messages are processed right away, after the held summary of
+    their device when they start a new stroke (anything but a data record).
+
+    Messages are passed to `dispatch(topic, payload, recv_time)` in processing order. Dispatches are serialized by a
+    lock, so summaries released by a timer thread are never processed concurrently with received messages.
+    """
+    grace: float = float(getenv("MQTT_SUMMARY_GRACE", 0.5))
+
+    def __init__(self, dispatch: Callable[[str, bytes, float], None], grace: float = None):
+        """
+        Initializes the object.
+
+        Args:
+            dispatch (Callable): Executed with every message once it can be processed.
+            grace (float, optional): Seconds an event summary is held. Defaults to `MQTT_SUMMARY_GRACE` or 0.5.
+
+        Raises:
+            ValueError: When the grace period is negative.
+        """
+        if grace is not None:
+            self.grace = grace
+        if self.grace < 0:
+            raise ValueError("Summary grace period can not be negative")
+
+        self.dispatch = dispatch
+        self._held: Dict[str, Tuple[float, IngestItem]] = {}    # devEUI: (release time, summary)
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._held)
+
+    def push(self, topic: str, payload: bytes, recv_time: float, now: float = None) -> None:
+        """
+        Dispatches a message, or holds it if it is an event summary.
+
+        Args:
+            topic (str): Sensor topic (`sensors/<devEUI>/port/<port>`).
+            payload (bytes): Message payload.
+            recv_time (float): Time the message was received.
+            now (float, optional): Current `time.monotonic()`. Defaults to now.
+        """
+        now = monotonic() if now is None else now
+        devEUI, port = device_from_topic(topic), topic.rsplit("/", 1)[1]
+        with self._lock:
+            if port != "13":
+                # A new stroke (or a second summary) ends the held one
+                held = self._held.pop(devEUI, None)
+                if held is not None:
+                    self.dispatch(*held[1])
+            if port == "14":
+                self._held[devEUI] = (now + self.grace, (topic, payload, recv_time))
+            else:
+                self.dispatch(topic, payload, recv_time)
+
+    def release_due(self, now: float = None) -> int:
+        """
+        Dispatches the event summaries held for longer than the grace period.
+
+        Args:
+            now (float, optional): Current `time.monotonic()`. Defaults to now.
+
+        Returns:
+            int: Number of summaries dispatched.
+        """
+        now = monotonic() if now is None else now
+        with self._lock:
+            due = [devEUI for devEUI, (release_time, _) in self._held.items() if release_time <= now]
+            for devEUI in due:
+                self.dispatch(*self._held.pop(devEUI)[1])
+        return len(due)
+
+    def release_all(self) -> int:
+        """
+        Dispatches every held event summary.
+
+        Returns:
+            int: Number of summaries dispatched.
+        """
+        return self.release_due(float("inf"))
@@ -0,0 +1,458 @@
+"""
+Standalone python file meant for load testing purposes. This program simulates a fleet of LoRa valve sensors, producing
+valid heartbeat (port 12), data (port 13), event summary (port 14) and CO2 (port 15) payloads with correct CRCs, and
+reports the end-to-end throughput and latency of the ingest path (`ThreadedMQTTClient`, optionally with the database
+writes).
+
+Messages are either published to the broker (`--broker`, requires `MQTT_USERNAME` and `MQTT_PASSWORD`), or delivered
+directly to an in-process `ThreadedMQTTClient` (`--direct`), which skips the network. With `--no-consumer` messages
+are only published, for a backend running elsewhere (e.g. the docker compose stack).
+
+Stroke latency is measured from publishing the event summary of a stroke until its `on_event_summary_packet` callback
+(including the database write with `--db`) returns.
+
+Example:
+    `python -m mqtt_client.simulator --direct --devices 200 --duration 30` (from the `backend` folder)
+    `python -m mqtt_client.simulator --broker localhost --devices 50 --stroke-interval 5 --loss 0.05 --db`
+
+Date:
+    October 2026
+"""
+
+import argparse
+import heapq
+import logging
+import random
+from collections import deque
+from collections.abc import Callable
+from datetime import datetime
+from os import getenv
+from struct import pack
+from threading import Event, Lock
+from time import monotonic, sleep
+from typing import Any, Deque, Dict, Iterator, List, Tuple
+from .crc16 import CRC16_CCITT
+from .records import HEARTBEAT_RECORD, EVENT_SUMMARY_RECORD, CO2_RECORD
+from .sensor_event import SensorEvent
+
+
+# (time offset in seconds, topic, payload)
+SimulatedMessage = Tuple[float, str, bytes]
+
+
+def _devEUI(index: int, kind: int) -> str:
+    return f"53-49-4d-{index >> 16 & 0xff:02x}-{index >> 8 & 0xff:02x}-{index & 0xff:02x}-00-{kind:02x}"
+
+
+def with_crc(body: bytes) -> bytes:
+    """
+    Args:
+        body (bytes): Record without CRC.
+
+    Returns:
+        bytes: Record followed by its little-endian CRC16.
+    """
+    return body + pack("<H", CRC16_CCITT(body))
+
+
+class VirtualDevice:
+    """
+    Simulated valve sensor. Every stroke produces a heartbeat, `packets_per_stroke` data records and an event summary.
+    """
+
+    def __init__(self, devEUI: str, rng: random.Random, packets_per_stroke: int = 20, samples_per_packet: int = 50):
+        """
+        Initializes the object.
+
+        Args:
+            devEUI (str): Device EUI used in the topics.
+            rng (random.Random): Random generator (seeded for reproducible runs).
+            packets_per_stroke (int, optional): Data records per stroke. Defaults to 20.
+            samples_per_packet (int, optional): Torque samples per data record. Defaults to 50.
+        """
+        self.devEUI = devEUI
+        self.rng = rng
+        self.packets_per_stroke = packets_per_stroke
+        self.samples_per_packet = samples_per_packet
+        self.strokes = 0
+        self.serial_number = f"SIM-{rng.randrange(10**8):08d}"
+
+    def topic(self, port: int) -> str:
+        return f"sensors/{self.devEUI}/port/{port}"
+
+    def heartbeat(self) -> bytes:
+        """
+        Returns:
+            bytes: Heartbeat record. The valve counts and clock change every stroke, so each stroke has a distinct
+            heartbeat CRC (used to match live events in the database).
+        """
+        now = datetime.now()
+        body = HEARTBEAT_RECORD.pack(
+            fwVersion="1.0", pwaVersion="A", serialNumber=self.serial_number, deviceType="SIM", deviceLocation="Sim",
+            month=now.month, day=now.day, year=now.year, hour=now.hour, minute=now.minute, second=now.second,
+            temperature=self.rng.randint(15, 35), batteryVoltage=self.rng.randint(3000, 3600),
+            openValveCount=(self.strokes + 1) // 2, closeValveCount=self.strokes // 2,
+            lastTorqueBeforeSleep=self.rng.randint(-100, 100), firstTorqueAfterSleep=self.rng.randint(-100, 100),
+        )
+        return with_crc(body[:-2])
+
+    def data_record(self, packet_seq: int) -> bytes:
+        """
+        Args:
+            packet_seq (int): Packet sequence number (starting at 1).
+
+        Returns:
+            bytes: Data record with a torque ramp and noise.
+        """
+        base = packet_seq * 100
+        samples = [max(-32768, min(32767, base + self.rng.randint(-50, 50))) for _ in range(self.samples_per_packet)]
+        return with_crc(pack(f"<H{len(samples)}h", packet_seq, *samples))
+
+    def event_summary(self) -> bytes:
+        """
+        Returns:
+            bytes: Event summary record.
+        """
+        body = EVENT_SUMMARY_RECORD.pack(typeOfStroke=self.strokes % 2, strokeTime=self.rng.randint(1000, 20000),
+                                         maxTorque=self.packets_per_stroke * 100)
+        return with_crc(body[:-2])
+
+    def co2(self) -> bytes:
+        """
+        Returns:
+            bytes: CO2 record.
+        """
+        return CO2_RECORD.pack(base=f"{self.rng.randint(400, 2000):05d}", scalingFactor=1,
+                               auxSensorID=f"{int(self.devEUI[9:17].replace('-', ''), 16) % 10**6:06d}")
+
+    def stroke(self) -> List[Tuple[str, bytes]]:
+        """
+        Returns:
+            List[Tuple[str, bytes]]: `(topic, payload)` of every message of the next stroke, in order.
+        """
+        messages = [(self.topic(12), self.heartbeat())]
+        messages += [(self.topic(13), self.data_record(seq)) for seq in range(1, self.packets_per_stroke + 1)]
+        messages.append((self.topic(14), self.event_summary()))
+        self.strokes += 1
+        return messages
+
+
+class FleetSimulator:
+    """
+    Schedules the messages of `devices` virtual sensors, applies packet loss and duplication, and records stroke
+    latency.
+    """
+
+    def __init__(self, devices: int = 10, stroke_interval: float = 10.0, packet_interval: float = 0.1,
+                 packets_per_stroke: int = 20, samples_per_packet: int = 50, loss: float = 0.0,
+                 duplication: float = 0.0, co2_sensors: int = 0, co2_interval: float = 60.0, seed: int = 0):
+        """
+        Initializes the object.
+
+        Args:
+            devices (int, optional): Number of virtual sensors. Defaults to 10.
+            stroke_interval (float, optional): Seconds between the strokes of a sensor. Defaults to 10.0.
+            packet_interval (float, optional): Seconds between the messages of a stroke. Defaults to 0.1.
+            packets_per_stroke (int, optional): See `VirtualDevice`. Defaults to 20.
+            samples_per_packet (int, optional): See `VirtualDevice`. Defaults to 50.
+            loss (float, optional): Probability that a message is lost. Defaults to 0.0.
+            duplication (float, optional): Probability that a message is sent twice. Defaults to 0.0.
+            co2_sensors (int, optional): Number of virtual CO2 (auxiliary) sensors. Defaults to 0.
+            co2_interval (float, optional): Seconds between the messages of a CO2 sensor. Defaults to 60.0.
+            seed (int, optional): Random seed. Defaults to 0.
+        """
+        if not 0 <= loss < 1 or not 0 <= duplication <= 1:
+            raise ValueError("Loss and duplication must be probabilities")
+
+        self.rng = random.Random(seed)
+        self.devices = [VirtualDevice(_devEUI(i, 1), self.rng, packets_per_stroke, samples_per_packet)
+                        for i in range(devices)]
+        # A device sends either valve events or CO2 records
+        self.co2_devices = [VirtualDevice(_devEUI(i, 2), self.rng) for i in range(co2_sensors)]
+        self.stroke_interval = stroke_interval
+        self.packet_interval = packet_interval
+        self.loss = loss
+        self.duplication = duplication
+        self.co2_interval = co2_interval
+
+        # Stats
+        self.sent = 0
+        self.lost = 0
+        self.duplicated = 0
+        self.strokes_sent = 0
+        self.latencies: List[float] = []
+        self._pending: Dict[str, Deque[float]] = {}     # devEUI -> publish times of summaries waiting for processing
+        self._lock = Lock()
+        self._done = Event()
+
+    def schedule(self, duration: float) -> Iterator[SimulatedMessage]:
+        """
+        Generates the messages of every sensor for `duration` seconds, ordered by time. Sensors start at a random
+        offset within the first stroke interval. Strokes started before `duration` are sent completely.
+
+        Args:
+            duration (float): Simulated time in seconds.
+
+        Yields:
+            SimulatedMessage: `(time offset, topic, payload)`. Lost messages are skipped, duplicates repeated.
+        """
+        # (time, order, device index, kind)
+        heap = [(self.rng.uniform(0, self.stroke_interval), i, i, "stroke") for i in range(len(self.devices))]
+        heap += [(self.rng.uniform(0, self.co2_interval), -i - 1, i, "co2") for i in range(len(self.co2_devices))]
+        heapq.heapify(heap)
+        order = len(heap)
+
+        while heap:
+            at, _, index, kind = heapq.heappop(heap)
+            if isinstance(kind, str) and at >= duration:
+                continue
+            if kind == "stroke":
+                device = self.devices[index]
+                messages = device.stroke()
+                self.strokes_sent += 1
+                for i, (topic, payload) in enumerate(messages):
+                    heapq.heappush(heap, (at + i * self.packet_interval, order, index, (topic, payload)))
+                    order += 1
+                heapq.heappush(heap, (at + self.stroke_interval, order, index, "stroke"))
+            elif kind == "co2":
+                device = self.co2_devices[index]
+                heapq.heappush(heap, (at, order, index, (device.topic(15), device.co2())))
+                heapq.heappush(heap, (at + self.co2_interval, order + 1, index, "co2"))
+            else:
+                topic, payload = kind
+                if self.rng.random() < self.loss:
+                    self.lost += 1
+                    continue
+                yield at, topic, payload
+                if self.rng.random() < self.duplication:
+                    self.duplicated += 1
+                    yield at, topic, payload
+            order += 2
+
+    def run(self, publish: Callable[[str, bytes], None], duration: float, speed: float = 1.0) -> float:
+        """
+        Publishes the scheduled messages.
+
+        Args:
+            publish (Callable): Executed with `(topic, payload)` for every message.
+            duration (float): Simulated time in seconds.
+            speed (float, optional): Simulated seconds per real second, 0 publishes as fast as possible. Defaults to
+                1.0.
+
+        Returns:
+            float: Real time spent publishing in seconds.
+        """
+        start = monotonic()
+        for at, topic, payload in self.schedule(duration):
+            if speed > 0:
+                delay = start + at / speed - monotonic()
+                if delay > 0:
+                    sleep(delay)
+            if topic.endswith("/14"):
+                with self._lock:
+                    self._pending.setdefault(topic.split("/")[1], deque()).append(monotonic())
+            publish(topic, payload)
+            self.sent += 1
+        return monotonic() - start
+
+    def stroke_processed(self, sensor_event: SensorEvent) -> None:
+        """
+        Records the latency of a stroke. Meant to be executed at the end of `on_event_summary_packet`.
+
+        Args:
+            sensor_event (SensorEvent): Completed event.
+        """
+        now = monotonic()
+        with self._lock:
+            pending = self._pending.get(sensor_event.devEUI)
+            if pending:
+                self.latencies.append(now - pending.popleft())
+            if not any(self._pending.values()):
+                self._done.set()
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Waits until every published event summary was processed.
+
+        Args:
+            timeout (float): Maximum time to wait in seconds.
+
+        Returns:
+            bool: False if summaries are still pending after `timeout`.
+        """
+        with self._lock:
+            if not any(self._pending.values()):
+                return True
+            self._done.clear()
+        return self._done.wait(timeout)
+
+    def report(self, elapsed: float, processed: int) -> Dict[str, Any]:
+        """
+        Args:
+            elapsed (float): Real time from the first message until everything was processed, in seconds.
+            processed (int): Number of messages processed by the ingest path.
+
+        Returns:
+            Dict[str, Any]: Message counts, throughput (messages per second) and stroke latency percentiles (seconds).
+        """
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        return {
+            "devices": len(self.devices),
+            "strokes": self.strokes_sent,
+            "sent": self.sent,
+            "lost": self.lost,
+            "duplicated": self.duplicated,
+            "processed": processed,
+            "strokes_processed": len(latencies),
+            "elapsed": elapsed,
+            "throughput": processed / elapsed if elapsed else 0.0,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_p99": percentile(0.99),
+            "latency_max": latencies[-1] if latencies else 0.0,
+        }
+
+
+def _backend_callbacks(simulator: FleetSimulator, use_db: bool) -> Tuple[Dict[str, Callable], Callable, Any]:
+    """
+    Returns the `ThreadedMQTTClient` callbacks used by the backend (write coalescer and live upserts) when `use_db` is
+    set, or callbacks that only count messages. Also returns a function returning the processed message count, and
+    the coalescer (or None).
+    """
+    counter = [0]
+    count_lock = Lock()
+
+    def count():
+        with count_lock:
+            counter[0] += 1
+
+    coalescer = None
+    if use_db:
+        from db_connector import DBConnector, queries
+        from db_connector.coalescer import WriteCoalescer
+        from db_connector.live_cache import LiveEventCache
+
+        conn = DBConnector()
+        cache = LiveEventCache()
+        coalescer = WriteCoalescer(lambda event, event_type, prev=None:
+                                   conn.execute_query(queries.upsert_live_sensor_event_core, event, event_type,
+                                                      prev, cache=cache))
+        coalescer.start()
+
+        def on_co2(event):
+            conn.execute_query(queries.add_aux_sensor_data, event)
+            count()
+    else:
+        def on_co2(event):
+            count()
+
+    def on_heartbeat(event):
+        if coalescer is not None:
+            coalescer.heartbeat_packet(event)
+        count()
+
+    def on_data(event):
+        if coalescer is not None:
+            coalescer.data_packet(event)
+        count()
+
+    def on_summary(event, prev_event):
+        if coalescer is not None:
+            coalescer.event_summary_packet(event, prev_event)
+        count()
+        simulator.stroke_processed(event)
+
+    callbacks = {
+        "on_heartbeat_packet": on_heartbeat,
+        "on_data_packet": on_data,
+        "on_event_summary_packet": on_summary,
+        "on_co2_packet": on_co2,
+    }
+    return callbacks, lambda: counter[0], coalescer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulates a fleet of LoRa valve sensors")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--broker", help="Publish to this MQTT broker host")
+    target.add_argument("--direct", action="store_true", help="Deliver to an in-process client, without a broker")
+    parser.add_argument("--port", type=int, default=1883, help="MQTT broker port")
+    parser.add_argument("--qos", type=int, default=2, choices=(0, 1, 2), help="Publish QoS")
+    parser.add_argument("--no-consumer", action="store_true", help="Only publish, the backend runs elsewhere")
+    parser.add_argument("--devices", type=int, default=10, help="Number of virtual sensors")
+    parser.add_argument("--duration", type=float, default=60.0, help="Simulated time in seconds")
+    parser.add_argument("--speed", type=float, default=1.0, help="Simulated seconds per second, 0 for flat out")
+    parser.add_argument("--stroke-interval", type=float, default=10.0, help="Seconds between strokes of a sensor")
+    parser.add_argument("--packet-interval", type=float, default=0.1, help="Seconds between messages of a stroke")
+    parser.add_argument("--packets", type=int, default=20, help="Data records per stroke")
+    parser.add_argument("--samples", type=int, default=50, help="Torque samples per data record")
+    parser.add_argument("--loss", type=float, default=0.0, help="Probability of losing a message")
+    parser.add_argument("--duplication", type=float, default=0.0, help="Probability of duplicating a message")
+    parser.add_argument("--co2-sensors", type=int, default=0, help="Number of virtual CO2 sensors")
+    parser.add_argument("--co2-interval", type=float, default=60.0, help="Seconds between messages of a CO2 sensor")
+    parser.add_argument("--workers", type=int, help="Ingest worker threads (defaults to MQTT_INGEST_WORKERS)")
+    parser.add_argument("--db", action="store_true", help="Write events to the database (POSTGRES_* variables)")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="Seconds to wait for processing to finish")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+    if args.direct and args.no_consumer:
+        parser.error("--direct delivers to the in-process consumer, it can not be used with --no-consumer")
+
+    logging.basicConfig(level=logging.ERROR, force=True)
+    simulator = FleetSimulator(args.devices, args.stroke_interval, args.packet_interval, args.packets, args.samples,
+                               args.loss, args.duplication, args.co2_sensors, args.co2_interval, args.seed)
+
+    # Ingest path under test
+    from mqtt_client import ThreadedMQTTClient
+    client, coalescer, processed = None, None, lambda: 0
+    if not args.no_consumer:
+        callbacks, processed, coalescer = _backend_callbacks(simulator, args.db)
+        client = ThreadedMQTTClient(**callbacks, ingest_workers=args.workers)
+        logging.getLogger().setLevel(logging.ERROR)     # DBConnector enables debug logging, duplicates log warnings
+
+    if args.direct:
+        userdata = client.prepare()
+
+        def publish(topic, payload):
+            client.deliver(userdata, topic, payload)
+    else:
+        import paho.mqtt.client as mqtt
+        username, password = getenv("MQTT_USERNAME"), getenv("MQTT_PASSWORD")
+        if client is not None:
+            client.broker, client.broker_port = args.broker, args.port
+            client.start()
+            sleep(1)    # Let the client subscribe
+        publisher = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        publisher.username_pw_set(username, password)
+        publisher.connect(args.broker, args.port)
+        publisher.loop_start()
+
+        def publish(topic, payload):
+            publisher.publish(topic, payload, qos=args.qos)
+
+    print(f"Simulating {args.devices} sensors for {args.duration} s")
+    start = monotonic()
+    simulator.run(publish, args.duration, args.speed)
+    if client is not None and not simulator.wait(args.drain_timeout):
+        print(f"Timed out waiting for processing after {args.drain_timeout} s")
+    if client is not None and client.ingest is not None:
+        client.ingest.stop(args.drain_timeout)
+    if coalescer is not None:
+        coalescer.stop()
+    elapsed = monotonic() - start
+
+    report = simulator.report(elapsed, processed())
+    for key, value in report.items():
+        print(f"{key:<20} {value:.4f}" if isinstance(value, float) else f"{key:<20} {value}")
+    if coalescer is not None:
+        print(f"{'db_writes':<20} {coalescer.stats()['writes']}")
+    if client is not None and client.ingest is not None:
+        print(f"{'ingest':<20} {client.ingest_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Torque Decoding Module
+
+This module provides bulk decoding of the signed 16-bit little-endian torque samples found in data records (port 13).
+A whole record is turned into samples in one call, instead of one `unpack` call (and one slice) per sample.
+
+Two backends are available:
+- `array`: Standard library only. Uses `memoryview.cast` on little-endian hosts and `array('h')` otherwise.
+- `numpy`: Uses `numpy.frombuffer`. Optional, numpy is only imported when this backend is selected.
+
+Date:
+    October 2026
+"""
+
+import sys
+from array import array
+from os import getenv
+from typing import List
+
+
+# Default backend, may be overridden per call
+TORQUE_DECODE_BACKEND = getenv("TORQUE_DECODE_BACKEND", "array")
+
+# Data record layout: 2 byte packet sequence, n * 2 byte samples, 2 byte CRC
+DATA_RECORD_HEADER_SIZE = 2
+DATA_RECORD_CRC_SIZE = 2
+SAMPLE_SIZE = 2
+
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def data_record_sample_count(length: int) -> int:
+    """
+    Returns the number of whole torque samples in a data record.
+
+    Args:
+        length (int): Length of the data record in bytes, including packet sequence and CRC.
+
+    Returns:
+        int: Number of samples.
+    """
+    return max(0, (length - DATA_RECORD_HEADER_SIZE - DATA_RECORD_CRC_SIZE) // SAMPLE_SIZE)
+
+
+def torque_sample_bytes(data: bytes) -> memoryview:
+    """
+    Returns a zero-copy view over the sample bytes of a data record.
+
+    Args:
+        data (bytes): Data record, including packet sequence and CRC.
+
+    Returns:
+        memoryview: View over the samples (little-endian int16).
+    """
+    count = data_record_sample_count(len(data))
+    return memoryview(data)[DATA_RECORD_HEADER_SIZE:DATA_RECORD_HEADER_SIZE + count * SAMPLE_SIZE]
+
+
+def decode_torque_array(data: bytes) -> array:
+    """
+    Decodes the samples of a data record into an `array('h')`.
+
+    Args:
+        data (bytes): Data record, including packet sequence and CRC.
+
+    Returns:
+        array: Signed 16-bit torque samples.
+    """
+    samples = array("h")
+    samples.frombytes(torque_sample_bytes(data))
+    if not _LITTLE_ENDIAN:
+        samples.byteswap()
+    return samples
+
+
+def decode_torque_samples(data: bytes, backend: str = None) -> List[int]:
+    """
+    Decodes the samples of a data record into a list.
+
+    Args:
+        data (bytes): Data record, including packet sequence and CRC.
+        backend (str, optional): `array` or `numpy`. Defaults to `TORQUE_DECODE_BACKEND`.
+
+    Raises:
+        ValueError: Raised when the backend is not recognized.
+
+    Returns:
+        List[int]: Signed 16-bit torque samples.
+    """
+    backend = backend or TORQUE_DECODE_BACKEND
+
+    if backend == "array":
+        if _LITTLE_ENDIAN:
+            return torque_sample_bytes(data).cast("h").tolist()
+        return decode_torque_array(data).tolist()
+    elif backend == "numpy":
+        import numpy as np
+        count = data_record_sample_count(len(data))
+        return np.frombuffer(data, dtype="<i2", count=count, offset=DATA_RECORD_HEADER_SIZE).tolist()
+
+    raise ValueError(f"Unrecognized torque decode backend {backend}")
+
+
+def pack_torque_samples(samples: array) -> bytes:
+    """
+    Encodes torque samples as they are sent in data records (used to store one row per data record).
+
+    Args:
+        samples (array): Signed 16-bit torque samples, `array('h')`.
+
+    Returns:
+        bytes: Little-endian int16 samples.
+    """
+    if _LITTLE_ENDIAN:
+        return samples.tobytes()
+    samples = array("h", samples)
+    samples.byteswap()
+    return samples.tobytes()
+
+
+def unpack_torque_samples(data: bytes) -> List[int]:
+    """
+    Decodes samples encoded with `pack_torque_samples`.
+
+    Args:
+        data (bytes): Little-endian int16 samples.
+
+    Returns:
+        List[int]: Signed 16-bit torque samples.
+    """
+    if _LITTLE_ENDIAN:
+        return memoryview(data).cast("h").tolist()
+    samples = array("h", data)
+    samples.byteswap()
+    return samples.tolist()
@@ -3,6 +3,7 @@ import os
 from os.path import join
 from flask import Flask
 from api_v1 import api_v1
+from mqtt_client.capture import topic_from_filename
 
 SAMPLE_DATA="tests/sample_data"  # Bray TAMU capstone firmware
 
@@ -26,10 +27,9 @@ def client():
 
 @pytest.fixture
 def event_heartbeat_packet_payload():
-    filepath = join(SAMPLE_DATA, "original/1729792596.4154148.sensors_39-32-30-31-79-30-6f-02_port_12.data")
-    _, _, name, _ = filepath.split(".")
-    topic = "/".join(name.split("_"))
-    yield topic, open(filepath, "rb").read()
+    filename = "1729792596.4154148.sensors_39-32-30-31-79-30-6f-02_port_12.data"
+    _, topic = topic_from_filename(filename)
+    yield topic, open(join(SAMPLE_DATA, "original", filename), "rb").read()
 
 
 @pytest.fixture
@@ -41,11 +41,9 @@ def event_data_packet_payloads():
         filepath = os.path.join(folderpath, filename)
         if not os.path.isfile(filepath):
             continue
-        _, _, name, _ = filename.split(".")
-        topic = "/".join(name.split("_"))
-        port = name.split("_")[-1]
+        _, topic = topic_from_filename(filename)
 
-        if port == "13":
+        if topic.endswith("/13"):
             topic_payloads.append((topic, open(filepath, "rb").read()))
     
     yield topic_payloads
@@ -53,10 +51,9 @@ def event_data_packet_payloads():
 
 @pytest.fixture
 def event_summary_packet_payload():
-    filepath = join(SAMPLE_DATA, "original/1729792706.9500625.sensors_39-32-30-31-79-30-6f-02_port_14.data")
-    _, _, name, _ = filepath.split(".")
-    topic = "/".join(name.split("_"))
-    yield topic, open(filepath, "rb").read()
+    filename = "1729792706.9500625.sensors_39-32-30-31-79-30-6f-02_port_14.data"
+    _, topic = topic_from_filename(filename)
+    yield topic, open(join(SAMPLE_DATA, "original", filename), "rb").read()
 
 
 @pytest.fixture
@@ -13,6 +13,16 @@ def test_sensors(client):
     assert len(response.json) == 1
 
 
+def test_sensors_paginated(client):
+    sensors = client.get("/api_v1/sensors").json
+    response = client.get(f"/api_v1/sensors?limit=1&after_id={sensors[0]['id'] - 1}&prefix={sensors[0]['devEUI'][:4]}")
+
+    assert response.status_code == 200
+    assert response.json == sensors[:1]
+    assert {"numEvents", "lastEventTimestamp", "isStreaming"} <= set(response.json[0])
+    assert client.get("/api_v1/sensors?limit=-1").status_code == 400
+
+
 def test_events_happy(client):
     response = client.get("/api_v1/sensors/1/events")
     
@@ -43,6 +53,68 @@ def test_events_last_n(client, n_events, expected_n_events):
     assert len(response.json["temperatures"]) == expected_n_events
 
 
+@pytest.mark.parametrize("resolution", ["hour", "day"])
+def test_trends(client, resolution):
+    response = client.get(f"/api_v1/sensors/1/trends?resolution={resolution}&start=2024-01-01T00:00:00")
+
+    assert response.status_code == 200
+    assert response.json["resolution"] == resolution
+    for trend in ("batteryVoltages", "maxTorques", "strokeTimes", "temperatures"):
+        assert set(response.json[trend]) == {"min", "max", "mean"}
+        assert len(response.json[trend]["mean"]) == len(response.json["buckets"]) == len(response.json["eventCounts"])
+
+
+@pytest.mark.parametrize("query", ["resolution=week", "start=yesterday"])
+def test_trends_invalid(client, query):
+    response = client.get(f"/api_v1/sensors/1/trends?{query}")
+
+    assert response.status_code == 400
+    assert "error" in response.json
+
+
+def test_event_page(client):
+    events = client.get("/api_v1/sensors/1/events").json["event_datas"]
+    response = client.get("/api_v1/sensors/1/events/page?limit=1")
+
+    assert response.status_code == 200
+    assert response.json["ids"] == [event["id"] for event in events[:1]]
+    for name in ("timestamps", "batteryVoltages", "maxTorques", "strokeTimes", "temperatures"):
+        assert len(response.json[name]) == len(response.json["ids"])
+    if events:
+        next_page = client.get(f"/api_v1/sensors/1/events/page?after_id={response.json['next_after_id']}").json
+        assert next_page["ids"] == [event["id"] for event in events[1:101]]
+
+
+@pytest.mark.parametrize("query", ["limit=0", "limit=1001", "since=yesterday"])
+def test_event_page_invalid(client, query):
+    response = client.get(f"/api_v1/sensors/1/events/page?{query}")
+
+    assert response.status_code == 400
+    assert "error" in response.json
+
+
+def test_events_between(client):
+    response = client.get("/api_v1/events?sensor_id=1&start=2024-01-01T00:00:00&end=2030-01-01T00:00:00&limit=5")
+
+    assert response.status_code == 200
+    assert len(response.json["ids"]) <= 5
+    assert set(response.json["sensorIDs"]) <= {1}
+    assert response.json["timestamps"] == sorted(response.json["timestamps"])
+    assert response.json["truncated"] == (len(response.json["ids"]) == 5)
+
+
+@pytest.mark.parametrize("query", [
+    "start=2024-01-01",
+    "start=2024-01-01&end=tomorrow",
+    "start=2024-01-01&end=2025-01-01&limit=0",
+])
+def test_events_between_invalid(client, query):
+    response = client.get(f"/api_v1/events?{query}")
+
+    assert response.status_code == 400
+    assert "error" in response.json
+
+
 def test_event(client):
     response = client.get("/api_v1/sensors/1/events/1")
     
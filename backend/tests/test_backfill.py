@@ -0,0 +1,64 @@
+from backfill import Backfill, BackfillState, assemble_source, find_sources
+from mqtt_client.capture import CaptureWriter
+from mqtt_client.simulator import FleetSimulator
+from mqtt_client.aux_sensor_event import AuxSensorEvent
+import pytest
+
+
+def write_capture(path, seed: int, duration: float = 5) -> int:
+    simulator = FleetSimulator(devices=3, stroke_interval=1, packet_interval=0.01, packets_per_stroke=4,
+                               co2_sensors=1, co2_interval=2, seed=seed)
+    with CaptureWriter(str(path)) as writer:
+        for at, topic, payload in simulator.schedule(duration):
+            writer.append(1000.0 + at, topic, payload)
+    return simulator.strokes_sent
+
+
+class TestBackfill:
+    @pytest.fixture
+    def sources(self, tmp_path):
+        strokes = [write_capture(tmp_path / "captures" / f"day{i}", seed=i) for i in range(3)]
+        (tmp_path / "captures" / "dump").mkdir()
+        (tmp_path / "captures" / "dump" / "1000.5.sensors_dev-a_port_12.data").write_bytes(bytes(96))
+        yield find_sources([str(tmp_path / "captures")]), strokes
+
+    def test_find_sources(self, sources):
+        paths, _ = sources
+
+        assert [path.rsplit("/", 1)[1] for path in paths] == ["day0", "day1", "day2", "dump"]
+
+    def test_assemble_source(self, sources):
+        paths, strokes = sources
+        result = assemble_source(paths[0])
+        sensor_items = [item for item in result.items if isinstance(item, tuple)]
+        devEUIs = [sensor_event.devEUI for _, sensor_event in sensor_items]
+
+        assert len(sensor_items) == strokes[0] and result.incomplete == 0 and result.errors == 0
+        assert devEUIs == sorted(devEUIs)
+        assert all(a[0] < b[0] for a, b in zip(sensor_items, sensor_items[1:]) if a[1].devEUI == b[1].devEUI)
+        assert any(isinstance(item, AuxSensorEvent) for item in result.items)
+        assert assemble_source(paths[3]).incomplete == 1
+
+    def test_resume(self, sources, tmp_path):
+        paths, _ = sources
+        expected = sum(len(assemble_source(path).items) for path in paths)
+        state_path = str(tmp_path / "state.json")
+        inserted = []
+
+        def failing_insert(items):
+            if len(inserted) >= 12:
+                raise RuntimeError("Database went away")
+            inserted.extend(items)
+
+        with pytest.raises(RuntimeError):
+            Backfill(failing_insert, BackfillState(state_path), batch_size=4, workers=0).run(paths)
+
+        stats = Backfill(inserted.extend, BackfillState(state_path), batch_size=4, workers=2).run(paths)
+        assert len(inserted) == expected
+        assert stats["sources_done"] == stats["sources_total"] == 4
+        assert all(BackfillState(state_path).done(path) for path in paths)
+        assert Backfill(inserted.extend, BackfillState(state_path)).run(paths)["events"] == 0
+
+    def test_invalid_batch_size(self):
+        with pytest.raises(ValueError):
+            Backfill(print, batch_size=0)
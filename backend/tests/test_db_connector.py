@@ -0,0 +1,659 @@
+from db_connector.coalescer import WriteCoalescer, HEARTBEAT_EVENT, DATA_EVENT, EVENT_SUMMARY_EVENT, DEVICE_LOCKS
+from db_connector import DBConnector, partitions, queries
+from db_connector.live_cache import LiveEventCache, LiveEventKeys
+from db_connector.torque_codec import encode_torque, decode_torque
+from db_connector.rollups import bucket_start, rollup_rows, rebuild_rollups, TREND_METRICS
+from db_connector.models import Base, Event, Sensor, DataRecord, DeviceInfo, HourlyTrendRollup, DailyTrendRollup
+from mqtt_client.sensor_event import SensorEvent
+from mqtt_client.simulator import VirtualDevice
+from datetime import datetime
+import random
+from sqlalchemy import select, desc, func, event as sqlalchemy_event
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+import pytest
+
+
+def sensor_event(devEUI: str) -> SensorEvent:
+    event = SensorEvent()
+    event.devEUI = devEUI
+    return event
+
+
+def columns(entity) -> dict:
+    return {column.key: getattr(entity, column.key) for column in entity.__table__.columns if column.key != "id"}
+
+
+class TestWriteCoalescer:
+    @pytest.fixture
+    def writes(self):
+        yield []
+
+    @pytest.fixture
+    def coalescer(self, writes):
+        yield WriteCoalescer(lambda event, event_type, prev=None: writes.append((event.devEUI, event_type)),
+                             max_packets=4, interval=1.0)
+
+    def test_max_packets(self, coalescer, writes):
+        event = sensor_event("dev-a")
+        for _ in range(10):
+            coalescer.data_packet(event, now=0.0)
+
+        assert writes == [("dev-a", DATA_EVENT)] * 2
+        assert coalescer.stats() == {"packets": 10, "writes": 2, "pending_devices": 1, "pending_packets": 2}
+
+    def test_interval(self, coalescer, writes):
+        event = sensor_event("dev-a")
+        coalescer.data_packet(event, now=0.0)
+        coalescer.data_packet(event, now=0.5)
+        assert writes == []
+
+        coalescer.data_packet(event, now=1.0)
+        assert writes == [("dev-a", DATA_EVENT)]
+
+    def test_heartbeat_and_summary_flush(self, coalescer, writes):
+        event = sensor_event("dev-a")
+        coalescer.heartbeat_packet(event)
+        coalescer.data_packet(event, now=0.0)
+        coalescer.data_packet(event, now=0.0)
+        coalescer.event_summary_packet(event)
+
+        # Buffered packets of the same event are written with the summary
+        assert writes == [("dev-a", HEARTBEAT_EVENT), ("dev-a", EVENT_SUMMARY_EVENT)]
+        assert coalescer.stats()["pending_devices"] == 0
+
+    def test_replaced_event_flushed(self, coalescer, writes):
+        old_event, new_event = sensor_event("dev-a"), sensor_event("dev-a")
+        coalescer.data_packet(old_event, now=0.0)
+        coalescer.heartbeat_packet(new_event)
+
+        assert writes == [("dev-a", DATA_EVENT), ("dev-a", HEARTBEAT_EVENT)]
+
+    def test_flush_idle(self, coalescer, writes):
+        a, b = sensor_event("dev-a"), sensor_event("dev-b")
+        coalescer.data_packet(a, now=0.0)
+        coalescer.data_packet(b, now=0.0)
+        assert coalescer.flush_idle(now=0.5) == 0
+        assert coalescer.flush_idle(now=2.0) == 2
+        assert sorted(writes) == [("dev-a", DATA_EVENT), ("dev-b", DATA_EVENT)]
+
+    def test_stop_flushes(self, coalescer, writes):
+        coalescer.start()
+        coalescer.data_packet(sensor_event("dev-a"))
+        coalescer.stop()
+
+        assert writes == [("dev-a", DATA_EVENT)]
+
+    def test_idle_flush_writes_snapshot(self):
+        written = []
+        coalescer = WriteCoalescer(lambda event, event_type, prev=None: written.append(event), max_packets=4)
+        device = VirtualDevice("dev-a", random.Random(0), packets_per_stroke=3, samples_per_packet=4)
+        messages = device.stroke()
+        event = SensorEvent()
+        for topic, payload in messages[:2]:
+            event.parse_from_data(topic, payload)
+        coalescer.data_packet(event, now=0.0)
+
+        # The next packet is being parsed while the idle flush runs
+        event.parse_from_data(*messages[2])
+        coalescer.flush_idle(now=2.0)
+
+        assert written[0] is not event
+        assert written[0].packet_count == 1 and event.packet_count == 2
+
+    def test_device_locks_bounded(self, coalescer, writes):
+        # Devices seen once do not leave a lock behind
+        for i in range(1000):
+            coalescer.heartbeat_packet(sensor_event(f"dev-{i}"))
+
+        assert len(coalescer._device_locks) == DEVICE_LOCKS
+        assert coalescer._device_lock("dev-1") is coalescer._device_lock("dev-1")
+
+    def test_invalid_settings(self):
+        with pytest.raises(ValueError):
+            WriteCoalescer(lambda *args: None, max_packets=0)
+
+
+class TestLiveEventCache:
+    def test_lru(self):
+        cache = LiveEventCache(max_entries=2)
+        cache.put("dev-a", 1, LiveEventKeys(1, 1, 1, 1, 1))
+        cache.put("dev-b", 2, LiveEventKeys(2, 1, 2, 2, 2))
+        assert cache.get("dev-a", 1).event_id == 1
+        cache.put("dev-c", 3, LiveEventKeys(3, 1, 3, 3, 3))
+        assert cache.get("dev-b", 2) is None
+        assert cache.get("dev-a", 2) is None
+        assert len(cache) == 2
+        assert cache.stats() == {"entries": 2, "hits": 1, "misses": 2, "stale": 0}
+
+    def test_discard(self):
+        cache = LiveEventCache()
+        cache.put("dev-a", 1, LiveEventKeys(1, 1, 1, 1, 1))
+        cache.discard("dev-a", 1, stale=True)
+        cache.discard("dev-a", 1, stale=True)
+        assert cache.get("dev-a", 1) is None
+        assert cache.stats()["stale"] == 1
+
+    def test_invalid_settings(self):
+        with pytest.raises(ValueError):
+            LiveEventCache(max_entries=0)
+
+
+class TestTorqueCodec:
+    SAMPLES = [0, 5, -3, 32767, -32768, 32767, -1, 100, 101, 102]
+
+    @pytest.mark.parametrize("encoding", ["raw", "delta-zlib"])
+    def test_round_trip(self, encoding):
+        assert decode_torque(encode_torque(self.SAMPLES, encoding)) == self.SAMPLES
+        assert decode_torque(memoryview(encode_torque([], encoding)).cast("c")) == []
+
+    def test_lz4(self):
+        pytest.importorskip("lz4")
+        assert decode_torque(encode_torque(self.SAMPLES, "delta-lz4")) == self.SAMPLES
+
+    def test_sizes(self):
+        ramp = list(range(0, 6000, 3))
+        assert len(encode_torque(ramp, "raw")) == 1 + 2 * len(ramp)
+        assert len(encode_torque(ramp, "delta-zlib")) < len(ramp) // 10
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            encode_torque(self.SAMPLES, "zstd")
+        with pytest.raises(ValueError):
+            decode_torque(b"\xff")
+
+
+@pytest.fixture
+def session():
+    # Nothing is committed, the tables are left as they were
+    with DBConnector().Session() as session:
+        session.begin()
+        yield session
+        session.rollback()
+
+
+class TestQueries:
+    def test_add_sensor_events_bulk_sensors(self, session):
+        events = [sensor_event(devEUI) for devEUI in ("bulk-a", "bulk-b", "bulk-a")]
+        timestamps = [datetime(2025, 1, 1, hour) for hour in range(3)]
+        queries.add_sensor_events_bulk(session, events, timestamps)
+
+        sensors = session.scalars(select(Sensor).where(Sensor.devEUI.in_(["bulk-a", "bulk-b"]))).all()
+        added = session.scalars(select(Event).where(Event.sensorID.in_([sensor.id for sensor in sensors]))
+                                .order_by(Event.id)).all()
+        assert len(sensors) == 2
+        assert [event.timestamp for event in added] == timestamps
+        assert [event.sensor.devEUI for event in added] == ["bulk-a", "bulk-b", "bulk-a"]
+        assert all(not event.isStreaming and event.deviceData.torqueData == [] for event in added)
+
+    def test_add_sensor_events_bulk(self, session):
+        device = VirtualDevice("bulk-c", random.Random(0), packets_per_stroke=3, samples_per_packet=4)
+        events = []
+        for i in range(3):
+            event = SensorEvent()
+            for topic, payload in device.stroke():
+                if not (i == 1 and topic.endswith("/13") and payload[0] == 2):   # Lose packet 2 of the second event
+                    event.parse_from_data(topic, payload)
+            events.append(event)
+        events[2].hiddenDataIndices = [3]
+        queries.add_sensor_event(session, events[0])
+        session.flush()
+
+        ids = queries.add_sensor_events_bulk(session, events, [datetime(2025, 1, 1, hour) for hour in range(3)])
+        added = [session.get(Event, id) for id in ids]
+        orm_event = session.scalars(select(Event).where(Event.id < ids[0]).order_by(desc(Event.id))).first()
+
+        assert ids == sorted(ids)
+        assert len({event.sensorID for event in added} | {orm_event.sensorID}) == 1
+        assert [event.timestamp.hour for event in added] == [0, 1, 2]
+        assert columns(added[0].deviceData) == columns(orm_event.deviceData)
+        assert columns(added[0].deviceInfo) == columns(orm_event.deviceInfo)
+        assert columns(added[0].deviceTrendInfo) == columns(orm_event.deviceTrendInfo)
+        assert added[1].deviceData.dataRecordPayloadCRCs[1] is None
+        assert added[1].deviceData.recordNumbers == [1, -1, 3]
+        assert added[2].deviceData.hiddenDataIndices == [3]
+
+    @pytest.mark.parametrize("count", [0, 2])
+    def test_add_sensor_events_bulk_timestamp_count(self, session, count):
+        with pytest.raises(ValueError):
+            queries.add_sensor_events_bulk(session, [sensor_event("bulk-d")], [datetime(2025, 1, 1)] * count)
+
+    def test_upsert_live_sensor_event_cache(self, session):
+        device = VirtualDevice("live-a", random.Random(0), packets_per_stroke=3, samples_per_packet=4)
+        cache = LiveEventCache()
+        event = SensorEvent()
+        for topic, payload in device.stroke():
+            event.parse_from_data(topic, payload)
+            event_type = int(topic[-2:]) - 12
+            queries.upsert_live_sensor_event(session, event, event_type, cache=cache)
+            if event_type == 0:
+                keys = cache.get(event.devEUI, event.heartbeatRecordPayloadCRC)
+                assert keys is not None
+            session.flush()
+
+        # Created by the heartbeat, updated through the cache and dropped by the event summary
+        live_event = session.get(Event, keys.event_id)
+        assert cache.stats() == {"entries": 0, "hits": 5, "misses": 1, "stale": 0}
+        assert not live_event.isStreaming
+        assert live_event.deviceDataID == keys.device_data_id
+        assert live_event.deviceData.recordNumbers == [1, 2, 3]
+        assert live_event.deviceTrendInfo.maxTorque == event.maxTorque
+
+    def test_upsert_live_sensor_event_stale_cache(self, session):
+        event = SensorEvent()
+        for topic, payload in VirtualDevice("live-b", random.Random(0)).stroke()[:2]:
+            event.parse_from_data(topic, payload)
+        queries.upsert_live_sensor_event(session, event, 0)
+        session.flush()
+
+        # The cached event does not exist (e.g. rolled back), the live event is searched for instead
+        cache = LiveEventCache()
+        cache.put(event.devEUI, event.heartbeatRecordPayloadCRC, LiveEventKeys(-1, -1, -1, -1, -1))
+        queries.upsert_live_sensor_event(session, event, 1, cache=cache)
+        session.flush()
+
+        live_event = session.scalars(select(Event).join(Event.sensor).where(Sensor.devEUI == "live-b")).one()
+        assert cache.stats()["stale"] == 1
+        assert len(cache) == 0
+        assert live_event.isStreaming
+        assert live_event.deviceData.recordNumbers == [1]
+
+    def test_upsert_live_sensor_event_core(self, session):
+        messages = VirtualDevice("live-c", random.Random(0), packets_per_stroke=3, samples_per_packet=4).stroke()
+        statements = []
+
+        def count(*args):
+            statements.append(args[2])
+
+        # Same packets through both paths, for two devices
+        cache = LiveEventCache()
+        connection = session.connection()
+        sqlalchemy_event.listen(connection, "before_cursor_execute", count)
+        try:
+            for upsert, devEUI in ((queries.upsert_live_sensor_event, "live-c"),
+                                   (queries.upsert_live_sensor_event_core, "live-d")):
+                event = SensorEvent()
+                for topic, payload in messages:
+                    event.parse_from_data(topic.replace("live-c", devEUI), payload)
+                    statements.clear()
+                    upsert(session, event, int(topic[-2:]) - 12, cache=cache)
+                    session.flush()
+        finally:
+            sqlalchemy_event.remove(connection, "before_cursor_execute", count)
+
+        session.expire_all()    # Core updates bypass the loaded entities
+        orm_event, core_event = [session.scalars(select(Event).join(Event.sensor).where(Sensor.devEUI == devEUI)).one()
+                                 for devEUI in ("live-c", "live-d")]
+        # Event summary of a cached event, plus adding the closed event to the rollups and sensor counters
+        assert len([statement for statement in statements
+                    if "trend_rollups" not in statement and not statement.startswith("UPDATE sensors")]) == 1
+        assert len(cache) == 0
+        assert not core_event.isStreaming
+        assert columns(core_event.deviceData) == columns(orm_event.deviceData)
+        assert columns(core_event.deviceInfo) == columns(orm_event.deviceInfo)
+        assert columns(core_event.deviceTrendInfo) == columns(orm_event.deviceTrendInfo)
+
+    def test_upsert_live_sensor_event_core_closed(self, session):
+        event = SensorEvent()
+        for topic, payload in VirtualDevice("live-e", random.Random(0)).stroke()[:2]:
+            event.parse_from_data(topic, payload)
+        cache = LiveEventCache()
+        queries.upsert_live_sensor_event_core(session, event, 0, cache=cache)
+        keys = cache.get(event.devEUI, event.heartbeatRecordPayloadCRC)
+        queries.upsert_live_sensor_event_core(session, event, 2, cache=cache)
+
+        # Writing to the closed event creates a new live event instead
+        cache.put(event.devEUI, event.heartbeatRecordPayloadCRC, keys)
+        queries.upsert_live_sensor_event_core(session, event, 1, cache=cache)
+        session.flush()
+        session.expire_all()    # Core updates bypass the loaded entities
+
+        added = session.scalars(select(Event).join(Event.sensor).where(Sensor.devEUI == "live-e")
+                                .order_by(Event.id)).all()
+        assert cache.stats()["stale"] == 1
+        assert [event.isStreaming for event in added] == [False, True]
+        assert cache.get(event.devEUI, event.heartbeatRecordPayloadCRC).event_id == added[1].id
+
+    def test_upsert_live_sensor_event_core_closed_concurrently(self, session, monkeypatch):
+        monkeypatch.setattr(queries, "TORQUE_STORAGE", "packets")
+        messages = self.stroke("live-f")
+        event = SensorEvent()
+        for topic, payload in messages[:2]:
+            event.parse_from_data(topic, payload)
+            queries.upsert_live_sensor_event_core(session, event, int(topic[-2:]) - 12)
+        keys = queries.find_live_event(session, event.devEUI, event.heartbeatRecordPayloadCRC)
+        queries.upsert_live_sensor_event_core(session, event, 2)
+
+        # The event is found live, then closed before it is written
+        monkeypatch.setattr(queries, "find_live_event", lambda *args: keys)
+        cache = LiveEventCache()
+        event.parse_from_data(*messages[2])
+        queries.upsert_live_sensor_event_core(session, event, 1, cache=cache)
+        session.flush()
+
+        assert cache.get(event.devEUI, event.heartbeatRecordPayloadCRC) is None
+        assert session.scalars(select(DataRecord.recordNumber).where(DataRecord.eventID == keys.event_id)).all() == [1]
+
+    def stroke(self, devEUI: str, lost: int = None) -> list:
+        device = VirtualDevice(devEUI, random.Random(0), packets_per_stroke=4, samples_per_packet=3)
+        return [(topic, payload) for topic, payload in device.stroke()
+                if not (topic.endswith("/13") and payload[0] == lost)]
+
+    def test_packet_storage(self, session, monkeypatch):
+        messages = self.stroke("packets-a", lost=2)
+        for storage, devEUI in (("array", "packets-a"), ("packets", "packets-b")):
+            monkeypatch.setattr(queries, "TORQUE_STORAGE", storage)
+            cache = LiveEventCache()
+            event = SensorEvent()
+            for topic, payload in messages:
+                event.parse_from_data(topic.replace("packets-a", devEUI), payload)
+                queries.upsert_live_sensor_event_core(session, event, int(topic[-2:]) - 12, cache=cache)
+        session.flush()
+
+        array_event, packet_event = [
+            queries.get_event(session, *session.execute(select(Event.sensorID, Event.id).join(Event.sensor)
+                                                        .where(Sensor.devEUI == devEUI)).one())
+            for devEUI in ("packets-a", "packets-b")
+        ]
+        session.expire_all()    # Core updates bypass the loaded entities
+        assert packet_event.deviceData.torqueData == []
+        assert [record.recordNumber for record in packet_event.dataRecords] == [1, 3, 4]
+        assert queries.event_packet_data(packet_event) == queries.event_packet_data(array_event)
+        assert queries.event_packet_data(packet_event)["recordNumbers"] == [1, -1, 3, 4]
+
+    def test_packet_storage_bulk(self, session, monkeypatch):
+        monkeypatch.setattr(queries, "TORQUE_STORAGE", "packets")
+        event = SensorEvent()
+        for topic, payload in self.stroke("packets-c", lost=3):
+            event.parse_from_data(topic, payload)
+
+        orm_event = queries.add_sensor_event(session, event)
+        session.flush()
+        bulk_event = session.get(Event, queries.add_sensor_events_bulk(session, [event])[0])
+
+        assert len(bulk_event.dataRecords) == 3
+        assert queries.event_packet_data(bulk_event) == queries.event_packet_data(orm_event)
+        assert queries.event_packet_data(bulk_event)["torqueData"] == event.flatten_torque()[0]
+
+    def test_write_data_records(self, session, monkeypatch):
+        monkeypatch.setattr(queries, "TORQUE_STORAGE", "packets")
+        event = SensorEvent()
+        messages = self.stroke("packets-d")
+        for topic, payload in messages[:-2]:
+            event.parse_from_data(topic, payload)
+        queries.add_sensor_event(session, event)
+        session.flush()
+        event_id = session.scalars(select(DataRecord.eventID).join(DataRecord.event).join(Event.sensor)
+                                   .where(Sensor.devEUI == "packets-d")).first()
+
+        # Only the packets that are not stored yet are sent
+        written = {packet_seq: event.packet_hash(packet_seq) for packet_seq in range(1, event.packet_count + 1)}
+        event.parse_from_data(*messages[-2])
+        assert queries.write_data_records(session, event_id, event, written) == 1
+        assert queries.write_data_records(session, event_id, event) == 4
+        assert session.scalar(select(DataRecord.recordNumber).where(DataRecord.eventID == event_id)
+                              .order_by(desc(DataRecord.recordNumber))) == 4
+
+    def test_torque_encoding(self, session, monkeypatch):
+        event = SensorEvent()
+        for topic, payload in self.stroke("packed-a", lost=2):
+            event.parse_from_data(topic, payload)
+        array_event = queries.add_sensor_event(session, event)
+        monkeypatch.setattr(queries, "TORQUE_ENCODING", "delta-zlib")
+        orm_event = queries.add_sensor_event(session, event)
+        session.flush()
+        bulk_event = session.get(Event, queries.add_sensor_events_bulk(session, [event])[0])
+
+        for packed_event in (orm_event, bulk_event):
+            assert packed_event.deviceData.torqueData == []
+            assert decode_torque(packed_event.deviceData.torqueDataPacked) == event.flatten_torque()[0]
+            assert queries.event_packet_data(packed_event) == queries.event_packet_data(array_event)
+
+        monkeypatch.setattr(queries, "TORQUE_ENCODING", "lzma")
+        with pytest.raises(ValueError):
+            queries.add_sensor_event(session, event)
+
+    def test_torque_encoding_live(self, session, monkeypatch):
+        monkeypatch.setattr(queries, "TORQUE_ENCODING", "raw")
+        cache = LiveEventCache()
+        event = SensorEvent()
+        for topic, payload in self.stroke("packed-b"):
+            event.parse_from_data(topic, payload)
+            queries.upsert_live_sensor_event_core(session, event, int(topic[-2:]) - 12, cache=cache)
+        session.flush()
+        session.expire_all()    # Core updates bypass the loaded entities
+
+        live_event = queries.get_event(session, *session.execute(select(Event.sensorID, Event.id).join(Event.sensor)
+                                                                 .where(Sensor.devEUI == "packed-b")).one())
+        assert live_event.deviceData.torqueData == []
+        assert queries.event_packet_data(live_event)["torqueData"] == event.flatten_torque()[0]
+
+    def test_get_events_time_range(self, session):
+        events = [sensor_event("range-a") for _ in range(3)]
+        queries.add_sensor_events_bulk(session, events, [datetime(2025, month, 1) for month in (1, 2, 3)])
+        session.flush()
+        sensor_id = session.scalar(select(Sensor.id).where(Sensor.devEUI == "range-a"))
+
+        assert len(queries.get_events(session, sensor_id)) == 3
+        assert [event.timestamp.month for event in
+                queries.get_events(session, sensor_id, start=datetime(2025, 2, 1))] == [2, 3]
+        assert [event.timestamp.month for event in
+                queries.get_events(session, sensor_id, datetime(2025, 1, 15), datetime(2025, 3, 1))] == [2]
+
+    def test_sensor_counters(self, session):
+        device = VirtualDevice("counters-a", random.Random(0), packets_per_stroke=3, samples_per_packet=4)
+        cache = LiveEventCache()
+        queries.add_sensor_events_bulk(session, [sensor_event("counters-a")] * 3,
+                                       [datetime(2025, 1, 1), datetime(2025, 1, 3), None])
+        queries.add_sensor_event(session, sensor_event("counters-a"), datetime(2025, 1, 2))
+
+        def summary():
+            session.flush()
+            return session.execute(select(Sensor.eventCount, Sensor.isStreaming)
+                                   .where(Sensor.devEUI == "counters-a")).one()
+
+        # Live until the event summary, older events do not change the status
+        event = SensorEvent()
+        for topic, payload in device.stroke():
+            event.parse_from_data(topic, payload)
+            queries.upsert_live_sensor_event_core(session, event, int(topic[-2:]) - 12, cache=cache)
+            if topic.endswith("/12"):
+                assert tuple(summary()) == (5, True)
+                queries.add_sensor_event(session, sensor_event("counters-a"), datetime(2025, 1, 4))
+                assert tuple(summary()) == (6, True)
+        assert tuple(summary()) == (6, False)
+
+        last_event = session.scalar(select(func.max(Event.timestamp)).join(Event.sensor)
+                                    .where(Sensor.devEUI == "counters-a"))
+        summaries = queries.get_sensor_summaries(session, "counters-")
+        assert [(row.devEUI, row.eventCount, row.lastEventTimestamp) for row in summaries] == [
+            ("counters-a", 6, last_event)]
+
+    def test_get_sensor_summaries(self, session):
+        queries.add_sensor_events_bulk(session, [sensor_event(devEUI) for devEUI in
+                                                 ("page-a", "page-b", "page-c", "page-c", "pagex_d", "page%e")])
+
+        first = queries.get_sensor_summaries(session, "page-", limit=2)
+        rest = queries.get_sensor_summaries(session, "page-", after_id=first[-1].id)
+        assert [row.devEUI for row in first + rest] == ["page-a", "page-b", "page-c"]
+        assert [row.eventCount for row in first + rest] == [1, 1, 2]
+        assert [row.devEUI for row in queries.get_sensor_summaries(session, "page%")] == ["page%e"]
+        assert [row.devEUI for row in queries.get_sensor_summaries(session, "page_")] == []
+
+    def test_get_event_columns(self, session):
+        events = []
+        for max_torque in range(5):
+            events.append(sensor_event("columns-a"))
+            events[-1].maxTorque = max_torque
+        ids = queries.add_sensor_events_bulk(session, events, [datetime(2025, 1, day) for day in range(1, 6)])
+        sensor_id = session.scalar(select(Sensor.id).where(Sensor.devEUI == "columns-a"))
+
+        page = queries.get_event_columns(session, sensor_id, limit=2)
+        next_page = queries.get_event_columns(session, sensor_id, after_id=page["ids"][-1], limit=2)
+        assert page["ids"] + next_page["ids"] == ids[:4]
+        assert page["maxTorques"] + next_page["maxTorques"] == [0, 1, 2, 3]
+        assert page["timestamps"] == [datetime(2025, 1, 1), datetime(2025, 1, 2)]
+        assert set(page) == {"ids", "timestamps", *queries.EVENT_TREND_COLUMNS}
+
+        assert queries.get_event_columns(session, sensor_id, limit=2, latest=True)["maxTorques"] == [3, 4]
+        assert queries.get_event_columns(session, sensor_id, since=datetime(2025, 1, 2),
+                                         before=datetime(2025, 1, 4))["ids"] == ids[1:3]
+        assert queries.get_event_columns(session, sensor_id, after_id=ids[-1])["ids"] == []
+
+    def test_get_events_between(self, session):
+        events = [sensor_event(devEUI) for devEUI in ("window-a", "window-b", "window-c", "window-a")]
+        ids = queries.add_sensor_events_bulk(session, events, [datetime(2001, 6, 1, hour) for hour in (3, 1, 2, 4)])
+        sensor_ids = dict(session.execute(select(Sensor.devEUI, Sensor.id).where(Sensor.devEUI.like("window-%"))).all())
+
+        window = queries.get_events_between(session, None, datetime(2001, 6, 1, 1), datetime(2001, 6, 1, 4))
+        assert window["ids"] == [ids[1], ids[2], ids[0]]    # Time order
+        assert window["sensorIDs"] == [sensor_ids[devEUI] for devEUI in ("window-b", "window-c", "window-a")]
+        assert set(window) == {"ids", "sensorIDs", "timestamps", *queries.EVENT_TREND_COLUMNS}
+
+        some = queries.get_events_between(session, [sensor_ids["window-a"], sensor_ids["window-c"]],
+                                          datetime(2001, 6, 1), datetime(2001, 6, 2))
+        assert some["ids"] == [ids[2], ids[0], ids[3]]
+        assert queries.get_events_between(session, [sensor_ids["window-a"]], datetime(2001, 6, 1),
+                                          datetime(2001, 6, 2), limit=1)["ids"] == [ids[0]]
+
+
+class TestPartitions:
+    def test_months(self):
+        assert partitions.month_start(datetime(2025, 3, 31, 23, 59)) == datetime(2025, 3, 1)
+        assert partitions.add_months(datetime(2025, 11, 1), 3) == datetime(2026, 2, 1)
+        assert partitions.add_months(datetime(2025, 1, 1), -1) == datetime(2024, 12, 1)
+        assert partitions.partition_name("events", datetime(2025, 3, 9)) == "events_2025_03"
+        with pytest.raises(ValueError):
+            partitions.create_partition(None, "sensors", datetime(2025, 3, 1))
+
+    def test_create_partition(self, session):
+        month = datetime(2001, 3, 1)
+        assert partitions.create_partition(session, "events", month)
+        assert not partitions.create_partition(session, "events", month)
+        assert ("events_2001_03", month) in partitions.list_partitions(session, "events")
+
+        created = partitions.create_upcoming_partitions(session, months=1, now=datetime(2001, 5, 20))
+        assert created == ["events_2001_05", "events_2001_06", "aux_sensor_data_2001_05", "aux_sensor_data_2001_06"]
+
+    def test_autogenerate_ignores_partitions(self, session):
+        partitions.create_partition(session, "events", datetime(2001, 3, 1))
+        partitions.create_partition(session, "aux_sensor_data", datetime(2001, 3, 1))
+        context = MigrationContext.configure(session.connection(), opts={"include_name": partitions.include_name})
+
+        diffs = [diff for diff in compare_metadata(context, Base.metadata) if isinstance(diff, tuple)]
+        assert not [diff for diff in diffs if "_2001_03" in str(diff[1])]
+        assert partitions.include_name("events_2001", "table", {})
+        assert not partitions.include_name("events_2001_03_timestamp_brin", "index", {"table_name": "events_2001_03"})
+
+    def test_drop_expired_partitions(self, session):
+        # Events of an old month get their partition on insert
+        live_event = sensor_event("retention-a")
+        live_event.isStreaming = True
+        queries.add_sensor_event(session, live_event, datetime(2001, 3, 9))
+        queries.add_sensor_events_bulk(session, [sensor_event("retention-b")] * 2,
+                                       [datetime(2001, 3, 10), datetime(2001, 4, 2)])
+        session.flush()
+        event = session.scalar(select(Event).join(Event.sensor).where(Sensor.devEUI == "retention-a"))
+        device_info_id = event.deviceInfoID
+        session.expunge_all()
+
+        assert partitions.drop_expired_partitions(session, 0, now=datetime(2001, 5, 1)) == []
+        assert partitions.drop_expired_partitions(session, 2, now=datetime(2001, 5, 1)) == []
+        assert partitions.drop_expired_partitions(session, 1, now=datetime(2001, 5, 1)) == ["events_2001_03"]
+        assert session.scalar(select(Event).join(Event.sensor).where(Sensor.devEUI == "retention-a")) is None
+        assert session.get(DeviceInfo, device_info_id) is None
+        assert tuple(session.execute(select(Sensor.eventCount, Sensor.lastEventTimestamp, Sensor.isStreaming)
+                                     .where(Sensor.devEUI == "retention-a")).one()) == (0, None, False)
+        assert tuple(session.execute(select(Sensor.eventCount, Sensor.lastEventTimestamp)
+                                     .where(Sensor.devEUI == "retention-b")).one()) == (1, datetime(2001, 4, 2))
+        with pytest.raises(ValueError):
+            partitions.drop_expired_partitions(session, -1)
+
+
+class TestRollups:
+    def closed_event(self, hour: int, minute: int, value: int) -> tuple:
+        return 1, datetime(2025, 1, 1, hour, minute), {metric: value for metric in TREND_METRICS}
+
+    def test_bucket_start(self):
+        assert bucket_start(datetime(2025, 3, 9, 14, 59, 1), "hour") == datetime(2025, 3, 9, 14)
+        assert bucket_start(datetime(2025, 3, 9, 14, 59, 1), "day") == datetime(2025, 3, 9)
+        with pytest.raises(ValueError):
+            bucket_start(datetime(2025, 3, 9), "week")
+
+    def test_rollup_rows(self):
+        closed_events = [self.closed_event(0, 5, 10), self.closed_event(0, 50, 30), self.closed_event(2, 0, 20)]
+        hourly = rollup_rows(closed_events, "hour")
+        daily = rollup_rows(closed_events, "day")
+
+        assert [(row["bucket"].hour, row["eventCount"]) for row in hourly] == [(0, 2), (2, 1)]
+        assert (hourly[0]["maxTorqueMin"], hourly[0]["maxTorqueMax"], hourly[0]["maxTorqueSum"]) == (10, 30, 40)
+        assert len(daily) == 1
+        assert (daily[0]["eventCount"], daily[0]["strokeTimeMin"], daily[0]["strokeTimeSum"]) == (3, 10, 60)
+
+    def rollups(self, session, devEUI: str, model=HourlyTrendRollup) -> list:
+        session.flush()
+        return session.scalars(select(model).join(Sensor, Sensor.id == model.sensorID)
+                               .where(Sensor.devEUI == devEUI).order_by(model.bucket)).all()
+
+    def test_live_event_closed(self, session):
+        for upsert in (queries.upsert_live_sensor_event, queries.upsert_live_sensor_event_core):
+            devEUI = f"rollup-{upsert.__name__}"
+            device = VirtualDevice(devEUI, random.Random(0), packets_per_stroke=3, samples_per_packet=4)
+            cache = LiveEventCache()
+            for closed in range(2):
+                event = SensorEvent()
+                for topic, payload in device.stroke():
+                    # Live events are not rolled up
+                    assert sum(rollup.eventCount for rollup in self.rollups(session, devEUI)) == closed
+                    event.parse_from_data(topic, payload)
+                    upsert(session, event, int(topic[-2:]) - 12, cache=cache)
+
+            session.flush()
+            session.expire_all()    # Core updates bypass the loaded entities
+            rollups = self.rollups(session, devEUI) + self.rollups(session, devEUI, DailyTrendRollup)
+            events = session.scalars(select(Event).join(Event.sensor).where(Sensor.devEUI == devEUI)).all()
+            max_torques = [event.deviceTrendInfo.maxTorque for event in events]
+            assert all(rollup.eventCount == 2 for rollup in rollups)
+            assert all(rollup.maxTorqueSum == sum(max_torques) for rollup in rollups)
+            assert all(rollup.maxTorqueMax == max(max_torques) for rollup in rollups)
+
+    def test_added_events(self, session):
+        device = VirtualDevice("rollup-a", random.Random(0), packets_per_stroke=3, samples_per_packet=4)
+        events = []
+        for _ in range(4):
+            event = SensorEvent()
+            for topic, payload in device.stroke():
+                event.parse_from_data(topic, payload)
+            events.append(event)
+        timestamps = [datetime(2025, 1, 1, 0, 10), datetime(2025, 1, 1, 0, 20), datetime(2025, 1, 1, 5)]
+
+        queries.add_sensor_events_bulk(session, events[:3], timestamps)
+        queries.add_sensor_event(session, events[3], datetime(2025, 1, 2))
+        live_event = SensorEvent()
+        live_event.devEUI, live_event.isStreaming = "rollup-a", True
+        queries.add_sensor_event(session, live_event, datetime(2025, 1, 2))
+
+        rollups = self.rollups(session, "rollup-a")
+        assert [(rollup.bucket, rollup.eventCount) for rollup in rollups] == [
+            (datetime(2025, 1, 1, 0), 2), (datetime(2025, 1, 1, 5), 1), (datetime(2025, 1, 2), 1)]
+        assert rollups[0].temperatureSum == events[0].temperature + events[1].temperature
+        assert [rollup.eventCount for rollup in self.rollups(session, "rollup-a", DailyTrendRollup)] == [3, 1]
+
+        # Rebuilt from the events, the rollups are the same
+        incremental = [columns(rollup) for rollup in rollups]
+        rebuild_rollups(session)
+        session.expire_all()
+        assert [columns(rollup) for rollup in self.rollups(session, "rollup-a")] == incremental
+
+    def test_get_trend_rollups(self, session):
+        queries.add_sensor_events_bulk(session, [sensor_event("rollup-b") for _ in range(3)],
+                                       [datetime(2025, 1, 1, 1), datetime(2025, 1, 1, 2), datetime(2025, 1, 2, 2)])
+        session.flush()
+        sensor_id = session.scalar(select(Sensor.id).where(Sensor.devEUI == "rollup-b"))
+
+        assert len(queries.get_trend_rollups(session, sensor_id)) == 3
+        assert [rollup.bucket.hour for rollup in
+                queries.get_trend_rollups(session, sensor_id, "hour", datetime(2025, 1, 1, 2), datetime(2025, 1, 2))] == [2]
+        assert [rollup.eventCount for rollup in queries.get_trend_rollups(session, sensor_id, "day")] == [2, 1]
+        with pytest.raises(ValueError):
+            queries.get_trend_rollups(session, sensor_id, "week")
@@ -1,6 +1,36 @@
+from mqtt_client import ThreadedMQTTClient
 from mqtt_client.sensor_event import SensorEvent
-from mqtt_client.crc16 import CRC16_CCITT
-from mqtt_client.misc import cstr_to_str
+from mqtt_client.ingest import IngestQueue, IngestPipeline, ShardedIngestPipeline
+from mqtt_client.inflight import InFlightTable
+from mqtt_client.sharing import SharedSubscription, SummaryReorderBuffer, owner_of
+from mqtt_client.journal import Journal
+from mqtt_client.capture import CaptureWriter, CaptureReader, INDEX_NAME, read_dump_files, read_topics, replay
+from mqtt_client.duplicates import DuplicateDetector
+from mqtt_client.simulator import VirtualDevice, FleetSimulator
+from mqtt_client.aux_sensor_event import AuxSensorEvent
+from db_connector.queries import hide_duplicate_packets
+from paho.mqtt.client import MQTTMessage
+from mqtt_client.crc16 import CRC16_CCITT, CRC16_CCITT_reference, CRC16, crc_many
+from mqtt_client.misc import cstr_to_str, cstr_from_bytes
+from mqtt_client.records import RecordLayout, RecordField, HEARTBEAT_RECORD, EVENT_SUMMARY_RECORD, CO2_RECORD
+from mqtt_client.torque import decode_torque_samples, decode_torque_array, data_record_sample_count, \
+    pack_torque_samples, unpack_torque_samples
+from struct import pack
+from threading import Event
+from os import getenv
+from datetime import datetime
+import random
+from time import sleep, perf_counter
+import socket
+import pytest
+
+
+def with_crc(body: bytes) -> bytes:
+    return body + pack("<H", CRC16_CCITT(body))
+
+
+def data_record(packet_seq: int, samples) -> bytes:
+    return with_crc(pack(f"<H{len(samples)}h", packet_seq, *samples))
 
 
 class TestCRC:
@@ -10,6 +40,27 @@ class TestCRC:
 
         assert result == 1548
 
+    def test_crc_matches_reference(self):
+        data = bytes(range(256)) * 2
+
+        for length in range(0, len(data), 17):
+            assert CRC16_CCITT(data[:length]) == CRC16_CCITT_reference(data[:length])
+
+    def test_crc_streaming(self):
+        data = bytes([0x00, 0x0a, 0x00, 0x1b, 0x00, 0x2c, 0x00, 0x3d, 0x00, 0x4e])
+        crc = CRC16()
+
+        crc.update(data[:3])  # Odd sized chunks
+        crc.update(memoryview(data)[3:])
+
+        assert crc.digest() == 1548
+
+    def test_crc_many(self):
+        payloads = [b"", b"\x01", bytes(range(100)), bytearray(b"hello")]
+        result = crc_many(payloads)
+
+        assert result == [CRC16_CCITT_reference(payload) for payload in payloads]
+
 
 class TestMisc:
     def test_cstr_str_happy(self):
@@ -24,6 +75,639 @@ class TestMisc:
 
         assert result == "hello"
 
+    def test_cstr_from_bytes(self):
+        assert cstr_from_bytes(b"hello\x00world") == "hello"
+        assert cstr_from_bytes(b"hello") == "hello"
+        assert cstr_from_bytes(b"\x00\x00") == ""
+
+
+class TestRecordLayout:
+    def test_sizes(self):
+        assert HEARTBEAT_RECORD.size == 96
+        assert EVENT_SUMMARY_RECORD.size == 22
+        assert CO2_RECORD.size == 20
+
+    def test_unpack(self):
+        layout = RecordLayout("Test", [
+            RecordField("name", "6s"),
+            RecordField(None, "2x"),
+            RecordField("value", "h", lambda x: x * 10),
+        ])
+        result = layout.unpack(memoryview(b"abc\x00\x00\x00\xff\xff\xfe\xff"))
+
+        assert result == {"name": "abc", "value": -20}
+
+    def test_unpack_too_short(self):
+        with pytest.raises(ValueError):
+            EVENT_SUMMARY_RECORD.unpack(b"\x00" * 21)
+
+    def test_pack(self):
+        values = {"fwVersion": "1.0", "serialNumber": "SN-1", "year": 2026, "temperature": -5, "openValveCount": 7}
+        data = HEARTBEAT_RECORD.pack(**values)
+        result = HEARTBEAT_RECORD.unpack(data)
+
+        assert len(data) == 96
+        assert {key: result[key] for key in values} == values
+        assert result["deviceType"] == "" and result["batteryVoltage"] == 0
+
+
+class TestTorque:
+    def test_sample_count(self):
+        assert data_record_sample_count(104) == 50
+        assert data_record_sample_count(105) == 50
+        assert data_record_sample_count(4) == 0
+        assert data_record_sample_count(2) == 0
+
+    def test_decode(self):
+        data = pack("<H4hH", 1, 9, -1, 32767, -32768, 0xbeef)
+
+        assert decode_torque_samples(data) == [9, -1, 32767, -32768]
+        assert decode_torque_array(data).tolist() == [9, -1, 32767, -32768]
+
+    def test_decode_numpy(self):
+        pytest.importorskip("numpy")
+        data = pack("<H3hH", 1, 9, -1, -2, 0xbeef)
+
+        assert decode_torque_samples(data, backend="numpy") == [9, -1, -2]
+
+    def test_decode_unknown_backend(self):
+        with pytest.raises(ValueError):
+            decode_torque_samples(b"\x00" * 8, backend="unknown")
+
+    def test_pack(self):
+        data = pack("<H4hH", 1, 9, -1, 32767, -32768, 0xbeef)
+
+        assert pack_torque_samples(decode_torque_array(data)) == data[2:-2]
+        assert unpack_torque_samples(data[2:-2]) == [9, -1, 32767, -32768]
+
+
+class TestIngest:
+    def test_queue_drop_oldest(self):
+        queue = IngestQueue(maxsize=2, overflow="drop_oldest")
+
+        for i in range(5):
+            queue.put(i)
+
+        assert queue.get() == 3
+        assert queue.get() == 4
+        assert queue.stats() == {"depth": 0, "maxsize": 2, "high_water": 2, "enqueued": 5, "dropped": 3}
+
+    def test_queue_close(self):
+        queue = IngestQueue(maxsize=1)
+        queue.put(1)
+        queue.close()
+
+        assert not queue.put(2)
+        assert queue.get() == 1
+        assert queue.get() is None
+
+    def test_queue_invalid_policy(self):
+        with pytest.raises(ValueError):
+            IngestQueue(overflow="drop_newest")
+
+    def test_pipeline(self):
+        handled = []
+        pipeline = IngestPipeline(lambda topic, payload, recv_time: handled.append((topic, payload)), workers=1)
+        pipeline.start()
+
+        for i in range(10):
+            pipeline.submit("sensors/a/port/13", bytes([i]))
+        pipeline.stop(timeout=5)
+
+        assert handled == [("sensors/a/port/13", bytes([i])) for i in range(10)]
+        assert pipeline.stats()["processed"] == 10
+        assert pipeline.stats()["errors"] == 0
+
+    def test_pipeline_handler_error(self):
+        done = Event()
+
+        def handler(topic, payload, recv_time):
+            if payload == b"bad":
+                raise SyntaxError("bad packet")
+            done.set()
+
+        pipeline = IngestPipeline(handler, workers=2)
+        pipeline.start()
+        pipeline.submit("sensors/a/port/13", b"bad")
+        pipeline.submit("sensors/a/port/13", b"good")
+        pipeline.stop(timeout=5)
+
+        assert done.is_set()
+        assert pipeline.stats()["errors"] == 1
+
+    def test_sharded_pipeline_order(self):
+        handled = {}
+
+        def handler(topic, payload, recv_time):
+            handled.setdefault(topic, []).append(payload)
+
+        pipeline = ShardedIngestPipeline(handler, workers=4)
+        topics = [f"sensors/device-{i}/port/13" for i in range(20)]
+        pipeline.start()
+        for i in range(50):
+            for topic in topics:
+                pipeline.submit(topic, i)
+        pipeline.stop(timeout=5)
+
+        assert handled == {topic: list(range(50)) for topic in topics}
+        assert pipeline.shard_for(topics[0]) == pipeline.shard_for("sensors/device-0/port/12")
+
+        stats = pipeline.stats()
+        assert stats["processed"] == stats["enqueued"] == 1000
+        assert len(stats["shards"]) == 4
+        assert stats["imbalance"] >= 1.0
+
+
+class TestInFlightTable:
+    @staticmethod
+    def entry(devEUI: str = None):
+        event = SensorEvent()
+        event.devEUI = devEUI
+        return lambda: {"old_event": None, "current_event": event}
+
+    def test_touch(self):
+        table = InFlightTable(max_devices=10, ttl=60)
+        entry = table.touch("dev-a", self.entry(), now=0)
+
+        assert table.touch("dev-a", self.entry(), now=1) is entry
+        assert table["dev-a"] is entry
+        assert len(table) == 1
+
+    def test_lru_capacity(self):
+        evicted = []
+        table = InFlightTable(max_devices=2, ttl=0, on_evict=lambda devEUI, entry, reason: evicted.append(devEUI))
+        table.touch("dev-a", self.entry("dev-a"), now=0)
+        table.touch("dev-b", self.entry(), now=1)
+        table.touch("dev-a", self.entry(), now=2)
+        table.touch("dev-c", self.entry(), now=3)
+        table.touch("dev-d", self.entry(), now=4)
+
+        # dev-b was evicted first but held no data
+        assert "dev-a" not in table and "dev-b" not in table
+        assert evicted == ["dev-a"]
+        assert table.stats()["evicted_capacity"] == 2
+        assert table.stats()["abandoned"] == 1
+
+    def test_idle_ttl(self):
+        table = InFlightTable(max_devices=10, ttl=60)
+        table.touch("dev-a", self.entry("dev-a"), now=0)
+        table.touch("dev-b", self.entry(), now=30)
+
+        assert table.evict_idle(now=60) == 1
+        assert "dev-b" in table
+        assert table.evict_idle(now=90) == 1
+        assert len(table) == 0
+
+    def test_stats(self):
+        table = InFlightTable(max_devices=4, ttl=60)
+        entry = table.touch("dev-a", self.entry("dev-a"), now=0)
+        memory = table.stats()["memory"]
+        entry["current_event"].parse_from_data_record(data_record(1, list(range(100))))
+        stats = table.stats()
+
+        assert stats["devices"] == 1
+        assert stats["occupancy"] == 0.25
+        assert stats["memory"] > memory
+
+
+class TestSharedSubscription:
+    def test_subscriptions(self):
+        sharing = SharedSubscription("ingest", 1, 3)
+
+        assert sharing.subscriptions([("sensors/+/port/+", 2)]) == [
+            ("$share/ingest/sensors/+/port/+", 2),
+            ("ingest/ingest/1/sensors/+/port/+", 2),
+        ]
+
+    def test_route(self):
+        consumers = [SharedSubscription("group", i, 3) for i in range(3)]
+        topic = "sensors/39-32-30-31-79-30-6f-02/port/13"
+        owner = owner_of("39-32-30-31-79-30-6f-02", 3)
+
+        for sharing in consumers:
+            sensor_topic, forward_topic = sharing.route(topic)
+            assert sensor_topic == topic
+            if sharing.consumer_index == owner:
+                assert forward_topic is None
+            else:
+                assert forward_topic == f"ingest/group/{owner}/{topic}"
+                assert consumers[owner].route(forward_topic) == (topic, None)
+
+    @pytest.mark.parametrize("group, index, count", [("", 0, 1), ("a/b", 0, 1), ("group", 2, 2), ("group", -1, 2)])
+    def test_invalid(self, group, index, count):
+        with pytest.raises(ValueError):
+            SharedSubscription(group, index, count)
+
+    def test_forwarded_to_owner(self):
+        clients = [ThreadedMQTTClient(share_group="group", consumer_index=i, consumer_count=2) for i in range(2)]
+        published = []
+        for client in clients:
+            client.mqtt_client.publish = lambda topic, payload, qos: published.append((topic, payload))
+
+        def deliver(client, topic, payload):
+            msg = MQTTMessage(topic=topic.encode())
+            msg.payload = payload
+            userdata = {"sensor_events": client.sensor_events, "sharing": client.sharing}
+            ThreadedMQTTClient._on_message(client.mqtt_client, userdata, msg)
+
+        # The broker alternates between consumers
+        devices = [f"dev-{i}" for i in range(8)]
+        for i, devEUI in enumerate(devices):
+            for packet_seq in range(1, 5):
+                deliver(clients[(i + packet_seq) % 2], f"sensors/{devEUI}/port/13", data_record(packet_seq, [i]))
+        while published:
+            topic, payload = published.pop(0)
+            deliver(clients[int(topic.split("/")[2])], topic, payload)
+
+        for devEUI in devices:
+            owner, other = clients[owner_of(devEUI, 2)], clients[1 - owner_of(devEUI, 2)]
+            assert owner.sensor_events[devEUI]["current_event"].packet_count == 4
+            assert devEUI not in other.sensor_events
+
+    def test_summary_held(self):
+        dispatched = []
+        reorder = SummaryReorderBuffer(lambda topic, payload, recv_time: dispatched.append(topic), grace=1.0)
+
+        reorder.push("sensors/dev-a/port/14", b"", 0.0, now=10.0)
+        reorder.push("sensors/dev-a/port/13", b"", 0.0, now=10.5)
+        reorder.push("sensors/dev-b/port/14", b"", 0.0, now=10.5)
+        assert dispatched == ["sensors/dev-a/port/13"]
+        assert reorder.release_due(now=11.0) == 1
+        assert dispatched[1:] == ["sensors/dev-a/port/14"]
+
+        # The next stroke releases the held summary first
+        reorder.push("sensors/dev-b/port/12", b"", 0.0, now=11.0)
+        assert dispatched[2:] == ["sensors/dev-b/port/14", "sensors/dev-b/port/12"]
+        assert len(reorder) == 0
+
+    def test_late_data_record(self):
+        client = ThreadedMQTTClient(share_group="group", consumer_index=0, consumer_count=2)
+        summaries = []
+        client.on_event_summary_packet = lambda current, old: summaries.append(current.packet_count)
+        userdata = client.prepare()
+        topic = next(f"sensors/dev-{i}/port/{{}}" for i in range(8) if owner_of(f"dev-{i}", 2) == 0)
+
+        # The last data record was forwarded and arrives after the event summary
+        client.deliver(userdata, topic.format(12), with_crc(bytes(94)))
+        client.deliver(userdata, topic.format(13), data_record(1, [1]))
+        client.deliver(userdata, topic.format(13), data_record(2, [2]))
+        client.deliver(userdata, topic.format(14), with_crc(bytes(20)))
+        client.deliver(userdata, topic.format(13), data_record(3, [3]))
+        assert summaries == []
+
+        client.reorder.release_all()
+        client._reorder_stop.set()
+        assert summaries == [3]
+
+
+class TestDuplicateDetector:
+    @staticmethod
+    def event(packets) -> SensorEvent:
+        sensor_event = SensorEvent()
+        for packet_seq, samples in enumerate(packets, 1):
+            sensor_event.parse_from_data_record(data_record(packet_seq, samples))
+        return sensor_event
+
+    def test_live_and_finalize(self):
+        previous_event = self.event([[1], [2], [3], [4], [5]])
+        detector = DuplicateDetector(previous_event)
+        sensor_event = SensorEvent()
+
+        hidden = []
+        for packet_seq, samples in enumerate([[9], [2], [8], [4], [5]], 1):
+            data = data_record(packet_seq, samples)
+            sensor_event.parse_from_data_record(data)
+            detector.data_packet(sensor_event, data)
+            hidden.append(list(sensor_event.hiddenDataIndices))
+
+        # Packet 2 is only hidden until packet 3 is not a duplicate
+        assert hidden == [[], [2], [], [4], [4, 5]]
+        assert detector.finalize(sensor_event) == [4, 5]
+        assert sensor_event.hiddenDataIndices == [4, 5]
+
+    def test_no_previous_event(self):
+        detector = DuplicateDetector()
+        sensor_event = self.event([[1], [2]])
+
+        assert not detector.data_packet(sensor_event, data_record(2, [2]))
+        assert detector.finalize(sensor_event) == []
+
+    def test_matches_hide_duplicate_packets(self):
+        rng = random.Random(11)
+        for _ in range(200):
+            tail = [[rng.randrange(3)] * rng.randrange(1, 3) for _ in range(rng.randrange(4))]
+            previous_event = self.event([[rng.randrange(3)] for _ in range(rng.randrange(4))] + tail)
+            sensor_event = self.event([[rng.randrange(3)] for _ in range(rng.randrange(4))] + tail)
+
+            expected = hide_duplicate_packets(*sensor_event.flatten_torque(), sensor_event.dataPacketPayloadCRCs,
+                                              *previous_event.flatten_torque(), previous_event.dataPacketPayloadCRCs)
+            assert DuplicateDetector(previous_event).finalize(sensor_event) == expected
+
+
+class TestJournal:
+    def test_replay(self, tmp_path):
+        journal = Journal(str(tmp_path), segment_size=256, fsync_interval=0)
+        journal.open()
+        records = [(float(i), f"sensors/dev-{i % 3}/port/13", bytes([i]) * 40) for i in range(20)]
+        for record in records:
+            journal.append(*record)
+        journal.close()
+
+        assert len(journal.segments()) > 1
+        assert list(Journal(str(tmp_path)).replay()) == records
+
+    def test_torn_record(self, tmp_path):
+        journal = Journal(str(tmp_path), fsync_interval=0)
+        journal.open()
+        journal.append(1.0, "sensors/dev-a/port/13", b"first")
+        journal.append(2.0, "sensors/dev-a/port/13", b"second")
+        journal.close()
+
+        path = tmp_path / "journal-000000000000.log"
+        path.write_bytes(path.read_bytes()[:-3])
+        assert list(Journal(str(tmp_path)).replay()) == [(1.0, "sensors/dev-a/port/13", b"first")]
+
+        # Restarting never appends behind the torn record
+        journal = Journal(str(tmp_path), fsync_interval=0)
+        list(journal.replay())
+        journal.open()
+        journal.append(3.0, "sensors/dev-a/port/14", b"third")
+        journal.close()
+        assert [record[0] for record in Journal(str(tmp_path)).replay()] == [1.0, 3.0]
+
+    def test_segments_released(self, tmp_path):
+        journal = Journal(str(tmp_path), segment_size=64, fsync_interval=0)
+        journal.open()
+        journal.append(0.0, "sensors/dev-a/port/13", bytes(40))    # Segment 0, dev-a event open
+        for i in range(4):
+            journal.append(0.0, "sensors/dev-b/port/14", bytes(40))
+
+        # Segment 0 holds the open event of dev-a
+        assert journal.segments()[0] == 0
+        journal.append(0.0, "sensors/dev-a/port/14", bytes(40))
+        journal.append(0.0, "sensors/dev-b/port/14", bytes(40))
+        assert journal.segments()[0] > 0
+        assert journal.stats()["open_devices"] == 0
+        journal.close()
+
+    def test_client_recover(self, tmp_path):
+        topic = "sensors/39-32-30-31-79-30-6f-02/port/{}"
+        journal = Journal(str(tmp_path), fsync_interval=0)
+        journal.open()
+        journal.append(0.0, topic.format(12), with_crc(bytes(94)))
+        journal.append(0.0, topic.format(13), data_record(1, [1, 2]))
+        journal.append(0.0, topic.format(13), data_record(2, [3]))
+        journal.append(0.0, "sensors/dev-b/port/13", data_record(1, [4]))
+        journal.append(0.0, "sensors/dev-b/port/14", with_crc(bytes(20)))
+        journal.close()
+
+        rebuilt = []
+        client = ThreadedMQTTClient(on_data_packet=rebuilt.append, on_event_summary_packet=rebuilt.append,
+                                    journal_dir=str(tmp_path))
+
+        assert client.recover() == 1
+        assert [event.devEUI for event in rebuilt] == ["39-32-30-31-79-30-6f-02"]
+        assert rebuilt[0].torqueData == [[1, 2], [3]]
+
+
+class TestCapture:
+    def test_round_trip(self, tmp_path):
+        records = [(100.0 + i, f"sensors/dev-{i % 3}/port/13", data_record(i, [i])) for i in range(50)]
+        with CaptureWriter(str(tmp_path), segment_size=256) as writer:
+            for record in records:
+                writer.append(*record)
+        reader = CaptureReader(str(tmp_path))
+
+        assert len(reader.segments) > 1
+        assert len(reader) == 50
+        assert list(reader) == records
+        assert list(reader.records(start=110, end=120, topics=["sensors/dev-1/port/13"])) == \
+            [record for record in records[10:20] if record[1] == "sensors/dev-1/port/13"]
+        assert reader.stats()["topics"] == 3
+
+    def test_continue_capture(self, tmp_path):
+        with CaptureWriter(str(tmp_path)) as writer:
+            writer.append(1.0, "sensors/a/port/12", b"one")
+        with CaptureWriter(str(tmp_path)) as writer:
+            writer.append(2.0, "sensors/b/port/12", b"")
+            writer.append(3.0, "sensors/a/port/12", b"three")
+
+        reader = CaptureReader(str(tmp_path))
+        assert reader.segments == [0, 1]
+        assert reader.topics == ["sensors/a/port/12", "sensors/b/port/12"]
+        assert [payload for _, _, payload in reader] == [b"one", b"", b"three"]
+
+    def test_torn_index(self, tmp_path):
+        with CaptureWriter(str(tmp_path)) as writer:
+            writer.append(1.0, "sensors/a/port/13", b"first")
+            writer.append(2.0, "sensors/a/port/13", b"second")
+        with open(tmp_path / INDEX_NAME.format(0), "r+b") as f:
+            f.truncate(f.seek(0, 2) - 3)
+
+        assert [payload for _, _, payload in CaptureReader(str(tmp_path))] == [b"first"]
+
+    def test_rejected_topic(self, tmp_path):
+        with CaptureWriter(str(tmp_path)) as writer:
+            writer.append(1.0, "sensors/a/port/13", b"a")
+            with pytest.raises(ValueError):
+                writer.append(2.0, "sensors/a\n/port/13", b"XXXX")
+            writer.append(3.0, "sensors/b/port/13", b"b")
+
+        assert list(CaptureReader(str(tmp_path))) == [(1.0, "sensors/a/port/13", b"a"),
+                                                       (3.0, "sensors/b/port/13", b"b")]
+
+    def test_topic_line_breaks(self, tmp_path):
+        topics = [f"sensors/a{char}/port/13" for char in "\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"] + [""]
+        with CaptureWriter(str(tmp_path)) as writer:
+            for i, topic in enumerate(topics):
+                writer.append(float(i), topic, b"a")
+            with pytest.raises(ValueError):
+                writer.append(99.0, "sensors/\ud800/port/13", b"XXXX")
+        with CaptureWriter(str(tmp_path)) as writer:
+            writer.append(10.0, "sensors/b/port/13", b"b")
+
+        assert read_topics(str(tmp_path)) == topics + ["sensors/b/port/13"]
+        assert [topic for _, topic, _ in CaptureReader(str(tmp_path))] == topics + ["sensors/b/port/13"]
+
+    def test_read_dump_files(self, tmp_path):
+        (tmp_path / "1729792596.5.sensors_dev-a_port_13.data").write_bytes(b"b")
+        (tmp_path / "1729792596.25.sensors_dev-a_port_12.data").write_bytes(b"a")
+
+        assert read_dump_files(str(tmp_path)) == [
+            (1729792596.25, "sensors/dev-a/port/12", b"a"),
+            (1729792596.5, "sensors/dev-a/port/13", b"b"),
+        ]
+
+    def test_replay_timing(self):
+        records = [(1000.0, "t", b"a"), (1000.1, "t", b"b"), (1000.2, "t", b"c")]
+        received = []
+
+        start = perf_counter()
+        assert replay(records, lambda topic, payload: received.append(payload), speed=2) == 3
+        assert perf_counter() - start >= 0.09
+        assert received == [b"a", b"b", b"c"]
+
+        start = perf_counter()
+        replay(records, lambda topic, payload: None, speed=0)
+        assert perf_counter() - start < 0.09
+
+        with pytest.raises(ValueError):
+            replay(records, lambda topic, payload: None, speed=-1)
+
+
+def mqtt_broker_available() -> bool:
+    if not getenv("MQTT_USERNAME") or not getenv("MQTT_PASSWORD"):
+        return False
+    try:
+        socket.create_connection((getenv("MQTT_HOST", "localhost"), 1883), timeout=1).close()
+        return True
+    except OSError:
+        return False
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(not mqtt_broker_available(), reason="MQTT broker (mqtt_broker container) not reachable or credentials not set")
+def test_shared_subscription_broker():
+    host = getenv("MQTT_HOST", "localhost")
+    received = {}
+
+    clients = []
+    for i in range(2):
+        client = ThreadedMQTTClient(on_data_packet=lambda event, i=i: received.setdefault(event.devEUI, set()).add(i),
+                                    share_group="test", consumer_index=i, consumer_count=2)
+        client.broker = host
+        client.start()
+        clients.append(client)
+    sleep(1)
+
+    import paho.mqtt.client as mqtt
+    publisher = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    publisher.username_pw_set(clients[0].username, clients[0].password)
+    publisher.connect(host, 1883)
+    publisher.loop_start()
+    devices = [f"dev-{i}" for i in range(8)]
+    for packet_seq in range(1, 5):
+        for devEUI in devices:
+            info = publisher.publish(f"sensors/{devEUI}/port/13", data_record(packet_seq, [packet_seq]), qos=2)
+            info.wait_for_publish()
+    sleep(2)
+    publisher.loop_stop()
+    publisher.disconnect()
+    for client in clients:
+        client.stop()
+
+    # Every device was handled by its owner only, with all of its packets
+    for devEUI in devices:
+        owner = owner_of(devEUI, 2)
+        assert received[devEUI] == {owner}
+        assert clients[owner].sensor_events[devEUI]["current_event"].packet_count == 4
+
+
+class TestThreadedMQTTClient:
+    def test_process_message_lifecycle(self):
+        calls = []
+        client = ThreadedMQTTClient(
+            on_heartbeat_packet=lambda event: calls.append(("heartbeat", event)),
+            on_data_packet=lambda event: calls.append(("data", event)),
+            on_event_summary_packet=lambda event, old_event: calls.append(("summary", event, old_event)),
+        )
+        userdata = {
+            "sensor_events": client.sensor_events,
+            "on_heartbeat_packet": client.on_heartbeat_packet,
+            "on_data_packet": client.on_data_packet,
+            "on_event_summary_packet": client.on_event_summary_packet,
+        }
+        topic = "sensors/39-32-30-31-79-30-6f-02/port/{}"
+
+        ThreadedMQTTClient._process_message(userdata, topic.format(12), with_crc(bytes(94)), 0)
+        ThreadedMQTTClient._process_message(userdata, topic.format(13), data_record(1, [1, 2]), 0)
+        ThreadedMQTTClient._process_message(userdata, topic.format(14), with_crc(bytes(20)), 0)
+
+        assert [call[0] for call in calls] == ["heartbeat", "data", "summary"]
+        assert calls[0][1] is calls[1][1] is calls[2][1]
+        assert calls[2][1].torqueData == [[1, 2]]
+        assert calls[2][2] is None
+        assert client.sensor_events["39-32-30-31-79-30-6f-02"]["old_event"] is calls[2][1]
+
+    def test_duplicates_hidden_during_ingest(self):
+        client = ThreadedMQTTClient()
+        userdata = {"sensor_events": client.sensor_events}
+        topic = "sensors/39-32-30-31-79-30-6f-02/port/{}"
+
+        for packets in ([[1], [2], [3]], [[4], [2], [3]]):
+            for packet_seq, samples in enumerate(packets, 1):
+                ThreadedMQTTClient._process_message(userdata, topic.format(13), data_record(packet_seq, samples), 0)
+            ThreadedMQTTClient._process_message(userdata, topic.format(14), with_crc(bytes(20)), 0)
+
+        assert client.sensor_events["39-32-30-31-79-30-6f-02"]["old_event"].hiddenDataIndices == [2, 3]
+
+    def test_abandoned_event(self):
+        abandoned = []
+        client = ThreadedMQTTClient(on_abandoned_event=abandoned.append, inflight_max_devices=1)
+        userdata = {"sensor_events": client.sensor_events}
+
+        ThreadedMQTTClient._process_message(userdata, "sensors/dev-a/port/13", data_record(1, [1, 2]), 0)
+        ThreadedMQTTClient._process_message(userdata, "sensors/dev-b/port/13", data_record(1, [3, 4]), 0)
+
+        assert [event.devEUI for event in abandoned] == ["dev-a"]
+        assert client.inflight_stats()["devices"] == 1
+
+    def test_shared_mode_single_worker(self):
+        assert ThreadedMQTTClient(ingest_workers=1, ingest_mode="shared").ingest_mode == "shared"
+        with pytest.raises(ValueError):
+            ThreadedMQTTClient(ingest_workers=2, ingest_mode="shared")
+
+
+class TestSimulator:
+    def test_device_payloads(self):
+        device = VirtualDevice("53-49-4d-00-00-01-00-01", random.Random(0), packets_per_stroke=3, samples_per_packet=4)
+        event = SensorEvent()
+        for topic, payload in device.stroke():
+            event.parse_from_data(topic, payload)
+
+        assert event.packet_count == 3
+        assert [len(samples) for samples in event.torqueData] == [4, 4, 4]
+        assert event.heartbeatRecordPayloadCRC == event.calculatedHeartbeatRecordPayloadCRC != 0
+        assert event.eventSummaryPayloadCRC == event.calculatedEventSummaryPayloadCRC != 0
+        assert event.openValveCount == 0 and event.year == datetime.now().year
+
+        aux_event = AuxSensorEvent()
+        aux_event.parse_from_data(device.topic(15), device.co2())
+        assert 400 <= aux_event.co2_percentage <= 2000
+
+    def test_seeded_loss_and_duplication(self):
+        def run():
+            simulator = FleetSimulator(devices=5, stroke_interval=1, packet_interval=0.01, packets_per_stroke=4,
+                                       loss=0.2, duplication=0.2, seed=7)
+            return [topic for _, topic, _ in simulator.schedule(5)], simulator
+
+        topics, simulator = run()
+        other_topics, _ = run()
+
+        assert topics == other_topics
+        assert simulator.lost > 0 and simulator.duplicated > 0
+        assert len(topics) == simulator.strokes_sent * 6 - simulator.lost + simulator.duplicated
+
+    def test_direct_run(self):
+        simulator = FleetSimulator(devices=8, stroke_interval=1, packet_interval=0.01, packets_per_stroke=5,
+                                   co2_sensors=2, co2_interval=1, seed=1)
+        events = []
+
+        def on_event_summary_packet(event, prev_event):
+            events.append(event)
+            simulator.stroke_processed(event)
+
+        client = ThreadedMQTTClient(on_event_summary_packet=on_event_summary_packet, ingest_workers=2)
+        userdata = client.prepare()
+        simulator.run(lambda topic, payload: client.deliver(userdata, topic, payload), duration=3, speed=0)
+
+        assert simulator.wait(10)
+        client.ingest.stop(10)
+        report = simulator.report(1.0, simulator.sent)
+        assert len(events) == simulator.strokes_sent == report["strokes_processed"] == 24
+        assert all(event.packet_count == 5 and not event.hiddenDataIndices for event in events)
+        assert 0 <= report["latency_p50"] <= report["latency_max"]
+
 
 class TestSensorEvent:
     def test_init(self):
@@ -35,6 +719,36 @@ class TestSensorEvent:
         assert len(sensor_event.torqueData) == 0
         assert len(sensor_event.dataPacketPayloadCRCs) == 0
         assert len(sensor_event.calculatedDataPacketPayloadCRCs) == 0
+
+    def test_compact(self):
+        sensor_event = SensorEvent()
+
+        assert not hasattr(sensor_event, "__dict__")
+        with pytest.raises(AttributeError):
+            sensor_event.unknownField = 1
+
+    def test_copy(self):
+        sensor_event = SensorEvent()
+        sensor_event.parse_from_data_record(data_record(1, [1, 2]))
+        copy = sensor_event.copy()
+        sensor_event.parse_from_data_record(data_record(2, [3]))
+
+        assert copy.torqueData == [[1, 2]]
+        assert sensor_event.torqueData == [[1, 2], [3]]
+
+    def test_data_record_out_of_order(self):
+        sensor_event = SensorEvent()
+
+        for packet_seq, samples in [(3, [5, 6]), (1, [1, 2, 3]), (3, [7, 8]), (1, [9])]:
+            sensor_event.parse_from_data_record(data_record(packet_seq, samples))
+
+        assert sensor_event.packet_count == 3
+        assert sensor_event.has_packet(1)
+        assert not sensor_event.has_packet(2)
+        assert sensor_event.torqueData == [[9], None, [7, 8]]
+        assert sensor_event.dataPacketPayloadCRCs[1] is None
+        assert sensor_event.dataPacketPayloadCRCs == sensor_event.calculatedDataPacketPayloadCRCs
+        assert sensor_event.flatten_torque() == ([9, 7, 8], [1, -1, 3], [1, 0, 2])
     
     def test_parse_event_summary_record(self, event_summary_packet_payload):
         _, data_bytes = event_summary_packet_payload
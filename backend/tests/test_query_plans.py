@@ -0,0 +1,198 @@
+from db_connector import PG_DB_URI, partitions, queries
+from db_connector.models import Base
+from db_connector.rollups import rebuild_rollups
+from mqtt_client.sensor_event import SensorEvent
+from mqtt_client.simulator import VirtualDevice
+from datetime import datetime, timedelta
+from os import getenv
+from typing import Iterator, List, Tuple
+import random
+import re
+from sqlalchemy import create_engine, event as sqlalchemy_event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+import pytest
+
+
+# Seeded in a separate schema of the test database, dropped at the end
+EVENTS = int(getenv("QUERY_PLAN_EVENTS", 0))
+BUDGET_MS = float(getenv("QUERY_PLAN_BUDGET_MS", 50))
+SCHEMA = "query_plans"
+EVENTS_PER_SENSOR = 1000
+AUX_DATA_PER_SENSOR = 1000
+
+SENSORS = max(1, EVENTS // EVENTS_PER_SENSOR)
+AUX_SENSORS = max(1, EVENTS // AUX_DATA_PER_SENSOR)
+START = datetime(2025, 1, 1)     # Rows are one minute apart
+SEEDED_TABLES = ("sensors", "device_infos", "device_datas", "device_trend_infos", "events", "data_records",
+                 "aux_sensors", "aux_sensor_data", "trend_rollups_hourly", "trend_rollups_daily")
+# Plans reading these tables must use an index and never scan them sequentially. Other tables may rightly be scanned
+# (e.g. `device_trend_infos` joined to many events), and so may `sensors` until it is large enough for its indexes
+LARGE_TABLES = ("events", "device_datas", "aux_sensor_data", "data_records") + (("sensors",) if SENSORS >= 1000 else ())
+INDEX_SCANS = ("Index Scan", "Index Only Scan", "Bitmap Index Scan")
+
+pytestmark = [
+    pytest.mark.slow,
+    pytest.mark.skipif(not EVENTS, reason="Set QUERY_PLAN_EVENTS (e.g. 1000000) to seed a database and check plans"),
+]
+
+# The last event of each sensor is live, every tenth event is stored with `TORQUE_STORAGE=packets`. The rollups are
+# computed from the events
+SEED = (
+    'INSERT INTO sensors (id, "devEUI") SELECT i, \'plan-\' || i FROM generate_series(1, :sensors) i',
+    'INSERT INTO device_infos (id, "firmwareVersion", "pwaRevision", "serialNumber", "deviceType", "deviceLocation", '
+    '"diagnostic", "openValveCount", "closeValveCount") '
+    'SELECT i, \'1.0\', \'A\', \'SIM\', \'SIM\', \'Sim\', 0, i / 2, i / 2 FROM generate_series(1, :events) i',
+    'INSERT INTO device_datas (id, "lastTorqueBeforeSleep", "firstTorqueAfterSleep", "recordNumbers", "recordLengths", '
+    '"torqueData", "hiddenDataIndices", "typeOfStroke", "dataRecordPayloadCRCs", "calculatedDataRecordPayloadCRCs", '
+    '"eventRecordPayloadCRC", "calculatedEventRecordPayloadCRC", "heartbeatRecordPayloadCRC", '
+    '"calculatedHeartbeatRecordPayloadCRC") '
+    'SELECT i, 0, 0, \'{1,2}\', \'{3,3}\', \'{1,2,3,4,5,6}\', \'{}\', 0, \'{7,8}\', \'{7,8}\', 9, 9, i % 65536, '
+    'i % 65536 FROM generate_series(1, :events) i',
+    'INSERT INTO device_trend_infos (id, "strokeTime", "maxTorque", "temperature", "batteryVoltage") '
+    'SELECT i, 1000, 500, 25, 3300 FROM generate_series(1, :events) i',
+    'INSERT INTO events (id, "timestamp", "isStreaming", "deviceInfoID", "deviceDataID", "deviceTrendInfoID", '
+    '"sensorID") SELECT i, :start + i * interval \'1 minute\', i > :events - :sensors, i, i, i, '
+    '(i - 1) % :sensors + 1 FROM generate_series(1, :events) i',
+    'INSERT INTO data_records ("eventID", "recordNumber", "torqueData", "payloadCRC", "calculatedPayloadCRC") '
+    'SELECT i, r, \'\\x01000200\'::bytea, 7, 7 FROM generate_series(10, :events, 10) i, generate_series(1, 3) r',
+    'INSERT INTO aux_sensors (id) SELECT i FROM generate_series(1, :aux_sensors) i',
+    'INSERT INTO aux_sensor_data (aux_sensor_id, "timestamp", value) '
+    'SELECT (i - 1) % :aux_sensors + 1, :start + i * interval \'1 minute\', 0.04 '
+    'FROM generate_series(1, :events) i',
+)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine(PG_DB_URI, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    except OperationalError:
+        pytest.skip("Database not reachable")
+
+    try:
+        Base.metadata.create_all(engine)
+        with Session(engine) as session, session.begin():
+            month, end = START, START + timedelta(minutes=EVENTS)
+            while month <= end:
+                for table in partitions.PARTITIONED_TABLES:
+                    partitions.create_partition(session, table, month)
+                month = partitions.add_months(month, 1)
+        with engine.begin() as conn:
+            for statement in SEED:
+                conn.execute(text(statement), {"events": EVENTS, "sensors": SENSORS, "aux_sensors": AUX_SENSORS,
+                                               "start": START})
+            rebuild_rollups(conn)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for table in SEEDED_TABLES:
+                conn.execute(text(f"ANALYZE {table}"))
+        yield engine
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+        engine.dispose()
+
+
+def explain(engine, query, *args) -> List[dict]:
+    """
+    Runs a query (rolled back) and returns the `EXPLAIN ANALYZE` output of each statement it executed.
+    """
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    sqlalchemy_event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with Session(engine) as session:
+            session.begin()
+            query(session, *args)
+            session.rollback()
+    finally:
+        sqlalchemy_event.remove(engine, "before_cursor_execute", capture)
+
+    plans = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plans.append(conn.exec_driver_sql("EXPLAIN (ANALYZE, FORMAT JSON) " + statement, parameters).scalar()[0])
+        conn.rollback()
+    return plans
+
+
+def nodes(plan: dict) -> Iterator[dict]:
+    """
+    Yields every node of a plan.
+    """
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from nodes(child)
+
+
+def scans(plan: dict) -> Iterator[Tuple[str, str]]:
+    """
+    Yields the node type and relation (or index) name of every node of a plan, partitions named after their table.
+    """
+    for node in nodes(plan):
+        relation = node.get("Relation Name", node.get("Index Name"))
+        yield node["Node Type"], re.sub(r"_\d{4}_\d{2}$", "", relation) if relation else relation
+
+
+def live_event() -> Tuple[str, int, int]:
+    # devEUI, heartbeat CRC and id of the live event of the last sensor
+    return f"plan-{(EVENTS - 1) % SENSORS + 1}", EVENTS % 65536, EVENTS
+
+
+def update_live_event(session) -> None:
+    devEUI, crc, _ = live_event()
+    sensor_event = SensorEvent()
+    for topic, payload in VirtualDevice(devEUI, random.Random(0), packets_per_stroke=4).stroke()[:-1]:
+        sensor_event.parse_from_data(topic, payload)
+    keys = queries.find_live_event(session, devEUI, crc)
+    session.execute(queries.live_update_statement(), queries.live_update_parameters(sensor_event, keys, True))
+
+
+# `get_sensors` and `get_aux_sensors` return whole tables and are not checked, nor is `get_sensor_summaries` without a
+# prefix or page
+QUERIES = {
+    "get_events": (queries.get_events, lambda: (SENSORS // 2 + 1,)),
+    "get_events_range": (queries.get_events, lambda: (SENSORS // 2 + 1, START, START + timedelta(days=7))),
+    "get_event_columns": (queries.get_event_columns, lambda: (SENSORS // 2 + 1, EVENTS // 2, 100)),
+    "get_event_columns_latest": (queries.get_event_columns, lambda: (SENSORS // 2 + 1, None, 30, None, None, True)),
+    "get_events_between": (queries.get_events_between, lambda: (
+        [SENSORS // 2 + 1, SENSORS], START + timedelta(minutes=EVENTS // 2),
+        START + timedelta(minutes=EVENTS // 2 + 60))),
+    "get_events_between_all": (queries.get_events_between, lambda: (
+        None, START + timedelta(minutes=EVENTS // 2), START + timedelta(minutes=EVENTS // 2 + 60))),
+    "get_event": (queries.get_event, lambda: ((EVENTS // 2 - 1) % SENSORS + 1, EVENTS // 2 // 10 * 10)),
+    "get_aux_sensor_data": (queries.get_aux_sensor_data, lambda: (AUX_SENSORS // 2 + 1,)),
+    "get_trend_rollups": (queries.get_trend_rollups, lambda: (SENSORS // 2 + 1, "hour")),
+    "get_sensor_summaries": (queries.get_sensor_summaries, lambda: (f"plan-{SENSORS // 2}", None, 50)),
+    "get_sensor_summaries_page": (queries.get_sensor_summaries, lambda: (None, SENSORS // 2, 50)),
+    "find_live_event": (queries.find_live_event, lambda: live_event()[:2]),
+    "resolve_sensor_ids": (queries.resolve_sensor_ids, lambda: (["plan-1", f"plan-{SENSORS}"],)),
+    "live_update_statement": (update_live_event, lambda: ()),
+}
+
+
+@pytest.mark.parametrize("name", QUERIES)
+def test_query_plan(engine, name):
+    query, args = QUERIES[name]
+    plans = explain(engine, query, *args())
+    assert plans
+
+    for plan in plans:
+        nodes = list(scans(plan["Plan"]))
+        assert not [relation for node_type, relation in nodes if node_type == "Seq Scan" and relation in LARGE_TABLES]
+        if any(relation in LARGE_TABLES for _, relation in nodes):
+            assert any(node_type in INDEX_SCANS for node_type, _ in nodes)
+        assert plan["Execution Time"] < BUDGET_MS
+
+
+def test_partition_pruning(engine):
+    # Only the partition of the month in range is scanned
+    plans = explain(engine, queries.get_events, 1, START + timedelta(days=3), START + timedelta(days=4))
+    relations = {node.get("Relation Name") for node in nodes(plans[0]["Plan"])}
+    assert {relation for relation in relations if relation and relation.startswith("events")} == {"events_2025_01"}